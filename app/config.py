@@ -6,9 +6,27 @@ class Settings(BaseSettings):
 
     api_key: str = "changeme"
     max_upload_size_mb: int = 16
+    upload_spool_mb: int = 1  # uploads larger than this are spooled to a temporary file
+    max_pages: int = 300  # longer PDFs are rejected before extraction (0 = no limit)
     debug: bool = False
     log_level: str = "INFO"
     cors_origins: str = "*"
+    parse_workers: int = 0  # 0 = one worker per CPU
+    parse_queue_size: int = 32
+    parse_timeout_seconds: float = 30  # parses still running after this are abandoned (0 = no deadline)
+    parse_page_workers: int = 1  # >1 extracts pages of one PDF in parallel processes
+    extractor: str = "pdfplumber"  # text backend: pdfplumber or pdfminer
+    columnar_remuneracoes: bool = False  # keep parsed remunerações in typed arrays (smaller cache entries)
+    cache_max_entries: int = 128  # 0 disables the result cache
+    cache_ttl_seconds: int = 3600
+    batch_concurrency: int = 4  # files of one /parse/batch request parsed at once
+    batch_max_files: int = 20  # files accepted in one /parse/batch request
+    batch_max_mb: int = 64  # total size of one /parse/batch request
+    jobs_db_path: str = "jobs.sqlite3"
+    job_workers: int = 1  # jobs run at once (each uses a parse pool slot)
+    jobs_max_entries: int = 1000  # pending jobs accepted / finished jobs kept
+    jobs_retention_seconds: int = 86400  # finished jobs older than this are deleted
+    jobs_max_mb: int = 512  # pending PDFs + finished results kept in the database (0 = no limit)
 
 
 settings = Settings()
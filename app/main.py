@@ -1,20 +1,42 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.config import settings
-from app.routes import health, parse
+from app.routes import health, parse, jobs, metrics
+from app.services.parse_pool import parse_pool
+from app.services.jobs import job_queue
+from app.services.metrics import http_exception_handler, MetricsMiddleware
+from app.services.timings import ServerTimingMiddleware
 
 logging.basicConfig(
     level=getattr(logging, settings.log_level.upper(), logging.INFO),
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    parse_pool.start()
+    await job_queue.start()
+    yield
+    await job_queue.shutdown()
+    parse_pool.shutdown()
+
+
 app = FastAPI(
     title="CNIS Parser API",
     version="1.0.0",
     description="Microserviço para extração de dados de CNIS (INSS) em PDF",
+    lifespan=lifespan,
 )
 
+app.exception_handler(StarletteHTTPException)(http_exception_handler)
+# Plain ASGI middlewares only: @app.middleware("http") would hide client disconnects from the routes
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins.split(","),
@@ -25,3 +47,5 @@ app.add_middleware(
 
 app.include_router(health.router)
 app.include_router(parse.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
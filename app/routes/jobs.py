@@ -0,0 +1,78 @@
+import asyncio
+import json
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.auth import verify_api_key
+from app.routes.parse import _read_pdf, _resolve_extractor, _service_busy, ExtractorQuery, PdfForm
+from app.services.jobs import job_queue, JOB_VIEWS, JOB_DONE, JOB_FAILED
+from app.services.parse_pool import PoolBusyError
+
+router = APIRouter(prefix="/api/v1", dependencies=[Depends(verify_api_key)])
+
+
+def _ms(start: Optional[float], end: Optional[float]) -> Optional[int]:
+    if start is None or end is None:
+        return None
+    return int((end - start) * 1000)
+
+
+@router.post("/jobs", status_code=202, openapi_extra=PdfForm)
+async def create_job(
+    request: Request,
+    view: str = Query("full", description="Result view: full, summary or planilha"),
+    extractor: Optional[str] = ExtractorQuery,
+):
+    """Queue a CNIS PDF for parsing and return its job id immediately.
+
+    Poll ``GET /api/v1/jobs/{job_id}`` for the result.
+    """
+    if view not in JOB_VIEWS:
+        raise HTTPException(status_code=400, detail={
+            "success": False,
+            "message": f"Invalid view {view!r}; expected one of {', '.join(JOB_VIEWS)}",
+            "error_code": "INVALID_VIEW",
+        })
+    extractor = _resolve_extractor(extractor)
+    with await _read_pdf(request) as upload:
+        content = await asyncio.to_thread(upload.getvalue)
+    try:
+        job_id = await job_queue.submit(content, view, extractor, upload.filename)
+    except PoolBusyError as e:
+        raise _service_busy(e)
+    return {
+        "success": True,
+        "message": "Job queued",
+        "data": {"job_id": job_id, "status": "queued"},
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, timings and (once finished) the result or error of a job."""
+    try:
+        job = await job_queue.get(job_id)
+    except PoolBusyError as e:
+        raise _service_busy(e)
+    if job is None:
+        raise HTTPException(status_code=404, detail={
+            "success": False,
+            "message": f"Job {job_id} not found",
+            "error_code": "JOB_NOT_FOUND",
+        })
+
+    now = time.time()
+    data = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "view": job["view"],
+        "filename": job["filename"],
+        "size_bytes": job["size"],
+        "queue_time_ms": _ms(job["created_at"], job["started_at"] or now),
+        "processing_time_ms": _ms(job["started_at"], job["finished_at"] or now),
+    }
+    if job["status"] == JOB_DONE:
+        data["result"] = json.loads(job["result"])
+    elif job["status"] == JOB_FAILED:
+        data["error"] = json.loads(job["error"])
+    return {"success": True, "data": data}
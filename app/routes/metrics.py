@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from app.services import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus exposition of request, stage, upload and queue metrics."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
@@ -1,73 +1,717 @@
+import asyncio
+import re
 import time
 import logging
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+import orjson
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
 from app.auth import verify_api_key
-from app.services.parser_service import parse_pdf, ParseError
-from app.services.response_transformer import transform_full, transform_summary
+from app.config import settings
+from app.services.parser_service import (
+    CnisRecords, ParseError, ParseTimeoutError, EXTRACTORS, PLAN_PERSONAL, PLAN_COUNTS, PLAN_FULL,
+)
+from app.services.parse_pool import parse_pool, PoolBusyError
+from app.services.result_cache import result_cache, cache_key
+from app.services.cnis_diff import diff_records
+from app.services.uploads import (FormFile, InvalidFormError, SpooledUpload, TooManyFilesError, UploadTooLargeError,
+                                  read_pdf_form)
+from app.services.timings import StageTimings, start_timings
+from app.services import metrics
+from app.services.response_transformer import (
+    transform_full, transform_summary, transform_personal_info, transform_vinculo, count_remuneracoes,
+)
 from app.services.planilha_transformer import transform_to_planilha
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1", dependencies=[Depends(verify_api_key)])
 
-MAX_SIZE = 16 * 1024 * 1024  # 16MB
+# Response views that can be requested together via POST /parse?views=...
+VIEWS = {
+    "full": transform_full,
+    "summary": transform_summary,
+    "planilha": transform_to_planilha,
+}
 
+# Parse plan each view needs: summary and planilha only use remuneração counts
+VIEW_PLANS = {
+    "full": PLAN_FULL,
+    "summary": PLAN_COUNTS,
+    "planilha": PLAN_COUNTS,
+}
 
-async def _read_and_validate(file: UploadFile) -> bytes:
-    if not file.filename:
+# HTTP status per ParseError.error_code; anything else is a 422
+_PARSE_ERROR_STATUS = {
+    "TOO_MANY_PAGES": 413,
+    "PARSE_TIMEOUT": 504,
+    "CLIENT_DISCONNECTED": 499,  # nginx's "client closed request"; nobody is left to read it
+}
+
+Disconnected = Optional[Callable[[], Awaitable[bool]]]
+
+MB = 1024 * 1024
+# Room for the multipart framing (boundaries, part headers) around the files themselves
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Cached results that can answer a request for a given plan, richest first
+_PLAN_SOURCES = {
+    PLAN_FULL: (PLAN_FULL,),
+    PLAN_COUNTS: (PLAN_FULL, PLAN_COUNTS),
+    PLAN_PERSONAL: (PLAN_FULL, PLAN_COUNTS, PLAN_PERSONAL),
+}
+
+
+def _render(body: dict, timings: StageTimings) -> ORJSONResponse:
+    """Serialize a response body with orjson, skipping FastAPI's jsonable_encoder pass.
+
+    Bodies are plain dicts/lists/str/numbers, which orjson encodes directly.
+    """
+    with timings.measure("serialize"):
+        return ORJSONResponse(body)
+
+
+def _parse_deadline() -> Optional[float]:
+    """time.time() by which a parse started now must finish (CNIS_PARSE_TIMEOUT_SECONDS)."""
+    if settings.parse_timeout_seconds <= 0:
+        return None
+    return time.time() + settings.parse_timeout_seconds
+
+
+def _parse_error_detail(e: ParseError, elapsed_ms: int, timings: Optional[StageTimings] = None) -> dict:
+    """Error body for a ParseError; timeouts also report the stage timings reached."""
+    detail = {
+        "success": False,
+        "message": str(e),
+        "error_code": e.error_code,
+        "processing_time_ms": elapsed_ms,
+    }
+    if isinstance(e, ParseTimeoutError) and timings is not None:
+        detail["timings"] = timings.as_ms()
+    return detail
+
+
+def _service_busy(e: PoolBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail={
+        "success": False,
+        "message": str(e),
+        "error_code": "SERVICE_BUSY",
+    })
+
+
+def _resolve_views(views: str) -> List[str]:
+    names = list(dict.fromkeys(v.strip() for v in views.split(",") if v.strip()))
+    unknown = [v for v in names if v not in VIEWS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail={
+            "success": False,
+            "message": f"Invalid views {', '.join(unknown) or views!r}; expected any of {', '.join(VIEWS)}",
+            "error_code": "INVALID_VIEW",
+        })
+    return names
+
+
+def _resolve_extractor(extractor: Optional[str]) -> Optional[str]:
+    if extractor is not None and extractor not in EXTRACTORS:
+        raise HTTPException(status_code=400, detail={
+            "success": False,
+            "message": f"Invalid extractor {extractor!r}; expected one of {', '.join(EXTRACTORS)}",
+            "error_code": "INVALID_EXTRACTOR",
+        })
+    return extractor
+
+
+ExtractorQuery = Query(None, description="Text extraction backend (default from CNIS_EXTRACTOR): " + ", ".join(EXTRACTORS))
+TimingsQuery = Query(False, description="Include per-stage durations (ms) as `timings` in the response")
+
+
+def _pdf_form(fields: Dict[str, str], required: Tuple[str, ...] = ("file",), multiple: bool = False) -> dict:
+    """openapi_extra documenting a multipart body of PDF files (field name -> description).
+
+    The upload routes read their body with read_pdf_form, so FastAPI cannot infer it.
+    """
+    pdf = {"type": "string", "format": "binary"}
+    properties = {
+        name: {"type": "array", "items": pdf, "description": text} if multiple else {**pdf, "description": text}
+        for name, text in fields.items()
+    }
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": properties, "required": list(required),
+    }}}}}
+
+
+PdfForm = _pdf_form({"file": "CNIS PDF"})
+
+
+def _form_limit(files: int) -> int:
+    """Largest body accepted for ``files`` PDFs of CNIS_MAX_UPLOAD_SIZE_MB each."""
+    return files * settings.max_upload_size_mb * MB + FORM_OVERHEAD_BYTES
+
+
+def _file_too_large(size: int) -> HTTPException:
+    metrics.observe_upload(size)
+    return HTTPException(status_code=413, detail={
+        "success": False,
+        "message": f"File too large (max {settings.max_upload_size_mb}MB)",
+        "error_code": "FILE_TOO_LARGE",
+    })
+
+
+def _batch_too_large(size: int) -> HTTPException:
+    return HTTPException(status_code=413, detail={
+        "success": False,
+        "message": f"Batch too large (max {settings.batch_max_mb}MB)",
+        "error_code": "BATCH_TOO_LARGE",
+    })
+
+
+async def _read_pdfs(request: Request, fields: Tuple[str, ...], max_body_bytes: int,
+                     max_files: Optional[int] = None,
+                     too_large: Callable[[int], HTTPException] = _file_too_large) -> List[FormFile]:
+    """read_pdf_form with the configured limits, mapping request-level failures to HTTP errors.
+
+    ``too_large`` builds the error for a body over ``max_body_bytes``. The
+    caller owns the returned files and must close them.
+    """
+    try:
+        return await read_pdf_form(request, fields, settings.max_upload_size_mb * MB, max_body_bytes,
+                                   settings.upload_spool_mb * MB, max_files)
+    except UploadTooLargeError as e:
+        raise too_large(e.size)
+    except TooManyFilesError as e:
+        raise HTTPException(status_code=413, detail={
+            "success": False, "message": f"Too many files (max {e.max_files})", "error_code": "TOO_MANY_FILES",
+        })
+    except InvalidFormError as e:
+        raise HTTPException(status_code=400, detail={
+            "success": False, "message": str(e), "error_code": "INVALID_FORM",
+        })
+
+
+def _validated(part: FormFile) -> SpooledUpload:
+    """The upload of ``part``, or the HTTP error its filename or contents call for."""
+    if not part.filename:
         raise HTTPException(status_code=400, detail={
             "success": False, "message": "Empty filename", "error_code": "EMPTY_FILENAME",
         })
-    if not file.filename.lower().endswith('.pdf'):
+    if not part.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail={
             "success": False, "message": "Only PDF files are allowed", "error_code": "INVALID_FILE_TYPE",
         })
+    if isinstance(part.error, UploadTooLargeError):
+        raise _file_too_large(part.error.size)
+    if part.error is not None:
+        raise HTTPException(status_code=400, detail={
+            "success": False, "message": f"Not a PDF: {part.error}", "error_code": "INVALID_FILE_TYPE",
+        })
+    metrics.observe_upload(part.upload.size)
+    return part.upload
 
-    content = await file.read()
-    if len(content) > MAX_SIZE:
-        raise HTTPException(status_code=413, detail={
-            "success": False, "message": "File too large (max 16MB)", "error_code": "FILE_TOO_LARGE",
+
+def _take(parts: List[FormFile], field: str, required: bool = True) -> Optional[SpooledUpload]:
+    """The validated upload of the first ``field`` file among ``parts``; None if there is none and it is optional."""
+    for part in parts:
+        if part.field == field:
+            return _validated(part)
+    if required:
+        raise HTTPException(status_code=422, detail={
+            "success": False, "message": f"Missing file field {field!r}", "error_code": "MISSING_FILE",
         })
-    return content
+    return None
 
 
-def _parse_and_respond(content: bytes, transformer):
-    start = time.time()
+async def _read_pdf(request: Request, field: str = "file") -> SpooledUpload:
+    """The PDF uploaded as ``field``, read and validated as it arrives.
+
+    The caller owns the returned SpooledUpload and must close it.
+    """
+    parts = await _read_pdfs(request, (field,), _form_limit(1))
+    upload = None
     try:
-        raw = parse_pdf(content)
-        data = transformer(raw)
+        upload = _take(parts, field)
+    finally:
+        for part in parts:
+            if part.upload is not upload:
+                part.close()
+    return upload
+
+
+async def _get_raw(upload: SpooledUpload, extractor: Optional[str] = None, plan: str = PLAN_FULL,
+                   timings: Optional[StageTimings] = None, disconnected: Disconnected = None) -> CnisRecords:
+    """Parser records for ``upload``, served from the result cache when possible.
+
+    A cached result of a richer plan (e.g. full rows for a counts request) is reused.
+    Parses stop at the CNIS_PARSE_TIMEOUT_SECONDS deadline, or early once
+    ``disconnected`` (e.g. Request.is_disconnected) returns True.
+    """
+    timings = timings or StageTimings()
+    with timings.measure("cache"):
+        raw = result_cache.get_any(cache_key(None, extractor, p, upload.digest) for p in _PLAN_SOURCES[plan])
+    timings.cache_hit = raw is not None
+    if raw is None:
+        started = time.perf_counter()
+        try:
+            raw, stats = await parse_pool.parse(upload.source, extractor, plan, _parse_deadline(), disconnected)
+        except ParseTimeoutError as e:
+            if e.stats is not None:
+                timings.add_parse(e.stats.stages, time.perf_counter() - started)
+            raise
+        timings.add_parse(stats.stages, time.perf_counter() - started)
+        rows = sum(count_remuneracoes(emp) for emp in raw.vinculos)
+        metrics.observe_parse(stats.pages, rows, sum(stats.stages.values()))
+        result_cache.put(cache_key(None, extractor, plan, upload.digest), raw)
+    return raw
+
+
+async def _parse_or_raise(upload: SpooledUpload, start: float, extractor: Optional[str] = None,
+                          plan: str = PLAN_FULL, timings: Optional[StageTimings] = None,
+                          disconnected: Disconnected = None) -> CnisRecords:
+    """_get_raw, mapping parser/pool failures to HTTP errors."""
+    timings = timings or StageTimings()
+    try:
+        return await _get_raw(upload, extractor, plan, timings, disconnected)
+    except ParseError as e:
         elapsed = int((time.time() - start) * 1000)
+        raise HTTPException(status_code=_PARSE_ERROR_STATUS.get(e.error_code, 422),
+                            detail=_parse_error_detail(e, elapsed, timings))
+    except PoolBusyError as e:
+        raise _service_busy(e)
+
+
+async def _parse_and_respond(upload: SpooledUpload, transformer, extractor: Optional[str] = None,
+                             plan: str = PLAN_FULL, timings: Optional[StageTimings] = None,
+                             include_timings: bool = False, disconnected: Disconnected = None):
+    timings = timings or StageTimings()
+    start = time.time()
+    raw = await _parse_or_raise(upload, start, extractor, plan, timings, disconnected)
+    with timings.measure("transform"):
+        data = transformer(raw)
+    elapsed = int((time.time() - start) * 1000)
+    body = {
+        "success": True,
+        "message": "CNIS parsed successfully",
+        "processing_time_ms": elapsed,
+        "data": data,
+    }
+    if include_timings:
+        body["timings"] = timings.as_ms()
+    return _render(body, timings)
+
+
+async def _parse_and_respond_views(upload: SpooledUpload, views: List[str], extractor: Optional[str] = None,
+                                   timings: Optional[StageTimings] = None, include_timings: bool = False,
+                                   disconnected: Disconnected = None):
+    """Parse once and render every requested view, each with its own timing."""
+    timings = timings or StageTimings()
+    plan = PLAN_FULL if any(VIEW_PLANS[name] == PLAN_FULL for name in views) else PLAN_COUNTS
+    start = time.time()
+    raw = await _parse_or_raise(upload, start, extractor, plan, timings, disconnected)
+    parse_elapsed = int((time.time() - start) * 1000)
+
+    rendered = {}
+    for name in views:
+        view_start = time.time()
+        with timings.measure("transform"):
+            data = VIEWS[name](raw)
+        rendered[name] = {
+            "processing_time_ms": int((time.time() - view_start) * 1000),
+            "data": data,
+        }
+
+    elapsed = int((time.time() - start) * 1000)
+    body = {
+        "success": True,
+        "message": "CNIS parsed successfully",
+        "processing_time_ms": elapsed,
+        "parse_time_ms": parse_elapsed,
+        "views": rendered,
+    }
+    if include_timings:
+        body["timings"] = timings.as_ms()
+    return _render(body, timings)
+
+
+@router.post("/parse", response_class=ORJSONResponse, openapi_extra=PdfForm)
+async def parse_cnis(
+    request: Request,
+    views: Optional[str] = Query(None, description="Comma-separated views to return together: full,summary,planilha"),
+    extractor: Optional[str] = ExtractorQuery,
+    timings: bool = TimingsQuery,
+):
+    """Parse CNIS PDF and return full structured data.
+
+    With ``views``, the PDF is parsed once and every requested view is returned
+    under ``views.<name>``.
+    """
+    stage_timings = start_timings(request)
+    view_names = _resolve_views(views) if views is not None else None
+    extractor = _resolve_extractor(extractor)
+    with stage_timings.measure("read"):
+        upload = await _read_pdf(request)
+    with upload:
+        if view_names:
+            return await _parse_and_respond_views(upload, view_names, extractor, stage_timings, timings,
+                                                  request.is_disconnected)
+        return await _parse_and_respond(upload, transform_full, extractor, PLAN_FULL, stage_timings, timings,
+                                        request.is_disconnected)
+
+
+@router.post("/parse/summary", response_class=ORJSONResponse, openapi_extra=PdfForm)
+async def parse_cnis_summary(request: Request, extractor: Optional[str] = ExtractorQuery, timings: bool = TimingsQuery):
+    """Parse CNIS PDF and return summary (without remuneracoes)."""
+    stage_timings = start_timings(request)
+    extractor = _resolve_extractor(extractor)
+    with stage_timings.measure("read"):
+        upload = await _read_pdf(request)
+    with upload:
+        return await _parse_and_respond(upload, transform_summary, extractor, VIEW_PLANS["summary"],
+                                        stage_timings, timings, request.is_disconnected)
+
+
+@router.post("/parse/planilha", response_class=ORJSONResponse, openapi_extra=PdfForm)
+async def parse_cnis_planilha(request: Request, extractor: Optional[str] = ExtractorQuery, timings: bool = TimingsQuery):
+    """Parse CNIS PDF and return data in Planilha.spreadsheet_data schema."""
+    stage_timings = start_timings(request)
+    extractor = _resolve_extractor(extractor)
+    with stage_timings.measure("read"):
+        upload = await _read_pdf(request)
+    with upload:
+        return await _parse_and_respond(upload, transform_to_planilha, extractor, VIEW_PLANS["planilha"],
+                                        stage_timings, timings, request.is_disconnected)
+
+
+async def _parse_batch_item(part: FormFile, view: str, extractor: Optional[str],
+                            semaphore: asyncio.Semaphore, disconnected: Disconnected = None) -> dict:
+    """One /parse/batch entry: the view's data, or the error detail _parse_and_respond would raise."""
+    async with semaphore:
+        start = time.time()
+        try:
+            with _validated(part) as upload:
+                raw = await _parse_or_raise(upload, start, extractor, VIEW_PLANS[view], disconnected=disconnected)
+            data = VIEWS[view](raw)
+        except HTTPException as e:
+            detail = dict(e.detail)
+            detail["processing_time_ms"] = int((time.time() - start) * 1000)
+            return detail
         return {
             "success": True,
-            "message": "CNIS parsed successfully",
-            "processing_time_ms": elapsed,
+            "processing_time_ms": int((time.time() - start) * 1000),
             "data": data,
         }
-    except ParseError as e:
-        elapsed = int((time.time() - start) * 1000)
+
+
+def _batch_keys(parts: List[FormFile]) -> List[str]:
+    """Result keys: the filename, suffixed " (2)", " (3)"... when it repeats."""
+    keys = []
+    seen: Dict[str, int] = {}
+    for part in parts:
+        name = part.filename or ""
+        seen[name] = seen.get(name, 0) + 1
+        keys.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return keys
+
+
+@router.post("/parse/batch", response_class=ORJSONResponse,
+             openapi_extra=_pdf_form({"files": "CNIS PDFs"}, required=("files",), multiple=True))
+async def parse_cnis_batch(
+    request: Request,
+    view: str = Query("full", description="View returned for every file: full, summary or planilha"),
+    extractor: Optional[str] = ExtractorQuery,
+):
+    """Parse several CNIS PDFs in one request.
+
+    Files are parsed concurrently (at most ``CNIS_BATCH_CONCURRENCY`` at a
+    time). More than ``CNIS_BATCH_MAX_FILES`` files, or a body over
+    ``CNIS_BATCH_MAX_MB``, is refused with 413 while it is being read.
+    ``results`` is keyed by filename; each entry is either
+    ``{success: true, processing_time_ms, data}`` or the error body the
+    single-file endpoints would return.
+    """
+    if view not in VIEWS:
+        raise HTTPException(status_code=400, detail={
+            "success": False,
+            "message": f"Invalid view {view!r}; expected one of {', '.join(VIEWS)}",
+            "error_code": "INVALID_VIEW",
+        })
+    extractor = _resolve_extractor(extractor)
+
+    start = time.time()
+    files = await _read_pdfs(request, ("files",), settings.batch_max_mb * MB + FORM_OVERHEAD_BYTES,
+                             settings.batch_max_files, _batch_too_large)
+    try:
+        if not files:
+            raise HTTPException(status_code=422, detail={
+                "success": False, "message": "Missing file field 'files'", "error_code": "MISSING_FILE",
+            })
+        semaphore = asyncio.Semaphore(max(settings.batch_concurrency, 1))
+        outcomes = await asyncio.gather(*(_parse_batch_item(f, view, extractor, semaphore, request.is_disconnected)
+                                          for f in files))
+    finally:
+        for f in files:
+            f.close()
+    results = dict(zip(_batch_keys(files), outcomes))
+
+    failed = sum(1 for r in outcomes if not r["success"])
+    return ORJSONResponse({
+        "success": True,
+        "message": f"{len(files) - failed} of {len(files)} CNIS parsed successfully",
+        "processing_time_ms": int((time.time() - start) * 1000),
+        "resumo": {"total": len(files), "succeeded": len(files) - failed, "failed": failed},
+        "results": results,
+    })
+
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+async def _parse_diff_side(upload: SpooledUpload, side: str, start: float, extractor: Optional[str],
+                           timings: StageTimings, disconnected: Disconnected) -> CnisRecords:
+    """_parse_or_raise for one side of /parse/diff; errors name the offending field."""
+    try:
+        return await _parse_or_raise(upload, start, extractor, PLAN_FULL, timings, disconnected)
+    except HTTPException as e:
+        e.detail["file"] = side
+        raise
+
+
+DiffForm = _pdf_form({"new_file": "Current CNIS extract",
+                      "old_file": "Previous CNIS extract of the same person"}, required=("new_file",))
+
+
+async def _gather_or_cancel(*aws: Awaitable) -> list:
+    """asyncio.gather that cancels the others as soon as one fails (asyncio.TaskGroup needs Python 3.11).
+
+    Cancelling a parse_pool.run call moves its worker's deadline to 0, so
+    the surviving parse stops instead of holding its slot to the end.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+@router.post("/parse/diff", response_class=ORJSONResponse, openapi_extra=DiffForm)
+async def parse_cnis_diff(
+    request: Request,
+    old_hash: Optional[str] = Query(None, description="Instead of old_file: SHA-256 (old_hash/new_hash of an "
+                                                       "earlier diff) of a previous extract still in the result cache"),
+    extractor: Optional[str] = ExtractorQuery,
+    timings: bool = TimingsQuery,
+):
+    """Compare two CNIS extracts of the same person and return only what changed.
+
+    The previous extract is either uploaded as ``old_file`` or named by
+    ``old_hash``. See cnis_diff.diff_records for what ``data`` holds.
+    """
+    stage_timings = start_timings(request)
+    extractor = _resolve_extractor(extractor)
+    if old_hash is not None:
+        old_hash = old_hash.strip().lower()
+        if not _SHA256.fullmatch(old_hash):
+            raise HTTPException(status_code=400, detail={
+                "success": False, "message": "old_hash must be a hex SHA-256", "error_code": "INVALID_HASH",
+            })
+
+    start = time.time()
+    with stage_timings.measure("read"):
+        parts = await _read_pdfs(request, ("new_file", "old_file"), _form_limit(2))
+    try:
+        has_old_file = any(part.field == "old_file" for part in parts)
+        if has_old_file == (old_hash is not None):
+            raise HTTPException(status_code=400, detail={
+                "success": False,
+                "message": "Send the previous extract as either old_file or old_hash",
+                "error_code": "INVALID_DIFF_INPUT",
+            })
+        new_upload = _take(parts, "new_file")
+        old_upload = _take(parts, "old_file", required=False)
+        if old_upload is not None:
+            old_hash = old_upload.digest
+            old_raw, new_raw = await _gather_or_cancel(
+                _parse_diff_side(old_upload, "old_file", start, extractor, stage_timings,
+                                 request.is_disconnected),
+                _parse_diff_side(new_upload, "new_file", start, extractor, stage_timings,
+                                 request.is_disconnected),
+            )
+        else:
+            old_raw = result_cache.get(cache_key(None, extractor, PLAN_FULL, old_hash))
+            if old_raw is None:
+                raise HTTPException(status_code=404, detail={
+                    "success": False,
+                    "message": "No cached parse for old_hash; send the previous extract as old_file",
+                    "error_code": "RESULT_NOT_CACHED",
+                })
+            new_raw = await _parse_diff_side(new_upload, "new_file", start, extractor, stage_timings,
+                                             request.is_disconnected)
+        new_hash = new_upload.digest
+    finally:
+        for part in parts:
+            part.close()
+
+    old_cpf, new_cpf = old_raw.personal_info.cpf, new_raw.personal_info.cpf
+    if old_cpf and new_cpf and old_cpf != new_cpf:
         raise HTTPException(status_code=422, detail={
             "success": False,
-            "message": str(e),
-            "error_code": "PARSE_ERROR",
-            "processing_time_ms": elapsed,
+            "message": f"Extracts belong to different people (CPF {old_cpf} and {new_cpf})",
+            "error_code": "CNIS_MISMATCH",
         })
+    with stage_timings.measure("transform"):
+        data = diff_records(old_raw, new_raw)
+    body = {
+        "success": True,
+        "message": "CNIS compared successfully",
+        "processing_time_ms": int((time.time() - start) * 1000),
+        "old_hash": old_hash,
+        "new_hash": new_hash,
+        "data": data,
+    }
+    if timings:
+        body["timings"] = stage_timings.as_ms()
+    return _render(body, stage_timings)
 
 
-@router.post("/parse")
-async def parse_cnis(file: UploadFile = File(...)):
-    """Parse CNIS PDF and return full structured data."""
-    content = await _read_and_validate(file)
-    return _parse_and_respond(content, transform_full)
+async def _iter_cached_events(raw: CnisRecords) -> AsyncIterator[Tuple[str, object]]:
+    """Replay cached records as iter_parse_pdf events."""
+    yield 'personal_info', raw.personal_info
+    for emp in raw.vinculos:
+        yield 'vinculo', emp
 
 
-@router.post("/parse/summary")
-async def parse_cnis_summary(file: UploadFile = File(...)):
-    """Parse CNIS PDF and return summary (without remuneracoes)."""
-    content = await _read_and_validate(file)
-    return _parse_and_respond(content, transform_summary)
+async def _recorded(events: AsyncIterator[Tuple[str, object]], key: str) -> AsyncIterator[Tuple[str, object]]:
+    """Pass iter_parse_pdf's records through; once it completes, record its metrics and cache the records.
 
+    The trailing ``stats`` event is consumed here.
+    """
+    personal = None
+    vinculos = []
+    async for kind, payload in events:
+        if kind == 'stats':
+            rows = sum(count_remuneracoes(emp) for emp in vinculos)
+            metrics.observe_parse(payload.pages, rows, sum(payload.stages.values()))
+            result_cache.put(key, CnisRecords(personal, vinculos))
+            continue
+        if kind == 'personal_info':
+            personal = payload
+        else:
+            vinculos.append(payload)
+        yield kind, payload
 
-@router.post("/parse/planilha")
-async def parse_cnis_planilha(file: UploadFile = File(...)):
-    """Parse CNIS PDF and return data in Planilha.spreadsheet_data schema."""
-    content = await _read_and_validate(file)
-    return _parse_and_respond(content, transform_to_planilha)
+
+async def _prepend(first: Tuple[str, object],
+                   events: AsyncIterator[Tuple[str, object]]) -> AsyncIterator[Tuple[str, object]]:
+    yield first
+    async for event in events:
+        yield event
+
+
+def _parser_timings(e: ParseTimeoutError) -> StageTimings:
+    """The parser stages a timed-out streaming parse got through."""
+    timings = StageTimings()
+    for stage, seconds in e.stats.stages.items():
+        timings.add(stage, seconds)
+    return timings
+
+
+async def _ndjson_lines(events: AsyncIterator[Tuple[str, object]]) -> AsyncIterator[bytes]:
+    total_vinculos = 0
+    total_remus = 0
+    try:
+        async for kind, payload in events:
+            if kind == 'personal_info':
+                record = {"type": "personal_info", "data": transform_personal_info(payload)}
+            else:
+                total_vinculos += 1
+                total_remus += count_remuneracoes(payload)
+                record = {"type": "vinculo", "data": transform_vinculo(payload)}
+            yield orjson.dumps(record) + b"\n"
+    except ParseError as e:
+        # Headers are already sent; report the failure in-band and stop
+        record = {"type": "error", "error_code": e.error_code, "message": str(e)}
+        if isinstance(e, ParseTimeoutError) and e.stats is not None:
+            record["timings"] = _parser_timings(e).as_ms()
+        yield orjson.dumps(record) + b"\n"
+        return
+    yield orjson.dumps({"type": "resumo", "data": {
+        "total_vinculos": total_vinculos,
+        "total_remuneracoes": total_remus,
+    }}) + b"\n"
+
+
+class _ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that runs ``cleanup`` once it is over, however it ends.
+
+    Unlike a ``with`` inside the body generator, this also runs when the
+    client leaves before the first chunk is sent.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], cleanup: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.cleanup = cleanup
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.cleanup()
+
+
+@router.post("/parse/stream", openapi_extra=PdfForm)
+async def parse_cnis_stream(request: Request, extractor: Optional[str] = ExtractorQuery):
+    """Parse CNIS PDF and stream it as NDJSON.
+
+    Lines are ``{"type": "personal_info"}``, then one ``{"type": "vinculo"}``
+    per employment relationship as soon as it is parsed, then a trailing
+    ``{"type": "resumo"}``.
+
+    The parse runs in a parse-pool worker (503 SERVICE_BUSY when the pool is
+    full) that sends each vínculo back as it completes; it is not slowed
+    down by a slow client, and stops once the response ends early. Once
+    complete, its records go to the result cache.
+    """
+    extractor = _resolve_extractor(extractor)
+    upload = await _read_pdf(request)
+    key = cache_key(None, extractor, PLAN_FULL, upload.digest)
+    raw = result_cache.get(key)
+    if raw is not None:
+        events = _iter_cached_events(raw)
+        cleanup = upload.close
+    else:
+        try:
+            stream = parse_pool.iter_parse(upload.source, extractor, _parse_deadline())
+        except PoolBusyError as e:
+            upload.close()
+            raise _service_busy(e)
+        except ParseError as e:
+            upload.close()
+            raise HTTPException(status_code=422, detail=_parse_error_detail(e, 0))
+        # The worker may still be opening a spilled upload after the response ended
+        stream.add_done_callback(upload.close)
+        events = _recorded(stream, key)
+        cleanup = stream.close
+
+    # Wait for the first event before answering, so unreadable PDFs still get a 422
+    start = time.time()
+    try:
+        first = await anext(events)
+    except ParseError as e:
+        cleanup()
+        elapsed = int((time.time() - start) * 1000)
+        timings = _parser_timings(e) if isinstance(e, ParseTimeoutError) and e.stats is not None else None
+        raise HTTPException(status_code=_PARSE_ERROR_STATUS.get(e.error_code, 422),
+                            detail=_parse_error_detail(e, elapsed, timings))
+    except BaseException:
+        cleanup()
+        raise
+
+    return _ClosingStreamingResponse(_ndjson_lines(_prepend(first, events)), cleanup,
+                                     media_type="application/x-ndjson")
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the parse result cache."""
+    return {"success": True, "data": result_cache.stats()}
@@ -0,0 +1,112 @@
+"""Differences between two parses of the same person's CNIS (POST /api/v1/parse/diff)."""
+
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple, TypeVar
+
+from app.services.parser_service import CnisRecords, Remuneracao, Vinculo
+from app.services.response_transformer import (
+    transform_metadata, transform_personal_info, transform_remuneracao, transform_vinculo, transform_vinculo_header,
+)
+
+T = TypeVar("T")
+
+
+def _keyed(items: Iterable[T], key: Callable[[T], Hashable]) -> Dict[Tuple[Hashable, int], T]:
+    """``{(key(item), n): item}``, n counting repeats of a key, so no item is dropped."""
+    out = {}
+    seen: Dict[Hashable, int] = {}
+    for item in items:
+        k = key(item)
+        n = seen.get(k, 0)
+        seen[k] = n + 1
+        out[(k, n)] = item
+    return out
+
+
+def _vinculo_key(emp: Vinculo) -> Tuple[str, int, str]:
+    return emp.data.nit or "", emp.sequence, emp.data.codigo_empresa or ""
+
+
+def _vinculo_id(emp: Vinculo) -> dict:
+    return {"sequencia": emp.sequence, "nit": emp.data.nit or "", "codigo_empresa": emp.data.codigo_empresa or ""}
+
+
+def _changed_fields(before: dict, after: dict) -> dict:
+    return {name: {"antes": before[name], "depois": value}
+            for name, value in after.items() if before[name] != value}
+
+
+def diff_remuneracoes(before: Iterable[Remuneracao],
+                      after: Iterable[Remuneracao]) -> Tuple[List[dict], List[dict]]:
+    """(added, changed) rows of ``after``, matched to ``before`` by competência.
+
+    Changed rows carry their previous values under ``antes``. Competências
+    that are only in ``before`` are not reported.
+    """
+    old_rows = _keyed(before, lambda r: r.competencia)
+    added = []
+    changed = []
+    for key, row in _keyed(after, lambda r: r.competencia).items():
+        old = old_rows.get(key)
+        if old is None:
+            added.append(transform_remuneracao(row))
+        elif old != row:
+            entry = transform_remuneracao(row)
+            entry["antes"] = {"remuneracao": old.remuneracao, "indicadores": old.indicadores or ""}
+            changed.append(entry)
+    return added, changed
+
+
+def diff_vinculo(before: Vinculo, after: Vinculo) -> dict:
+    """Changes of one matched vínculo; empty when there are none."""
+    out = {}
+    fields = _changed_fields(transform_vinculo_header(before), transform_vinculo_header(after))
+    if fields:
+        out["campos"] = fields
+    if before.remuneracoes != after.remuneracoes:
+        added, changed = diff_remuneracoes(before.remuneracoes, after.remuneracoes)
+        if added:
+            out["remuneracoes_adicionadas"] = added
+        if changed:
+            out["remuneracoes_alteradas"] = changed
+    metadata = transform_metadata(after.metadata)
+    if out or metadata != transform_metadata(before.metadata):
+        out = {**_vinculo_id(after), **out, "metadata": metadata}
+    return out
+
+
+def diff_records(before: CnisRecords, after: CnisRecords) -> dict:
+    """What changed from ``before`` (older extract) to ``after``.
+
+    Vínculos are matched by NIT, sequência and código da empresa, and their
+    remunerações by competência. Only the differences are returned: changed
+    personal_info fields, added vínculos (in full), removed vínculos (their
+    keys), and per changed vínculo its changed header fields, added and
+    changed remunerações and, when any of that changed, its new metadata.
+    """
+    old_vinculos = _keyed(before.vinculos, _vinculo_key)
+    new_vinculos = _keyed(after.vinculos, _vinculo_key)
+
+    added = [transform_vinculo(emp) for key, emp in new_vinculos.items() if key not in old_vinculos]
+    removed = [_vinculo_id(emp) for key, emp in old_vinculos.items() if key not in new_vinculos]
+    changed = []
+    for key, emp in new_vinculos.items():
+        old = old_vinculos.get(key)
+        if old is not None:
+            entry = diff_vinculo(old, emp)
+            if entry:
+                changed.append(entry)
+
+    return {
+        "personal_info": _changed_fields(transform_personal_info(before.personal_info),
+                                         transform_personal_info(after.personal_info)),
+        "vinculos_adicionados": added,
+        "vinculos_removidos": removed,
+        "vinculos_alterados": changed,
+        "resumo": {
+            "vinculos_adicionados": len(added),
+            "vinculos_removidos": len(removed),
+            "vinculos_alterados": len(changed),
+            "remuneracoes_adicionadas": sum(len(v.get("remuneracoes_adicionadas", ())) for v in changed),
+            "remuneracoes_alteradas": sum(len(v.get("remuneracoes_alteradas", ())) for v in changed),
+        },
+    }
@@ -0,0 +1,322 @@
+"""Asynchronous parse jobs persisted in SQLite.
+
+Uploads are stored with status ``queued``; worker tasks started in the app
+lifespan claim them one at a time and run the parse (plus the requested
+view's transformer) in the parse pool. Jobs left ``running`` by a previous
+process are re-queued on startup.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.config import settings
+from app.services.parser_service import parse_pdf, ParseError, PLAN_COUNTS, PLAN_FULL
+from app.services.parse_pool import parse_pool, PoolBusyError
+from app.services.response_transformer import transform_full, transform_summary
+from app.services.planilha_transformer import transform_to_planilha
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# view -> (transformer, parse plan)
+JOB_VIEWS = {
+    "full": (transform_full, PLAN_FULL),
+    "summary": (transform_summary, PLAN_COUNTS),
+    "planilha": (transform_to_planilha, PLAN_COUNTS),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    view TEXT NOT NULL,
+    extractor TEXT,
+    filename TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    pdf BLOB,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Bytes a job takes up in the database: its PDF until it finishes, then its result or error
+_JOB_BYTES = ("COALESCE(LENGTH(pdf), 0) + COALESCE(LENGTH(CAST(result AS BLOB)), 0) "
+              "+ COALESCE(LENGTH(CAST(error AS BLOB)), 0)")
+
+
+def run_job(file_bytes: bytes, view: str, extractor: Optional[str], page_workers: int) -> dict:
+    """Parse and transform one job. Runs inside a parse-pool worker process."""
+    transformer, plan = JOB_VIEWS[view]
+    return transformer(parse_pdf(file_bytes, page_workers, extractor, plan, settings.columnar_remuneracoes,
+                                 settings.max_pages))
+
+
+class JobStore:
+    """SQLite table of jobs. The uploaded PDF is dropped once a job finishes.
+
+    The database uses incremental auto-vacuum, so the pages freed by dropped
+    PDFs and evicted jobs are returned to the filesystem by evict().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        # Must precede the first table; a database created without it only switches after a VACUUM
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        if self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self._conn.execute("VACUUM")
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create(self, file_bytes: bytes, view: str, extractor: Optional[str], filename: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, view, extractor, filename, size, created_at, pdf) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, view, extractor, filename, len(file_bytes), time.time(), file_bytes),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, view, extractor, filename, size, created_at, started_at, finished_at, "
+                "result, error FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def claim_next(self) -> Optional[sqlite3.Row]:
+        """Mark the oldest queued job as running and return it (with its PDF)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, view, extractor, pdf FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                (JOB_RUNNING, time.time(), row["id"]),
+            )
+        return row
+
+    def requeue(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE id = ?", (JOB_QUEUED, job_id),
+            )
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[dict] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, pdf = NULL WHERE id = ?",
+                (
+                    JOB_FAILED if error is not None else JOB_DONE,
+                    time.time(),
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    json.dumps(error, ensure_ascii=False) if error is not None else None,
+                    job_id,
+                ),
+            )
+
+    def recover(self) -> int:
+        """Re-queue jobs a previous process left running. Returns how many."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (JOB_QUEUED, JOB_RUNNING),
+            )
+        return cur.rowcount
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING),
+            ).fetchone()[0]
+
+    def stored_bytes(self) -> int:
+        """Bytes held by all jobs: pending PDFs plus finished results and errors."""
+        with self._lock:
+            return self._conn.execute(f"SELECT COALESCE(SUM({_JOB_BYTES}), 0) FROM jobs").fetchone()[0]
+
+    def evict(self, retention_seconds: int, max_finished: int, max_bytes: int = 0) -> int:
+        """Delete finished jobs older than the retention window or beyond the newest ``max_finished``.
+
+        With ``max_bytes``, the oldest finished jobs are also deleted until
+        stored_bytes() is within it (pending jobs are never deleted). The
+        freed pages are then given back to the filesystem.
+        """
+        with self._lock:
+            deleted = 0
+            if retention_seconds > 0:
+                deleted += self._conn.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    (JOB_DONE, JOB_FAILED, time.time() - retention_seconds),
+                ).rowcount
+            deleted += self._conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?) "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (JOB_DONE, JOB_FAILED, max(max_finished, 0)),
+            ).rowcount
+            if max_bytes > 0:
+                excess = self._conn.execute(f"SELECT COALESCE(SUM({_JOB_BYTES}), 0) FROM jobs").fetchone()[0]
+                excess -= max_bytes
+                if excess > 0:
+                    victims = []
+                    for row in self._conn.execute(
+                        f"SELECT id, {_JOB_BYTES} AS bytes FROM jobs WHERE status IN (?, ?) ORDER BY finished_at",
+                        (JOB_DONE, JOB_FAILED),
+                    ):
+                        if excess <= 0:
+                            break
+                        victims.append((row["id"],))
+                        excess -= row["bytes"]
+                    self._conn.executemany("DELETE FROM jobs WHERE id = ?", victims)
+                    deleted += len(victims)
+            # Also reclaims the PDFs finish() dropped. execute() would free a single page per call
+            self._conn.executescript("PRAGMA incremental_vacuum")
+        return deleted
+
+
+class JobQueue:
+    """Owns the job store and the worker tasks that drain it.
+
+    ``pending`` counts queued and running jobs in memory (seeded from the
+    store on start), so the queue limit and the metrics gauge need no query.
+    """
+
+    POLL_SECONDS = 1.0
+
+    def __init__(self, workers: int = 1):
+        self.workers = max(workers, 1)
+        self.store: Optional[JobStore] = None
+        self.pending = 0
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        if self.store is None:
+            self.store = JobStore(settings.jobs_db_path)
+        recovered = self.store.recover()
+        if recovered:
+            logger.info("Re-queued %d interrupted jobs", recovered)
+        self.pending = self.store.pending_count()
+        self._evict()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            # Jobs cancelled mid-run stay "running" and are re-queued by recover() on the next start
+            self.store.close()
+            self.store = None
+        self.pending = 0
+
+    def _running_store(self) -> JobStore:
+        if self.store is None:
+            raise PoolBusyError("Job queue is not running")
+        return self.store
+
+    def _evict(self) -> int:
+        return self.store.evict(settings.jobs_retention_seconds, settings.jobs_max_entries, settings.jobs_max_mb * MB)
+
+    def _make_room(self, store: JobStore, size: int) -> bool:
+        """Whether ``size`` more bytes fit under CNIS_JOBS_MAX_MB, evicting finished jobs if needed."""
+        room = settings.jobs_max_mb * MB - size
+        if room <= 0:
+            return False
+        if store.stored_bytes() > room:
+            store.evict(settings.jobs_retention_seconds, settings.jobs_max_entries, room)
+        return store.stored_bytes() <= room
+
+    async def submit(self, file_bytes: bytes, view: str, extractor: Optional[str], filename: str) -> str:
+        """Store a queued job and wake a worker.
+
+        Raises PoolBusyError when the queue is stopped, or full: too many
+        pending jobs, or no room under CNIS_JOBS_MAX_MB even after evicting
+        finished ones.
+        """
+        store = self._running_store()
+        if self.pending >= settings.jobs_max_entries:
+            raise PoolBusyError(f"Job queue is full ({settings.jobs_max_entries} jobs pending)")
+        # Counted before the awaits below, so concurrent submits cannot overshoot the limit
+        self.pending += 1
+        try:
+            if settings.jobs_max_mb > 0 and not await asyncio.to_thread(self._make_room, store, len(file_bytes)):
+                raise PoolBusyError(f"Job queue is full ({settings.jobs_max_mb}MB stored)")
+            job_id = await asyncio.to_thread(store.create, file_bytes, view, extractor, filename)
+        except BaseException:
+            self.pending -= 1
+            raise
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """JobStore.get off the event loop. Raises PoolBusyError when the queue is stopped."""
+        return await asyncio.to_thread(self._running_store().get, job_id)
+
+    async def _worker(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        try:
+            data = await parse_pool.run(
+                run_job, job["pdf"], job["view"], job["extractor"] or settings.extractor,
+                settings.parse_page_workers,
+            )
+        except PoolBusyError:
+            # Synchronous requests are using every slot; try again shortly
+            await asyncio.to_thread(self.store.requeue, job["id"])
+            await asyncio.sleep(self.POLL_SECONDS)
+            return
+        except ParseError as e:
+            error = {"success": False, "message": str(e), "error_code": e.error_code}
+            await asyncio.to_thread(self.store.finish, job["id"], None, error)
+        except Exception as e:
+            logger.exception("Job %s failed", job["id"])
+            error = {"success": False, "message": f"Job failed: {e}", "error_code": "JOB_FAILED"}
+            await asyncio.to_thread(self.store.finish, job["id"], None, error)
+        else:
+            await asyncio.to_thread(self.store.finish, job["id"], data)
+        self.pending -= 1
+        await asyncio.to_thread(self._evict)
+
+
+job_queue = JobQueue(settings.job_workers)
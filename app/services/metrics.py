@@ -0,0 +1,133 @@
+"""Prometheus metrics for the parse service, served by GET /metrics.
+
+Everything is registered on a private ``registry`` so tests can read the
+exposition text without a Prometheus server or global state from other
+libraries.
+"""
+
+import time
+
+from fastapi import Request
+from fastapi.exception_handlers import http_exception_handler as default_http_exception_handler
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.jobs import job_queue
+from app.services.parse_pool import parse_pool
+from app.services.result_cache import result_cache
+from app.services.timings import StageTimings
+
+registry = CollectorRegistry()
+
+REQUESTS = Counter(
+    "cnis_requests_total", "Requests by route and outcome (success or error_code)",
+    ["route", "outcome"], registry=registry,
+)
+REQUEST_SECONDS = Histogram(
+    "cnis_request_seconds", "Request latency by route, until the response is fully sent",
+    ["route"], registry=registry,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+STAGE_SECONDS = Histogram(
+    "cnis_stage_seconds", "Duration of each request stage (see Server-Timing)",
+    ["stage"], registry=registry,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UPLOAD_BYTES = Histogram(
+    "cnis_upload_bytes", "Size of uploaded PDFs",
+    registry=registry,
+    buckets=(16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6),
+)
+PDF_PAGES = Histogram(
+    "cnis_pdf_pages", "Pages per parsed PDF",
+    registry=registry,
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+ROWS_PARSED = Counter(
+    "cnis_remuneracoes_parsed_total", "Remuneração rows parsed (rate() gives rows/s)",
+    registry=registry,
+)
+ROWS_PER_SECOND = Histogram(
+    "cnis_parse_rows_per_second", "Remuneração rows per second of parser time, per PDF",
+    registry=registry,
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000),
+)
+
+Gauge("cnis_parse_queue_depth", "Parses waiting for a pool worker",
+      registry=registry).set_function(lambda: parse_pool.queue_depth)
+Gauge("cnis_parse_in_flight", "Parses running or queued in the pool",
+      registry=registry).set_function(lambda: parse_pool.in_flight)
+Gauge("cnis_cache_hit_ratio", "Result cache hits / lookups since start",
+      registry=registry).set_function(lambda: result_cache.stats()["hit_ratio"])
+Gauge("cnis_cache_entries", "Results held in the cache",
+      registry=registry).set_function(lambda: result_cache.stats()["entries"])
+Gauge("cnis_jobs_pending", "Async jobs queued or running",
+      registry=registry).set_function(lambda: job_queue.pending)
+
+
+def observe_request(route: str, outcome: str, seconds: float, timings: StageTimings = None):
+    REQUESTS.labels(route=route, outcome=outcome).inc()
+    REQUEST_SECONDS.labels(route=route).observe(seconds)
+    if timings is not None:
+        for stage, seconds in timings.stages.items():
+            STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def observe_upload(size: int):
+    UPLOAD_BYTES.observe(size)
+
+
+def observe_parse(pages: int, rows: int, parser_seconds: float):
+    PDF_PAGES.observe(pages)
+    ROWS_PARSED.inc(rows)
+    if parser_seconds > 0:
+        ROWS_PER_SECOND.observe(rows / parser_seconds)
+
+
+def render() -> bytes:
+    return generate_latest(registry)
+
+
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Remember the error_code of the detail dict for MetricsMiddleware, then answer as usual."""
+    if isinstance(exc.detail, dict) and exc.detail.get("error_code"):
+        request.state.error_code = exc.detail["error_code"]
+    return await default_http_exception_handler(request, exc)
+
+
+class MetricsMiddleware:
+    """Counts each request by route template and outcome, and records its latency and stage timings.
+
+    Plain ASGI (see ServerTimingMiddleware for why): the status is taken
+    from the http.response.start message, the latency once the app returns.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = scope.setdefault("state", {})  # what request.state reads and writes
+        status_code = 500  # if the app fails before answering
+
+        async def send_recording_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_recording_status)
+        finally:
+            route = scope.get("route")
+            path = route.path if route is not None else "<unmatched>"
+            if path != "/metrics":
+                if status_code < 400:
+                    outcome = "success"
+                else:
+                    outcome = state.get("error_code") or f"http_{status_code}"
+                observe_request(path, outcome, time.perf_counter() - started, state.get("stage_timings"))
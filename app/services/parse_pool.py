@@ -0,0 +1,321 @@
+"""Runs CNIS parsing in a process pool so the event loop stays responsive."""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Connection
+from typing import Awaitable, Callable, List, Optional, Tuple, Union
+
+from app.config import settings
+from app.services.parser_service import (
+    iter_parse_pdf, parse_pdf_timed, CnisRecords, ClientDisconnectedError, ParseError, ParseStats, ParseTimeoutError, PLAN_FULL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Worker side: the pool's shared deadline array and the sending ends of its event pipes (see ParsePool)
+_deadlines = None
+_pipes = None
+
+
+def _init_worker(deadlines, pipes):
+    global _deadlines, _pipes
+    _deadlines = deadlines
+    _pipes = pipes
+
+
+def _call_with_deadline(slot: int, fn, *args):
+    """Run ``fn(*args, deadline=...)`` with a deadline the event loop can still move."""
+    return fn(*args, deadline=lambda: _deadlines[slot])
+
+
+def _send_events(slot: int, fn, *args):
+    """Send each item of the generator ``fn(*args, deadline=...)`` through the slot's pipe, then None."""
+    pipe = _pipes[slot]
+    try:
+        for event in fn(*args, deadline=lambda: _deadlines[slot]):
+            pipe.send(event)
+    finally:
+        pipe.send(None)
+
+
+class PoolBusyError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+    pass
+
+
+class ParsePool:
+    """Bounded ProcessPoolExecutor wrapper.
+
+    At most ``workers + queue_size`` parses are accepted at once; anything
+    beyond that is rejected immediately instead of piling up in memory.
+
+    Each accepted call holds a slot in an array of deadlines shared with the
+    workers. Calls made with a deadline read it from their slot at every
+    check, so the pool cancels one by setting its slot to 0. Each slot also
+    has a pipe, through which stream() calls send back what they yield.
+    """
+
+    # How often a running call checks whether its client is still connected
+    DISCONNECT_POLL_SECONDS = 0.25
+
+    def __init__(self, workers: int = 0, queue_size: int = 0):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.queue_size = max(queue_size, 0)
+        self._executor = None
+        self._in_flight = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._deadlines = None
+        self._pipes: List[Tuple[Connection, Connection]] = []
+        self._free_slots = []
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._in_flight - self.workers, 0)
+
+    def start(self):
+        if self._deadlines is None:
+            # Kept across pool restarts: slots of calls still running stay valid
+            self._deadlines = self._context.Array("d", self.capacity, lock=False)
+            self._pipes = [self._context.Pipe(duplex=False) for _ in range(self.capacity)]
+            self._free_slots = list(range(self.capacity))
+        if self._executor is None:
+            # spawn: forking a process that already runs the server threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(self._deadlines, [sending for _, sending in self._pipes]),
+            )
+            logger.info("Parse pool started with %d workers (queue %d)", self.workers, self.queue_size)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            logger.info("Parse pool stopped")
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Drop ``executor`` after one of its workers died; start() builds a new one."""
+        if self._executor is executor:
+            logger.error("Parse worker died, recycling pool")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _acquire(self) -> int:
+        """Take a slot for a new call, starting the pool if needed. Raises PoolBusyError when full."""
+        if self._in_flight >= self.capacity:
+            raise PoolBusyError(f"Parser queue is full ({self.capacity} requests in flight)")
+        self.start()
+        if not self._free_slots:
+            # Every slot is held by a call whose caller gave up but whose worker is still running
+            raise PoolBusyError(f"Parser queue is full ({self.capacity} requests in flight)")
+        return self._free_slots.pop()
+
+    async def run(self, fn, *args, deadline: Optional[float] = None,
+                  disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        """Run ``fn(*args)`` in a worker process and await its result.
+
+        With a ``deadline`` (a time.time() value) or ``disconnected``, ``fn``
+        is called as ``fn(*args, deadline=callable)`` and must give up once
+        the callable's value has passed (never, without a ``deadline``).
+        ``disconnected`` is polled while the call runs; once it returns True
+        the deadline is moved to 0, and the ParseTimeoutError this causes is
+        raised as ClientDisconnectedError.
+        """
+        slot = self._acquire()
+        self._in_flight += 1
+        self._deadlines[slot] = math.inf if deadline is None else deadline
+        executor = self._executor
+        submitted = None
+        try:
+            if deadline is None and disconnected is None:
+                submitted = self._executor.submit(fn, *args)
+            else:
+                submitted = self._executor.submit(_call_with_deadline, slot, fn, *args)
+            # The slot is free again once the worker is done with it, even if its caller gave up earlier
+            submitted.add_done_callback(lambda _: self._free_slots.append(slot))
+            future = asyncio.wrap_future(submitted)
+            if disconnected is None:
+                return await future
+            return await self._watch(future, slot, disconnected)
+        except BrokenProcessPool:
+            self._recycle(executor)
+            raise ParseError("Parser worker crashed")
+        except asyncio.CancelledError:
+            self._deadlines[slot] = 0.0
+            raise
+        finally:
+            if submitted is None:
+                self._free_slots.append(slot)
+            self._in_flight -= 1
+
+    async def _watch(self, future: asyncio.Future, slot: int, disconnected: Callable[[], Awaitable[bool]]):
+        # Request.is_disconnected only sees http.disconnect if no BaseHTTPMiddleware wraps the app
+        while not future.done():
+            if await disconnected():
+                logger.info("Client disconnected, cancelling parse")
+                self._deadlines[slot] = 0.0
+                try:
+                    return await future
+                except ParseTimeoutError as e:
+                    raise ClientDisconnectedError("Client disconnected before the parse finished", e.stats)
+            await asyncio.wait((future,), timeout=self.DISCONNECT_POLL_SECONDS)
+        return future.result()
+
+    def stream(self, fn, *args, deadline: Optional[float] = None) -> "ParseStream":
+        """Run the generator ``fn(*args, deadline=callable)`` in a worker process.
+
+        Returns a ParseStream of what the generator yields, available as soon
+        as it is yielded. The call takes a place like run() does (PoolBusyError
+        when there is none); see run() for ``deadline``.
+        """
+        slot = self._acquire()
+        self._deadlines[slot] = math.inf if deadline is None else deadline
+        executor = self._executor
+        try:
+            submitted = executor.submit(_send_events, slot, fn, *args)
+        except BrokenProcessPool:
+            self._free_slots.append(slot)
+            self._recycle(executor)
+            raise ParseError("Parser worker crashed")
+        self._in_flight += 1
+        return ParseStream(self, slot, executor, submitted)
+
+    def _release(self, slot: int):
+        self._free_slots.append(slot)
+        self._in_flight -= 1
+
+    async def parse(self, source: Union[bytes, str], extractor: Optional[str] = None,
+                    plan: str = PLAN_FULL, deadline: Optional[float] = None,
+                    disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> Tuple[CnisRecords, ParseStats]:
+        """Parse the PDF bytes (or the PDF at a path) in a worker; returns the records and their ParseStats.
+
+        See run() for ``deadline`` and ``disconnected``.
+        """
+        return await self.run(parse_pdf_timed, source, settings.parse_page_workers,
+                              extractor or settings.extractor, plan, settings.columnar_remuneracoes,
+                              settings.max_pages, deadline=deadline, disconnected=disconnected)
+
+    def iter_parse(self, source: Union[bytes, str], extractor: Optional[str] = None,
+                   deadline: Optional[float] = None) -> "ParseStream":
+        """iter_parse_pdf in a worker (plan PLAN_FULL): a ParseStream of its events, see stream()."""
+        return self.stream(iter_parse_pdf, source, extractor or settings.extractor, settings.columnar_remuneracoes,
+                           settings.max_pages, deadline=deadline)
+
+
+class ParseStream:
+    """Async iterator over the items a ParsePool.stream() call yields in its worker.
+
+    Items are read from the slot's pipe as soon as they arrive and queued
+    here, so the worker never waits for the consumer: a slow client does
+    not hold the parse (or its deadline) back. Iteration ends when the
+    worker is done, raising its exception if it failed.
+    """
+
+    _DONE = object()
+
+    def __init__(self, pool: ParsePool, slot: int, executor: ProcessPoolExecutor, submitted):
+        self._pool = pool
+        self._slot = slot
+        self._executor = executor
+        self._receiving = pool._pipes[slot][0]
+        self._loop = asyncio.get_running_loop()
+        self._items = asyncio.Queue()
+        self._closed = False
+        self._drained = False  # the worker's final None has been read
+        self._finished = False
+        self._callbacks = []
+        self._future = asyncio.wrap_future(submitted)
+        self._future.add_done_callback(self._worker_done)
+        self._loop.add_reader(self._receiving.fileno(), self._receive)
+
+    def _receive(self):
+        while not self._drained and self._receiving.poll():
+            item = self._receiving.recv()
+            if item is None:
+                self._drained = True
+            elif not self._closed:
+                self._items.put_nowait(item)
+        if self._drained:
+            self._loop.remove_reader(self._receiving.fileno())
+            self._finish()
+
+    def _worker_done(self, future: asyncio.Future):
+        if self._drained:
+            self._finish()
+        elif future.cancelled() or isinstance(future.exception(), BrokenProcessPool):
+            # No final None is coming; a dead worker may have left part of an item behind
+            self._loop.remove_reader(self._receiving.fileno())
+            self._discard_pipe()
+            self._drained = True
+            if not future.cancelled():
+                self._pool._recycle(self._executor)
+            self._finish()
+        # Otherwise the final None is still in the pipe; _receive finishes
+
+    def _discard_pipe(self):
+        fd = self._receiving.fileno()
+        os.set_blocking(fd, False)
+        try:
+            while os.read(fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        finally:
+            os.set_blocking(fd, True)
+
+    def _finish(self):
+        # The worker is done and its pipe drained: the slot can take another call
+        if self._finished or not self._future.done():
+            return
+        self._finished = True
+        self._pool._release(self._slot)
+        self._items.put_nowait(self._DONE)
+        for callback in self._callbacks:
+            callback()
+
+    def add_done_callback(self, callback: Callable[[], None]):
+        """Call ``callback()`` once the worker is done (immediately if it already is)."""
+        if self._finished:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def close(self):
+        """Stop the worker at its next deadline check and drop what it still sends."""
+        self._closed = True
+        if not self._finished:
+            self._pool._deadlines[self._slot] = 0.0
+
+    def __aiter__(self) -> "ParseStream":
+        return self
+
+    async def __anext__(self):
+        item = await self._items.get()
+        if item is not self._DONE:
+            return item
+        self._items.put_nowait(item)
+        if self._future.cancelled():
+            raise ParseError("Parser pool stopped")
+        error = self._future.exception()
+        if isinstance(error, BrokenProcessPool):
+            raise ParseError("Parser worker crashed")
+        if error is not None:
+            raise error
+        raise StopAsyncIteration
+
+
+parse_pool = ParsePool(settings.parse_workers, settings.parse_queue_size)
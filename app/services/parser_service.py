@@ -1,43 +1,137 @@
-"""Wraps CNISParserFinal with proper temp file handling."""
+"""Wraps CNISParserFinal for uploads (held in memory or spooled to a temporary file)."""
 
 import os
 import sys
-import tempfile
 import logging
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Union
 
 # Add project root to path so we can import the parser
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
-from cnis_parser_final import CNISParserFinal
+from cnis_parser_final import (  # noqa: F401
+    CNISParserFinal, CnisRecords, PersonalInfo, Remuneracao, Vinculo, VinculoMetadata, PARSER_VERSION, EXTRACTORS,
+    PLAN_PERSONAL, PLAN_COUNTS, PLAN_FULL, NotCnisError, PageLimitError, DeadlineExceeded,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class ParseError(Exception):
     """Raised when the parser fails to extract data."""
-    pass
+    error_code = "PARSE_ERROR"
 
 
-def parse_pdf(file_bytes: bytes) -> dict:
-    """Parse a CNIS PDF from bytes. Returns the raw parser dict."""
-    tmp_path = None
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
+class NotCnisDocumentError(ParseError):
+    """Raised when the PDF is not a CNIS extract (rejected after reading its first page)."""
+    error_code = "NOT_CNIS"
+
+
+class TooManyPagesError(ParseError):
+    """Raised when the PDF has more pages than ``max_pages``, before any text is extracted."""
+    error_code = "TOO_MANY_PAGES"
+
+
+def _rejection(e: Exception) -> ParseError:
+    """Map the parser's fail-fast errors to ParseError subclasses."""
+    if isinstance(e, PageLimitError):
+        return TooManyPagesError(str(e))
+    return NotCnisDocumentError(str(e))
+
+
+class ParseStats(NamedTuple):
+    """What one parse cost: the parser's per-stage seconds and the pages it read."""
+    stages: Dict[str, float]
+    pages: int
+
+
+class ParseTimeoutError(ParseError):
+    """Raised when the parse deadline passes; ``stats`` covers the work done until then."""
+    error_code = "PARSE_TIMEOUT"
+
+    def __init__(self, message: str, stats: Optional[ParseStats] = None):
+        super().__init__(message)
+        self.stats = stats
+
+    def __reduce__(self):
+        # Keep ``stats`` when the error is sent back from a pool worker
+        return type(self), (str(self), self.stats)
+
+
+class ClientDisconnectedError(ParseTimeoutError):
+    """Raised instead of ParseTimeoutError when the parse was cut short because the client went away."""
+    error_code = "CLIENT_DISCONNECTED"
+
 
-        parser = CNISParserFinal(pdf_path=tmp_path, debug=False)
-        result = parser.parse()
+Deadline = Union[float, Callable[[], float], None]
 
-        if not result or not result.get('personal_info'):
+
+def parse_pdf(file_bytes: Union[bytes, str], page_workers: int = 1, extractor: Optional[str] = None,
+              plan: str = PLAN_FULL, columnar: bool = False, max_pages: int = 0,
+              deadline: Deadline = None) -> CnisRecords:
+    """Parse a CNIS PDF from bytes (or a path). Returns the parser's records (see CnisRecords).
+
+    An in-memory upload buffer is handed to the parser directly; nothing touches disk.
+    ``extractor`` names the text backend (see EXTRACTORS); ``plan`` is one of
+    PLAN_PERSONAL / PLAN_COUNTS / PLAN_FULL; ``columnar`` keeps remunerações
+    as RemuneracaoColumns.
+
+    PDFs that are not CNIS extracts raise NotCnisDocumentError once their
+    first page is read, and with ``max_pages`` > 0 longer PDFs raise
+    TooManyPagesError before any page is extracted. Past ``deadline`` (see
+    CNISParserFinal) the parse stops with ParseTimeoutError.
+    """
+    return parse_pdf_timed(file_bytes, page_workers, extractor, plan, columnar, max_pages, deadline)[0]
+
+
+def parse_pdf_timed(file_bytes: Union[bytes, str], page_workers: int = 1, extractor: Optional[str] = None,
+                    plan: str = PLAN_FULL, columnar: bool = False,
+                    max_pages: int = 0, deadline: Deadline = None) -> Tuple[CnisRecords, ParseStats]:
+    """parse_pdf, also returning ParseStats (see CNISParserFinal.stage_timings and pages_parsed)."""
+    try:
+        parser = CNISParserFinal(pdf_path=file_bytes, debug=False, page_workers=page_workers,
+                                 extractor=extractor, plan=plan, columnar=columnar,
+                                 require_cnis=True, max_pages=max_pages, deadline=deadline)
+        result = parser.parse_records()
+
+        if not result or not result.personal_info:
             raise ParseError("Could not extract data from PDF")
 
-        return result
+        return result, ParseStats(parser.stage_timings(), parser.pages_parsed)
 
     except ParseError:
         raise
+    except DeadlineExceeded as e:
+        raise ParseTimeoutError(str(e), ParseStats(parser.stage_timings(), parser.pages_parsed))
+    except (NotCnisError, PageLimitError) as e:
+        raise _rejection(e)
+    except Exception as e:
+        logger.exception("Parser failed")
+        raise ParseError(f"Failed to parse CNIS PDF: {e}")
+
+
+def iter_parse_pdf(file_bytes: Union[bytes, str], extractor: Optional[str] = None, columnar: bool = False,
+                   max_pages: int = 0, deadline: Deadline = None) -> Iterator[Tuple[str, object]]:
+    """Parse a CNIS PDF incrementally (plan PLAN_FULL).
+
+    Yields ``('personal_info', PersonalInfo)`` first, then one
+    ``('vinculo', Vinculo)`` per employment relationship as soon as the
+    parser completes it, and ``('stats', ParseStats)`` once the document is done.
+    """
+    try:
+        parser = CNISParserFinal(pdf_path=file_bytes, debug=False, extractor=extractor, columnar=columnar,
+                                 require_cnis=True, max_pages=max_pages, deadline=deadline)
+        stream = parser.iter_vinculos()
+        # personal_info lives on page 1, so it is complete once the first vínculo is out
+        first = next(stream, None)
+        yield 'personal_info', parser.personal
+        if first is not None:
+            yield 'vinculo', first
+            for emp in stream:
+                yield 'vinculo', emp
+        yield 'stats', ParseStats(parser.stage_timings(), parser.pages_parsed)
+    except DeadlineExceeded as e:
+        raise ParseTimeoutError(str(e), ParseStats(parser.stage_timings(), parser.pages_parsed))
+    except (NotCnisError, PageLimitError) as e:
+        raise _rejection(e)
     except Exception as e:
         logger.exception("Parser failed")
         raise ParseError(f"Failed to parse CNIS PDF: {e}")
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
@@ -1,19 +1,21 @@
-"""Transforms parser output into ProcStudio Planilha.spreadsheet_data schema."""
+"""Transforms parser records into ProcStudio Planilha.spreadsheet_data schema."""
 
 import secrets
 from app.utils.type_mapper import map_tipo_filiado, is_beneficio
+from app.services.parser_service import CnisRecords, Vinculo
+from app.services.response_transformer import count_remuneracoes
 
 
 def _generate_uid():
     return f"p-{secrets.token_hex(4)}"
 
 
-def _transform_periodo(seq: int, emp: dict) -> dict:
-    data = emp.get("Data", {})
-    tipo = data.get("Tipo_Filiado_Vinculo") or ""
-    origem = data.get("Origem_Vinculo") or ""
-    inicio = data.get("Inicio") or ""
-    fim = data.get("Fim") or ""
+def _transform_periodo(seq: int, emp: Vinculo) -> dict:
+    data = emp.data
+    tipo = data.tipo_filiado_vinculo or ""
+    origem = data.origem_vinculo or ""
+    inicio = data.inicio or ""
+    fim = data.fim or ""
 
     # For benefícios, use the tipo as name; for employment, use company name
     if is_beneficio(tipo):
@@ -45,31 +47,31 @@ def _transform_periodo(seq: int, emp: dict) -> dict:
         "grauDeficiencia": None,
         "meta": {
             "tipoVinculo": tipo,
-            "codigoEmpresa": data.get("Codigo_Empresa") or "",
-            "indicadores": data.get("Indicadores") or "",
-            "totalRemuneracoes": len(emp.get("Remuneracoes", [])),
+            "codigoEmpresa": data.codigo_empresa or "",
+            "indicadores": data.indicadores or "",
+            "totalRemuneracoes": count_remuneracoes(emp),
             "inicioCnis": inicio,
             "fimCnis": fim,
         },
     }
 
 
-def transform_to_planilha(parser_result: dict) -> dict:
+def transform_to_planilha(parser_result: CnisRecords) -> dict:
     """Transform parser output to Planilha.spreadsheet_data schema.
 
     Returns a dict that can be directly stored in Planilha.spreadsheet_data (JSONB).
     """
-    personal = parser_result.get("personal_info", {})
-    empls = parser_result.get("employment_relationships", [])
+    personal = parser_result.personal_info
+    empls = parser_result.vinculos
 
     periodos = [_transform_periodo(i + 1, emp) for i, emp in enumerate(empls)]
 
     return {
         "segurado": {
-            "cpf": personal.get("CPF") or "",
-            "nome": personal.get("Nome") or "",
+            "cpf": personal.cpf or "",
+            "nome": personal.nome or "",
             "sexo": "",  # CNIS does not contain sex
-            "dataDeNascimento": personal.get("Data_Nascimento") or "",
+            "dataDeNascimento": personal.data_nascimento or "",
             "customerUuid": "",
         },
         "tabs": [
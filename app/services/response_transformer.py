@@ -1,69 +1,85 @@
-"""Transforms raw parser output dict into standardized API JSON response."""
+"""Transforms parser records (CnisRecords) into standardized API JSON response."""
 
+from app.services.parser_service import CnisRecords, PersonalInfo, Remuneracao, Vinculo, VinculoMetadata
 
-def transform_personal_info(raw: dict) -> dict:
+
+def count_remuneracoes(emp: Vinculo) -> int:
+    """Number of remunerações of a vínculo, whether rows were parsed or only counted."""
+    return emp.remuneracao_count
+
+
+def transform_personal_info(raw: PersonalInfo) -> dict:
+    return {
+        "nit": raw.nit or "",
+        "cpf": raw.cpf or "",
+        "nome": raw.nome or "",
+        "data_nascimento": raw.data_nascimento or "",
+        "nome_mae": raw.nome_mae or "",
+        "data_extracao": raw.data_extracao or "",
+    }
+
+
+def transform_vinculo_header(emp: Vinculo) -> dict:
+    """The header fields of transform_vinculo (no remuneracoes or metadata)."""
+    data = emp.data
     return {
-        "nit": raw.get("NIT") or "",
-        "cpf": raw.get("CPF") or "",
-        "nome": raw.get("Nome") or "",
-        "data_nascimento": raw.get("Data_Nascimento") or "",
-        "nome_mae": raw.get("Nome_Mae") or "",
-        "data_extracao": raw.get("Data_Extracao") or "",
+        "sequencia": emp.sequence,
+        "nit": data.nit or "",
+        "codigo_empresa": data.codigo_empresa or "",
+        "origem_vinculo": data.origem_vinculo or "",
+        "matricula_trabalhador": data.matricula_trabalhador or "",
+        "tipo_filiado": data.tipo_filiado_vinculo or "",
+        "inicio": data.inicio or "",
+        "fim": data.fim or "",
+        "ultima_remuneracao": data.ultima_remu or "",
+        "indicadores": data.indicadores or "",
     }
 
 
-def transform_vinculo(emp: dict) -> dict:
-    data = emp.get("Data", {})
+def transform_remuneracao(r: Remuneracao) -> dict:
     return {
-        "sequencia": emp.get("sequence", 0),
-        "nit": data.get("NIT") or "",
-        "codigo_empresa": data.get("Codigo_Empresa") or "",
-        "origem_vinculo": data.get("Origem_Vinculo") or "",
-        "matricula_trabalhador": data.get("Matricula_Trabalhador") or "",
-        "tipo_filiado": data.get("Tipo_Filiado_Vinculo") or "",
-        "inicio": data.get("Inicio") or "",
-        "fim": data.get("Fim") or "",
-        "ultima_remuneracao": data.get("Ultima_Remu") or "",
-        "indicadores": data.get("Indicadores") or "",
-        "remuneracoes": [
-            {
-                "competencia": r.get("Competencia") or "",
-                "remuneracao": r.get("Remuneracao"),
-                "indicadores": r.get("Indicadores") or "",
-            }
-            for r in emp.get("Remuneracoes", [])
-        ],
-        "metadata": transform_metadata(emp.get("Metadata", {})),
+        "competencia": r.competencia or "",
+        "remuneracao": r.remuneracao,
+        "indicadores": r.indicadores or "",
     }
 
 
-def transform_vinculo_summary(emp: dict) -> dict:
+def transform_vinculo(emp: Vinculo) -> dict:
+    v = transform_vinculo_header(emp)
+    v["remuneracoes"] = [transform_remuneracao(r) for r in emp.remuneracoes]
+    v["metadata"] = transform_metadata(emp.metadata)
+    return v
+
+
+def transform_vinculo_summary(emp: Vinculo) -> dict:
     """Like transform_vinculo but without remuneracoes array."""
-    v = transform_vinculo(emp)
-    v.pop("remuneracoes", None)
-    v["total_remuneracoes"] = len(emp.get("Remuneracoes", []))
+    v = transform_vinculo_header(emp)
+    v["metadata"] = transform_metadata(emp.metadata)
+    v["total_remuneracoes"] = count_remuneracoes(emp)
     return v
 
 
-def transform_metadata(raw: dict) -> dict:
+def transform_metadata(raw: VinculoMetadata) -> dict:
     return {
-        "nit_match": raw.get("Nit_Match_Main_NIT", False),
-        "competencias_completas": raw.get("All_Competences_Complete", False),
-        "tem_data_inicio": raw.get("Data_Inicio", False),
-        "tem_data_fim": raw.get("Data_Fim", False),
-        "tem_ultima_remuneracao": raw.get("Ultima_Remu", False),
-        "datas_conferem": raw.get("All_Date_Matches", False),
+        "nit_match": raw.nit_match_main_nit,
+        "competencias_completas": raw.all_competences_complete,
+        "tem_data_inicio": raw.data_inicio,
+        "tem_data_fim": raw.data_fim,
+        "tem_ultima_remuneracao": raw.ultima_remu,
+        "datas_conferem": raw.all_date_matches,
+        "competencias_faltantes": list(raw.missing_competencias),
+        "competencias_extras": list(raw.extra_competencias),
     }
 
 
-def transform_full(parser_result: dict) -> dict:
+def transform_full(parser_result: CnisRecords) -> dict:
     """Transform full parser output to standardized API response data."""
-    empls = parser_result.get("employment_relationships", [])
+    empls = parser_result.vinculos
     vinculos = [transform_vinculo(e) for e in empls]
-    total_remus = sum(len(e.get("Remuneracoes", [])) for e in empls)
+    total_remus = sum(count_remuneracoes(e) for e in empls)
 
     return {
-        "personal_info": transform_personal_info(parser_result.get("personal_info", {})),
+        "personal_info": transform_personal_info(parser_result.personal_info),
         "vinculos": vinculos,
         "resumo": {
             "total_vinculos": len(vinculos),
@@ -72,15 +88,15 @@ def transform_full(parser_result: dict) -> dict:
     }
 
 
-def transform_summary(parser_result: dict) -> dict:
+def transform_summary(parser_result: CnisRecords) -> dict:
     """Transform parser output to summary (no remuneracoes arrays)."""
-    empls = parser_result.get("employment_relationships", [])
+    empls = parser_result.vinculos
 
     return {
-        "personal_info": transform_personal_info(parser_result.get("personal_info", {})),
+        "personal_info": transform_personal_info(parser_result.personal_info),
         "vinculos": [transform_vinculo_summary(e) for e in empls],
         "resumo": {
             "total_vinculos": len(empls),
-            "total_remuneracoes": sum(len(e.get("Remuneracoes", [])) for e in empls),
+            "total_remuneracoes": sum(count_remuneracoes(e) for e in empls),
         },
     }
@@ -0,0 +1,94 @@
+"""In-process LRU cache of parser records, keyed by PDF content."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.config import settings
+from app.services.parser_service import CnisRecords, PARSER_VERSION, PLAN_FULL
+
+
+def content_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def cache_key(file_bytes: Optional[bytes], extractor: Optional[str] = None, plan: str = PLAN_FULL,
+              digest: Optional[str] = None) -> str:
+    """SHA-256 of the PDF plus the parser version, text backend and parse plan of the result.
+
+    Pass ``digest`` (from content_digest, or SpooledUpload.digest) to build keys
+    without hashing the bytes again; ``file_bytes`` may then be None.
+    """
+    digest = digest or content_digest(file_bytes)
+    return f"{digest}:{PARSER_VERSION}:{extractor or settings.extractor}:{plan}"
+
+
+class ResultCache:
+    """LRU + TTL cache of ``CNISParserFinal.parse_records()`` results.
+
+    Cached records are shared between requests, so callers must treat them as
+    read-only (the transformers only read from them).
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: int = 3600):
+        self.max_entries = max(max_entries, 0)
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CnisRecords]:
+        return self.get_any((key,))
+
+    def get_any(self, keys: Iterable[str]) -> Optional[CnisRecords]:
+        """First cached value among ``keys``; counts as a single hit or miss."""
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and self._expired(entry[0]):
+                    del self._entries[key]
+                    self.evictions += 1
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: CnisRecords):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds
+
+
+result_cache = ResultCache(settings.cache_max_entries, settings.cache_ttl_seconds)
@@ -0,0 +1,98 @@
+"""Per-request stage timings, reported as JSON, a Server-Timing header and a log line."""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Order in which stages are reported
+STAGES = ("read", "cache", "queue", "open", "extract", "parse", "metadata", "transform", "serialize")
+
+
+class StageTimings:
+    """Seconds spent per stage of one request.
+
+    ``queue`` is the parse-pool overhead: waiting for a worker plus moving
+    the PDF and result between processes. ``open``/``extract``/``parse``/
+    ``metadata`` come from the parser itself and are absent on cache hits.
+    ``serialize`` (rendering the JSON body) happens after the body's own
+    ``timings`` are taken, so it only shows up in the Server-Timing header.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.cache_hit: Optional[bool] = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add_parse(self, parser_stages: Dict[str, float], wall_seconds: float):
+        """Record a pool parse: the parser's own stages plus the remaining wall time as ``queue``."""
+        for stage, seconds in parser_stages.items():
+            self.add(stage, seconds)
+        self.add("queue", max(wall_seconds - sum(parser_stages.values()), 0.0))
+
+    def as_ms(self) -> Dict[str, float]:
+        ordered = [s for s in STAGES if s in self.stages] + [s for s in self.stages if s not in STAGES]
+        return {stage: round(self.stages[stage] * 1000, 2) for stage in ordered}
+
+    def server_timing(self, total_seconds: Optional[float] = None) -> str:
+        parts = []
+        for stage, ms in self.as_ms().items():
+            if stage == "cache" and self.cache_hit is not None:
+                parts.append(f'cache;desc="{"hit" if self.cache_hit else "miss"}";dur={ms}')
+            else:
+                parts.append(f"{stage};dur={ms}")
+        if total_seconds is not None:
+            parts.append(f"total;dur={round(total_seconds * 1000, 2)}")
+        return ", ".join(parts)
+
+
+def start_timings(request: Request) -> StageTimings:
+    """Attach a StageTimings to the request; ServerTimingMiddleware reports it."""
+    request.state.stage_timings = StageTimings()
+    return request.state.stage_timings
+
+
+class ServerTimingMiddleware:
+    """Adds the Server-Timing header (and a log line) to requests that called start_timings.
+
+    Plain ASGI rather than ``@app.middleware("http")``: BaseHTTPMiddleware
+    hides the client's http.disconnect from the endpoint, which then cannot
+    cancel its parse (see ParsePool.run).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = scope.setdefault("state", {})  # what request.state reads and writes
+
+        async def send_with_header(message: Message):
+            if message["type"] == "http.response.start":
+                timings = state.get("stage_timings")
+                if timings is not None:
+                    header = timings.server_timing(time.perf_counter() - started)
+                    MutableHeaders(scope=message).append("Server-Timing", header)
+                    logger.info("%s %s -> %d [%s]", scope["method"], scope["path"], message["status"], header)
+            await send(message)
+
+        await self.app(scope, receive, send_with_header)
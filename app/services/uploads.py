@@ -0,0 +1,257 @@
+"""Streaming intake of uploaded PDFs into size-capped spooled buffers."""
+
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from typing import Collection, Dict, List, Optional, Union
+
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from starlette.requests import Request
+
+PDF_MAGIC = b"%PDF-"
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as an upload crosses the size limit."""
+
+    def __init__(self, size: int, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.size = size  # bytes seen when the limit was crossed
+        self.max_bytes = max_bytes
+
+
+class NotAPdfError(Exception):
+    """Raised when an upload does not start with the %PDF- magic."""
+    pass
+
+
+class SpooledUpload:
+    """An uploaded PDF, with its size and SHA-256 computed while it was read.
+
+    The body stays in memory up to ``spool_bytes`` and moves to a named
+    temporary file beyond that, so large uploads are handed to the parse
+    workers as a path (see ``source``) instead of being copied into this
+    process. Use as a context manager, or call close(), to delete the file.
+    """
+
+    def __init__(self, spool_bytes: int, filename: Optional[str] = None):
+        self.spool_bytes = spool_bytes
+        self.filename = filename
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._buffer = BytesIO()
+        self._file = None  # NamedTemporaryFile once spilled
+
+    def write(self, chunk: bytes):
+        if self._file is None and self.size + len(chunk) > self.spool_bytes:
+            self._file = tempfile.NamedTemporaryFile(prefix="cnis-upload-", suffix=".pdf", delete=False)
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = BytesIO()
+        (self._file or self._buffer).write(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def digest(self) -> str:
+        """Hex SHA-256 of the body (what result_cache.content_digest returns for the bytes)."""
+        return self._sha256.hexdigest()
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """What to give the parser: the bytes, or the temporary file's path once spilled."""
+        if self._file is None:
+            return self._buffer.getvalue()
+        self._file.flush()
+        return self._file.name
+
+    def getvalue(self) -> bytes:
+        if self._file is None:
+            return self._buffer.getvalue()
+        self._file.flush()
+        with open(self._file.name, "rb") as f:
+            return f.read()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._file.name)
+            except FileNotFoundError:
+                pass
+            self._file = None
+        self._buffer = BytesIO()
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TooManyFilesError(Exception):
+    """Raised as soon as a request carries more files than allowed."""
+
+    def __init__(self, max_files: int):
+        super().__init__(f"More than {max_files} files")
+        self.max_files = max_files
+
+
+class InvalidFormError(Exception):
+    """Raised when a request body is not a well-formed multipart/form-data body."""
+    pass
+
+
+class FormFile:
+    """One file field of a request read by read_pdf_form.
+
+    ``upload`` holds the file, or ``error`` (NotAPdfError, UploadTooLargeError)
+    says why it was dropped while it arrived. The caller owns ``upload``.
+    """
+
+    def __init__(self, field: str, filename: str):
+        self.field = field
+        self.filename = filename
+        self.upload: Optional[SpooledUpload] = None
+        self.error: Optional[Exception] = None
+
+    def close(self):
+        if self.upload is not None:
+            self.upload.close()
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+class _PdfFormReader:
+    """python-multipart callbacks writing the wanted file fields into SpooledUploads."""
+
+    def __init__(self, fields: Collection[str], max_file_bytes: int, spool_bytes: int,
+                 max_files: Optional[int] = None):
+        self.fields = fields
+        self.max_file_bytes = max_file_bytes
+        self.spool_bytes = spool_bytes
+        self.max_files = max_files
+        self.files: List[FormFile] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._name = b""
+        self._value = b""
+        self._current: Optional[FormFile] = None
+        self._head = b""  # first bytes of the current file, up to len(PDF_MAGIC)
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._current = None
+        self._head = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._name.lower()] = self._value
+        self._name = self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        field = _decode(options.get(b"name", b""))
+        # Other fields (and plain form values) are skipped without being stored
+        if b"filename" in options and field in self.fields:
+            if self.max_files is not None and len(self.files) >= self.max_files:
+                raise TooManyFilesError(self.max_files)
+            self._current = FormFile(field, _decode(options[b"filename"]))
+            self._current.upload = SpooledUpload(self.spool_bytes, self._current.filename)
+            self.files.append(self._current)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        part = self._current
+        if part is None or part.upload is None:
+            return
+        chunk = data[start:end]
+        if len(self._head) < len(PDF_MAGIC):
+            self._head += chunk[:len(PDF_MAGIC) - len(self._head)]
+        if not PDF_MAGIC.startswith(self._head):
+            self._reject(NotAPdfError("File does not start with %PDF-"))
+        elif part.upload.size + len(chunk) > self.max_file_bytes:
+            self._reject(UploadTooLargeError(part.upload.size + len(chunk), self.max_file_bytes))
+        else:
+            part.upload.write(chunk)
+
+    def on_part_end(self):
+        part = self._current
+        if part is not None and part.upload is not None and self._head != PDF_MAGIC:
+            self._reject(NotAPdfError("File does not start with %PDF-" if self._head else "File is empty"))
+        self._current = None
+
+    def _reject(self, error: Exception):
+        # The rest of this file is dropped as it arrives
+        self._current.close()
+        self._current.upload = None
+        self._current.error = error
+
+    def close(self):
+        for part in self.files:
+            part.close()
+
+
+async def read_pdf_form(request: Request, fields: Collection[str], max_file_bytes: int,
+                        max_body_bytes: Optional[int], spool_bytes: int,
+                        max_files: Optional[int] = None) -> List[FormFile]:
+    """Read the file fields named ``fields`` of a multipart/form-data request, as they arrive.
+
+    Starlette's own form parsing stores the whole body before the route
+    runs; here each file goes straight into a SpooledUpload, so it is
+    stored once, and the limits apply as bytes come in. A file not starting
+    with %PDF-, or growing past ``max_file_bytes``, is dropped with its
+    ``error`` set. UploadTooLargeError is raised before anything is read
+    when Content-Length exceeds ``max_body_bytes`` (None: no limit), and as
+    soon as that many bytes have arrived otherwise. TooManyFilesError is
+    raised when file number ``max_files`` + 1 begins (None: no limit).
+    """
+    length = request.headers.get("content-length", "")
+    if max_body_bytes is not None and length.isdigit() and int(length) > max_body_bytes:
+        raise UploadTooLargeError(int(length), max_body_bytes)
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise InvalidFormError("Expected a multipart/form-data body")
+
+    reader = _PdfFormReader(fields, max_file_bytes, spool_bytes, max_files)
+    parser = MultipartParser(params[b"boundary"], reader.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if max_body_bytes is not None and received > max_body_bytes:
+                raise UploadTooLargeError(received, max_body_bytes)
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        reader.close()
+        raise InvalidFormError(f"Malformed multipart body: {e}")
+    except BaseException:
+        reader.close()
+        raise
+    return reader.files
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark of the line parser (tokenizer + vínculo state machine).
+
+Usage:
+    python benchmarks/bench_line_parser.py [--vinculos N] [--repeat R] [--plan full|counts]
+
+Builds a synthetic CNIS text in memory (no PDF extraction involved) and
+reports how many lines per second CNISParserFinal pushes through its
+line-level parsing. Per-vínculo finalization (Fim derivation, metadata) is
+left out so only tokenizing and table parsing are measured.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from cnis_parser_final import CNISParserFinal, PLAN_FULL, PLAN_COUNTS
+
+
+class LineOnlyParser(CNISParserFinal):
+    def _finalize_employment(self, emp):
+        return emp
+
+
+def synthetic_lines(vinculos: int):
+    lines = [
+        "Extrato Previdenciário 12/03/2025 10:11:12",
+        "NIT: 123.45678.90-1 CPF: 123.456.789-00 Nome: FULANO DE TAL",
+        "Data de nascimento: 01/02/1970 Nome da mãe: MARIA DE TAL",
+        "Seq. NIT Código Emp. Origem do Vínculo Matrícula do Trabalhador Tipo Filiado no Vínculo "
+        "Data Início Data Fim Últ. Remun. Indicadores",
+    ]
+    year = 1980
+    for seq in range(1, vinculos + 1):
+        kind = seq % 3
+        if kind == 0:
+            lines += [
+                f"{seq} 123.45678.90-1 12.345.678/0001-90 EMPRESA EXEMPLO LTDA Empregado ou Agente "
+                f"01/01/{year} 31/12/{year + 2}",
+                "Público",
+                "Remunerações",
+                "Competência Remuneração Indicadores Competência Remuneração Indicadores "
+                "Competência Remuneração Indicadores",
+            ]
+            for month in range(0, 36, 3):
+                lines.append(" ".join(
+                    f"{(month + k) % 12 + 1:02d}/{year + (month + k) // 12} 1.234,56" for k in range(3)
+                ))
+        elif kind == 1:
+            lines += [
+                f"{seq} 123.45678.90-1 AGRUPAMENTO DE CONTRATANTES/COOPERATIVAS Contribuinte "
+                f"01/01/{year} 31/12/{year + 2}",
+                "Individual",
+                "Remunerações",
+                "Competência Contrat./Cooperat. Estabelecimento Tomador Remuneração Indicadores",
+            ]
+            for month in range(36):
+                lines.append(f"{month % 12 + 1:02d}/{year + month // 12} 12.345.678/0001-90 2.500,00 IREM-ACD")
+        else:
+            lines += [
+                f"{seq} 123.45678.90-1 Facultativo 01/01/{year} 31/12/{year + 2} PREC-FACULTCONC",
+                "Remunerações",
+                "Competência Data Pgto. Contribuição Salário Contribuição Indicadores",
+            ]
+            for month in range(36):
+                lines.append(f"{month % 12 + 1:02d}/{year + month // 12} 15/01/{year + 1} 44,00 220,00")
+        year += 1
+    lines.append("Página 1 de 1")
+    return lines
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--vinculos', type=int, default=300)
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--plan', choices=[PLAN_FULL, PLAN_COUNTS], default=PLAN_FULL)
+    args = ap.parse_args()
+
+    lines = synthetic_lines(args.vinculos)
+    parser = LineOnlyParser(pdf_path=b'', plan=args.plan)
+
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in parser._iter_vinculos(lines))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"[{args.plan}] {len(lines)} lines, {count} vínculos: best {best * 1000:.1f} ms "
+          f"-> {len(lines) / best:,.0f} lines/s")
+
+
+if __name__ == '__main__':
+    main()
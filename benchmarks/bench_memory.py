@@ -0,0 +1,81 @@
+"""
+Memory held by one parse result: slotted records vs the JSON dict shape.
+
+Usage:
+    python benchmarks/bench_memory.py [--vinculos N] [--rows R] [--plan full|counts]
+
+Parses a synthetic extract (see synthetic_cnis.py) straight from its page
+texts, then reports with tracemalloc how much memory stays allocated for
+the result of parse_records() (what the result cache and the parse pool
+hold), with remunerações as row lists and as columns (columnar=True), and
+for the same result as parse() dicts, plus the pickled sizes.
+"""
+
+import argparse
+import gc
+import os
+import pickle
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from synthetic_cnis import generate_cnis  # noqa: E402
+from cnis_parser_final import CNISParserFinal, CnisRecords, PLAN_FULL, PLAN_COUNTS  # noqa: E402
+
+
+class TextPagesParser(CNISParserFinal):
+    """Parser fed from page texts, so no PDF extraction is traced."""
+
+    def __init__(self, pages, **kwargs):
+        super().__init__(b"", **kwargs)
+        self.pages = pages
+
+    def _iter_page_texts(self):
+        yield from self.pages
+
+
+def parse_records(pages, plan, columnar=False):
+    # Same as parse_records(), without its progress line
+    parser = TextPagesParser(pages, plan=plan, columnar=columnar)
+    return CnisRecords(parser.personal, list(parser.iter_vinculos()))
+
+
+def retained(build):
+    """(result, bytes still allocated after build() returns, peak bytes during build())."""
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current - base, peak - base
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--vinculos', type=int, default=300)
+    ap.add_argument('--rows', type=int, default=120, help='remunerações per vínculo with a table')
+    ap.add_argument('--plan', choices=[PLAN_FULL, PLAN_COUNTS], default=PLAN_FULL)
+    args = ap.parse_args()
+
+    doc = generate_cnis(args.vinculos, args.rows)
+    pages = ['\n'.join(lines) for lines in doc.pages]
+    rows = sum(v.rows for v in doc.vinculos)
+
+    results = {
+        "records": retained(lambda: parse_records(pages, args.plan)),
+        "columns": retained(lambda: parse_records(pages, args.plan, columnar=True)),
+        "dicts": retained(lambda: parse_records(pages, args.plan).to_dict()),
+    }
+    dicts_bytes = results["dicts"][1]
+
+    print(f"{len(doc.pages)} pages, {len(doc.vinculos)} vínculos, {rows} remunerações, plan={args.plan}")
+    for name, (result, kept, peak) in results.items():
+        print(f"  {name:8}: {kept / 1e6:7.2f} MB retained ({kept / dicts_bytes:4.0%} of dicts), "
+              f"{peak / 1e6:7.2f} MB peak, {len(pickle.dumps(result)) / 1e6:6.2f} MB pickled")
+
+
+if __name__ == '__main__':
+    main()
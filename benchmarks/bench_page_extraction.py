@@ -0,0 +1,66 @@
+"""
+Benchmark serial vs page-parallel text extraction in CNISParserFinal.
+
+Usage:
+    python benchmarks/bench_page_extraction.py [--workers N] [--repeat R] [pdf ...]
+
+Without PDF arguments every PDF in sensitive-f2/ is used. Results are grouped
+by page count so the speedup curve is visible; the extracted text of both
+modes is compared byte for byte.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from cnis_parser_final import CNISParserFinal
+
+PROJECT_ROOT = os.path.join(os.path.dirname(__file__), '..')
+CNIS_DIR = os.path.join(PROJECT_ROOT, 'sensitive-f2')
+
+
+def time_extraction(pdf_path, page_workers, repeat, extractor=None):
+    best = None
+    texts = None
+    for _ in range(repeat):
+        parser = CNISParserFinal(pdf_path=pdf_path, page_workers=page_workers, extractor=extractor)
+        start = time.perf_counter()
+        texts = parser._extract_page_texts()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, texts
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('pdfs', nargs='*')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--extractor', default=None, help='text backend (default pdfplumber)')
+    args = ap.parse_args()
+
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join(CNIS_DIR, '*.pdf')))
+    if not pdfs:
+        sys.exit('No PDFs given and none found in sensitive-f2/')
+
+    rows = []
+    for path in pdfs:
+        serial, serial_texts = time_extraction(path, 1, args.repeat, args.extractor)
+        parallel, parallel_texts = time_extraction(path, args.workers, args.repeat, args.extractor)
+        identical = "".join(t + "\n" for t in serial_texts) == "".join(t + "\n" for t in parallel_texts)
+        rows.append((len(serial_texts), os.path.basename(path), serial, parallel, identical))
+
+    print(f"{'pages':>5}  {'serial s':>9}  {'parallel s':>10}  {'speedup':>7}  same  file")
+    for pages, name, serial, parallel, identical in sorted(rows):
+        print(f"{pages:>5}  {serial:>9.3f}  {parallel:>10.3f}  {serial / parallel:>6.2f}x  "
+              f"{'yes' if identical else 'NO':>4}  {name[:50]}")
+
+    if not all(r[4] for r in rows):
+        sys.exit('Parallel extraction produced different text')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+pytest-benchmark suite over synthetic CNIS extracts (see synthetic_cnis.py).
+
+Usage:
+    python -m pytest benchmarks/bench_parser_suite.py [--benchmark-group-by=param:size]
+
+Times CNISParserFinal.parse end to end (both text extractors), each
+Competência table parser, each response transformer, the response
+serializers (FastAPI's default JSONResponse vs ORJSONResponse) and the
+remuneração aggregates (row lists vs RemuneracaoColumns), at several
+document sizes.
+Not collected by the default test run.
+"""
+
+import os
+import sys
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+pytest.importorskip("pytest_benchmark")
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from synthetic_cnis import (  # noqa: E402
+    generate_cnis, table_rows, to_pdf, LAYOUT_EMPREGADO, LAYOUT_CONTRIBUINTE, LAYOUT_FACULTATIVO,
+)
+from cnis_parser_final import (  # noqa: E402
+    CNISParserFinal, RemuneracaoColumns, Vinculo, VinculoData, month_index,
+    TABLE_REGULAR, TABLE_CONTRIBUINTE, TABLE_FACULTATIVO,
+)
+from app.services.response_transformer import transform_full, transform_summary  # noqa: E402
+from app.services.planilha_transformer import transform_to_planilha  # noqa: E402
+
+# name -> (vínculos, remunerações per vínculo)
+SIZES = {
+    "small": (5, 12),
+    "medium": (40, 36),
+    "large": (150, 60),
+}
+
+TABLES = {
+    TABLE_REGULAR: LAYOUT_EMPREGADO,
+    TABLE_CONTRIBUINTE: LAYOUT_CONTRIBUINTE,
+    TABLE_FACULTATIVO: LAYOUT_FACULTATIVO,
+}
+
+TRANSFORMERS = {
+    "full": transform_full,
+    "summary": transform_summary,
+    "planilha": transform_to_planilha,
+}
+
+
+@pytest.fixture(scope="module", params=list(SIZES))
+def size(request):
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def pdf_bytes(size):
+    vinculos, rows = SIZES[size]
+    return to_pdf(generate_cnis(vinculos, rows, seed=1).pages)
+
+
+@pytest.fixture(scope="module")
+def parsed(pdf_bytes):
+    return CNISParserFinal(pdf_bytes, extractor="pdfminer").parse_records()
+
+
+@pytest.mark.parametrize("extractor", ["pdfplumber", "pdfminer"])
+def test_parse(benchmark, pdf_bytes, size, extractor):
+    result = benchmark.pedantic(
+        lambda: CNISParserFinal(pdf_bytes, extractor=extractor).parse(), rounds=3, iterations=1,
+    )
+    assert len(result["employment_relationships"]) == SIZES[size][0]
+
+
+@pytest.mark.parametrize("table_kind", list(TABLES))
+def test_table_parser(benchmark, size, table_kind):
+    import random
+    vinculos, rows = SIZES[size]
+    months = [(1980 + k // 12, k % 12 + 1) for k in range(vinculos * rows)]
+    lines = table_rows(TABLES[table_kind], months, random.Random(1))
+    parser = CNISParserFinal(b"")
+    row_parser = CNISParserFinal._TABLE_ROW_PARSERS[table_kind]
+
+    def run():
+        employment = Vinculo(1, VinculoData("", "", "", "", "", None, None, None, ""))
+        for line in lines:
+            row_parser(parser, employment, line)
+        return employment
+
+    assert len(benchmark(run).remuneracoes) == len(months)
+
+
+@pytest.mark.parametrize("view", list(TRANSFORMERS))
+def test_transformer(benchmark, parsed, view):
+    benchmark(TRANSFORMERS[view], parsed)
+
+
+SERIALIZERS = {
+    # What FastAPI does with a returned dict, and what the /api/v1/parse* routes do now
+    "jsonable_encoder+json": lambda body: JSONResponse(jsonable_encoder(body)).body,
+    "orjson": lambda body: ORJSONResponse(body).body,
+}
+
+
+@pytest.mark.parametrize("serializer", list(SERIALIZERS))
+def test_serialize(benchmark, parsed, serializer):
+    body = {"success": True, "data": transform_full(parsed)}
+    rendered = benchmark(SERIALIZERS[serializer], body)
+    assert rendered.startswith(b'{"success":true')
+
+
+def _row_aggregates(rows):
+    values = [r.remuneracao for r in rows if r.remuneracao is not None]
+    months = {month_index(r.competencia) for r in rows}
+    return sum(values), max(values, default=None), len(months)
+
+
+def _column_aggregates(columns):
+    return columns.total(), columns.maximum(), columns.months_covered()
+
+
+@pytest.mark.parametrize("storage", ["rows", "columns"])
+def test_aggregates(benchmark, parsed, storage):
+    tables = [v.remuneracoes for v in parsed.vinculos]
+    if storage == "columns":
+        tables = [RemuneracaoColumns.from_rows(rows) for rows in tables]
+    aggregate = _column_aggregates if storage == "columns" else _row_aggregates
+    result = benchmark(lambda: [aggregate(t) for t in tables])
+    assert result == [_row_aggregates(rows) for rows in (v.remuneracoes for v in parsed.vinculos)]
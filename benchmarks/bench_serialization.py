@@ -0,0 +1,71 @@
+"""
+JSON serialization time per 10k remunerações: stdlib json vs orjson.
+
+Usage:
+    python benchmarks/bench_serialization.py [--vinculos N] [--rows R] [--repeat K]
+
+Parses a synthetic extract (see synthetic_cnis.py) straight from its page
+texts, then times, for the same result:
+
+  api      the /api/v1/parse body rendered the way FastAPI renders a returned
+           dict (jsonable_encoder + JSONResponse) vs ORJSONResponse
+  export   export_to_json's indented json output vs its compact mode
+
+Each pair is checked to decode to the same data.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from synthetic_cnis import generate_cnis  # noqa: E402
+from bench_memory import parse_records  # noqa: E402
+from cnis_parser_final import PLAN_FULL, dumps_json  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from app.services.response_transformer import transform_full  # noqa: E402
+
+
+def best_of(fn, repeat):
+    """(fastest wall time in seconds, output of the last run)."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--vinculos', type=int, default=300)
+    ap.add_argument('--rows', type=int, default=120, help='remunerações per vínculo with a table')
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    doc = generate_cnis(args.vinculos, args.rows)
+    records = parse_records(['\n'.join(lines) for lines in doc.pages], PLAN_FULL)
+    rows = sum(v.remuneracao_count for v in records.vinculos)
+    body = {"success": True, "message": "CNIS parsed successfully", "data": transform_full(records)}
+    parsed = records.to_dict()
+
+    cases = {
+        "api": (lambda: JSONResponse(jsonable_encoder(body)).body, lambda: ORJSONResponse(body).body),
+        "export": (lambda: dumps_json(parsed), lambda: dumps_json(parsed, compact=True)),
+    }
+    print(f"{len(doc.vinculos)} vínculos, {rows} remunerações, best of {args.repeat}")
+    for name, (before, after) in cases.items():
+        t_before, out_before = best_of(before, args.repeat)
+        t_after, out_after = best_of(after, args.repeat)
+        assert json.loads(out_before) == json.loads(out_after), name
+        per_10k = 10_000 / rows * 1000
+        print(f"  {name:6}: {t_before * per_10k:8.2f} -> {t_after * per_10k:7.2f} ms per 10k rows "
+              f"({t_before / t_after:4.1f}x), {len(out_before) / 1e6:.2f} -> {len(out_after) / 1e6:.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Synthetic CNIS extracts for tests and benchmarks, no personal data involved.
+
+Usage:
+    python benchmarks/synthetic_cnis.py OUT.pdf [--vinculos N] [--rows R] [--pages P] [--seed S]
+
+generate_cnis() lays out vínculos in the same text shape the INSS extract
+has once pdfplumber flattens it (header line plus wrapped continuation,
+"Remunerações" title, Competência table), cycling through the Empregado,
+Contribuinte Individual, Facultativo, Segurado Especial and Benefício
+layouts. to_pdf() renders the pages as a plain Helvetica PDF that both
+text extractors read back line for line.
+"""
+
+import argparse
+import math
+import random
+from typing import List, NamedTuple, Optional, Sequence
+
+LAYOUT_EMPREGADO = 'empregado'
+LAYOUT_CONTRIBUINTE = 'contribuinte_individual'
+LAYOUT_FACULTATIVO = 'facultativo'
+LAYOUT_SEGURADO_ESPECIAL = 'segurado_especial'
+LAYOUT_BENEFICIO = 'beneficio'
+LAYOUTS = (LAYOUT_EMPREGADO, LAYOUT_CONTRIBUINTE, LAYOUT_FACULTATIVO, LAYOUT_SEGURADO_ESPECIAL, LAYOUT_BENEFICIO)
+
+# Layouts with a Competência table, and the Tipo_Filiado_Vinculo the parser should report
+TABLE_LAYOUTS = (LAYOUT_EMPREGADO, LAYOUT_CONTRIBUINTE, LAYOUT_FACULTATIVO)
+EXPECTED_TIPO = {
+    LAYOUT_EMPREGADO: 'Empregado ou Agente Público',
+    LAYOUT_CONTRIBUINTE: 'Contribuinte Individual',
+    LAYOUT_FACULTATIVO: 'Facultativo',
+    LAYOUT_SEGURADO_ESPECIAL: 'Segurado Especial',
+    LAYOUT_BENEFICIO: 'Benefício 31 - AUXILIO DOENCA PREVIDENCIARIO',
+}
+
+NIT = '123.45678.90-1'
+PAGE_HEADER = ['INSS', 'CNIS - Cadastro Nacional de Informações Sociais']
+IDENTIFICATION = [
+    'Extrato Previdenciário 12/03/2025 10:11:12',
+    'Identificação do Filiado',
+    f'NIT: {NIT} CPF: 123.456.789-00 Nome: FULANO DE TAL',
+    'Data de nascimento: 01/02/1970 Nome da mãe: MARIA DE TAL',
+    'Relações Previdenciárias',
+    'Seq. NIT Código Emp. Origem do Vínculo Matrícula do Trabalhador Tipo Filiado no Vínculo '
+    'Data Início Data Fim Últ. Remun. Indicadores',
+]
+CLOSING_NOTICE = ('O INSS poderá rever a qualquer tempo as informações constantes deste extrato, '
+                  'art. 19, §3º do Decreto 3.048/99.')
+
+# Page geometry used by to_pdf(): 8pt Helvetica on 10pt leading, A4
+FONT_SIZE = 8
+LEADING = 10
+MAX_LINES_PER_PAGE = 76
+# Lines of a vínculo block (header, continuation, title, table header, first row) kept on one page
+_KEEP_TOGETHER = 5
+
+
+class SyntheticVinculo(NamedTuple):
+    sequence: int
+    layout: str
+    rows: int  # remunerações the parser should find
+
+
+class SyntheticCnis(NamedTuple):
+    pages: List[List[str]]
+    vinculos: List[SyntheticVinculo]
+
+
+def brl(value: float) -> str:
+    """1234.5 -> '1.234,50'."""
+    return f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def table_rows(layout: str, months: Sequence[tuple], rng: random.Random) -> List[str]:
+    """Competência table lines of ``layout`` for ``months`` [(year, month), ...]."""
+    if layout == LAYOUT_EMPREGADO:
+        # Three competência/valor pairs per printed line
+        cells = [
+            f"{m:02d}/{y} {brl(rng.uniform(1000, 9000))}" + (' IREM-ACD' if rng.random() < 0.1 else '')
+            for y, m in months
+        ]
+        return [' '.join(cells[i:i + 3]) for i in range(0, len(cells), 3)]
+    if layout == LAYOUT_CONTRIBUINTE:
+        return [
+            f"{m:02d}/{y} 12.345.678/0001-90 {brl(rng.uniform(1000, 9000))}" + (' IREM-ACD' if rng.random() < 0.2 else '')
+            for y, m in months
+        ]
+    if layout == LAYOUT_FACULTATIVO:
+        return [
+            f"{m:02d}/{y} 15/{m:02d}/{y} {brl(rng.uniform(10, 300))} {brl(rng.uniform(100, 3000))}"
+            + (' PREC-MENOR-MIN' if rng.random() < 0.2 else '')
+            for y, m in months
+        ]
+    return []
+
+
+def _vinculo_block(seq: int, layout: str, year: int, rows: int, rng: random.Random) -> List[str]:
+    months = [(year + k // 12, k % 12 + 1) for k in range(rows)] if layout in TABLE_LAYOUTS else []
+    inicio = f"01/01/{year}"
+    end_year = year + max(rows - 1, 0) // 12
+    fim = f"28/{months[-1][1]:02d}/{months[-1][0]}" if months else f"31/12/{end_year + 1}"
+
+    if layout == LAYOUT_EMPREGADO:
+        empresa = rng.choice(['EMPRESA EXEMPLO LTDA', 'COMERCIO XYZ LTDA', 'FABRICA ABC', 'BANCO EXEMPLO S.A.'])
+        codigo = f"{rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}/0001-{rng.randint(10, 99)}"
+        block = [f"{seq} {NIT} {codigo} {empresa} Empregado ou Agente {inicio} {fim}", 'Público']
+    elif layout == LAYOUT_CONTRIBUINTE:
+        block = [f"{seq} {NIT} AGRUPAMENTO DE CONTRATANTES/COOPERATIVAS Contribuinte {inicio} {fim}", 'Individual']
+    elif layout == LAYOUT_FACULTATIVO:
+        block = [f"{seq} {NIT} Facultativo {inicio} {fim} PREC-FACULTCONC"]
+    elif layout == LAYOUT_SEGURADO_ESPECIAL:
+        block = [f"{seq} {NIT} Segurado {inicio} {fim}", 'Especial']
+    else:
+        block = [f"{seq} {NIT} {rng.randint(1000000000, 9999999999)} Benefício 31 - AUXILIO DOENCA PREVIDENCIARIO "
+                 f"{inicio} {fim}"]
+
+    if months:
+        header = {
+            LAYOUT_EMPREGADO: 'Competência Remuneração Indicadores Competência Remuneração Indicadores '
+                              'Competência Remuneração Indicadores',
+            LAYOUT_CONTRIBUINTE: 'Competência Contrat./Cooperat. Estabelecimento Tomador Remuneração Indicadores',
+            LAYOUT_FACULTATIVO: 'Competência Data Pgto. Contribuição Salário Contribuição Indicadores',
+        }[layout]
+        block += ['Remunerações', header] + table_rows(layout, months, rng)
+    return block
+
+
+def generate_cnis(vinculos: int = 10, rows: int = 24, pages: Optional[int] = None,
+                  lines_per_page: int = 45, seed: int = 0,
+                  layouts: Sequence[str] = LAYOUTS) -> SyntheticCnis:
+    """Build a synthetic extract.
+
+    ``rows`` remunerações go into every vínculo with a table. With ``pages``
+    the lines are spread to fill about that many pages (bounded by what
+    fits on a page); otherwise each page holds ``lines_per_page`` lines.
+    """
+    rng = random.Random(seed)
+    blocks = []
+    expected = []
+    year = 1980
+    for seq in range(1, vinculos + 1):
+        layout = layouts[(seq - 1) % len(layouts)]
+        blocks.append(_vinculo_block(seq, layout, year, rows, rng))
+        expected.append(SyntheticVinculo(seq, layout, rows if layout in TABLE_LAYOUTS else 0))
+        year += 1 + rows // 12
+
+    total = len(IDENTIFICATION) + sum(len(b) for b in blocks) + 1
+    if pages:
+        chrome = len(PAGE_HEADER) + 1
+        lines_per_page = math.ceil(total / pages) + chrome
+    lines_per_page = max(min(lines_per_page, MAX_LINES_PER_PAGE), len(PAGE_HEADER) + _KEEP_TOGETHER + 1)
+    room = lines_per_page - len(PAGE_HEADER) - 1  # body lines per page, after header and footer
+
+    page_bodies = [list(IDENTIFICATION)]
+    for block in blocks + [[CLOSING_NOTICE]]:
+        for i, line in enumerate(block):
+            body = page_bodies[-1]
+            # A page break between a vínculo header and its table would end the vínculo early
+            keep = len(block[i:_KEEP_TOGETHER]) if i == 0 else 1
+            if len(body) + keep > room and body:
+                page_bodies.append([])
+            page_bodies[-1].append(line)
+
+    count = len(page_bodies)
+    doc_pages = [PAGE_HEADER + body + [f"Página {n} de {count}"] for n, body in enumerate(page_bodies, 1)]
+    return SyntheticCnis(doc_pages, expected)
+
+
+def to_pdf(pages: Sequence[Sequence[str]]) -> bytes:
+    """Render text lines as a minimal PDF (one text object per page, WinAnsi Helvetica)."""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    contents = []
+    for lines in pages:
+        ops = [b"BT", b"/F1 %d Tf" % FONT_SIZE, b"%d TL" % LEADING, b"36 806 Td"]
+        for line in lines:
+            text = line.encode('cp1252').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+            ops.append(b"(" + text + b") Tj T*")
+        ops.append(b"ET")
+        stream = b"\n".join(ops)
+        contents.append(add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+
+    pages_id = len(objects) + len(contents) + 1
+    kids = [
+        add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /CropBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content))
+        for content in contents
+    ]
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('output')
+    ap.add_argument('--vinculos', type=int, default=10)
+    ap.add_argument('--rows', type=int, default=24, help='remunerações per vínculo with a table')
+    ap.add_argument('--pages', type=int, default=None, help='spread the content over about this many pages')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    doc = generate_cnis(args.vinculos, args.rows, args.pages, seed=args.seed)
+    with open(args.output, 'wb') as f:
+        f.write(to_pdf(doc.pages))
+    print(f"{args.output}: {len(doc.pages)} pages, {len(doc.vinculos)} vínculos, "
+          f"{sum(v.rows for v in doc.vinculos)} remunerações")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Calendar helpers for CNIS dates.
+
+Extracts write dates as DD/MM/YYYY and competências as MM/YYYY. The parser
+only needs them as month indices (year * 12 + month - 1), so the string
+conversions are memoized (the same few hundred dates repeat across every
+vínculo) and month lengths come from a table instead of datetime arithmetic.
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def is_leap(year: int) -> bool:
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def days_in_month(year: int, month: int) -> int:
+    if month == 2 and is_leap(year):
+        return 29
+    return _DAYS_IN_MONTH[month - 1]
+
+
+@lru_cache(maxsize=16384)
+def month_index(competencia: str) -> Optional[int]:
+    """'MM/YYYY' -> year * 12 + month - 1; None if it is not a valid competência."""
+    if (len(competencia) == 7 and competencia[2] == '/' and competencia.isascii()
+            and competencia[:2].isdigit() and competencia[3:].isdigit()):
+        month = int(competencia[:2])
+        if 1 <= month <= 12:
+            return int(competencia[3:]) * 12 + month - 1
+    return None
+
+
+@lru_cache(maxsize=16384)
+def competencia_from_index(index: int) -> str:
+    year, month = divmod(index, 12)
+    return f"{month + 1:02d}/{year:04d}"
+
+
+@lru_cache(maxsize=16384)
+def date_month_index(date: str) -> Optional[int]:
+    """'DD/MM/YYYY' -> month index of that date; None unless it is a real calendar date.
+
+    Only the zero-padded form is accepted ('1/2/2000' is None, although
+    strptime('%d/%m/%Y') takes it), which is how extracts write dates and
+    all the parser's FULL_DATE_RE lets through.
+    """
+    if len(date) != 10 or date[2] != '/' or not date.isascii():
+        return None
+    day, competencia = date[:2], date[3:]
+    index = month_index(competencia)
+    if index is None or not day.isdigit():
+        return None
+    year, month = divmod(index, 12)
+    if year < 1 or not 1 <= int(day) <= days_in_month(year, month + 1):
+        return None
+    return index
+
+
+@lru_cache(maxsize=4096)
+def last_day_of_month(index: int) -> str:
+    """Month index -> 'DD/MM/YYYY' of that month's last day."""
+    year, month = divmod(index, 12)
+    return f"{days_in_month(year, month + 1):02d}/{month + 1:02d}/{year:04d}"
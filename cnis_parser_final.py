@@ -4,103 +4,864 @@ Robust text-based parsing with proper handling of all employment types
 """
 
 import pdfplumber
+import argparse
+import glob
+import io
+import math
+import os
 import re
+import sys
+import time
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTTextContainer, LTTextLine
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 import json
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from cnis_calendar import competencia_from_index, date_month_index, last_day_of_month, month_index
 
+try:
+    import orjson
+except ImportError:  # optional: compact output falls back to the json module
+    orjson = None
 
-class CNISParserFinal:
-    def __init__(self, pdf_path: str, debug: bool = False):
-        self.pdf_path = Path(pdf_path)
-        self.debug = debug
-        self.personal_info = {}
-        self.employment_relationships = []
-        
-    def parse(self) -> Dict:
-        print(f"[INFO] Parsing CNIS: {self.pdf_path}")
-        
-        with pdfplumber.open(self.pdf_path) as pdf:
-            full_text = ""
-            for page in pdf.pages:
-                full_text += page.extract_text() + "\n"
-            
-            self._extract_personal_info(full_text)
-            self._extract_employment_relationships(full_text)
-        
-        for emp in self.employment_relationships:
-            # Derive missing Fim date from last remuneration if available
-            if not emp['Data'].get('Fim') and emp.get('Remuneracoes'):
-                last_remu = emp['Remuneracoes'][-1]
-                comp = last_remu.get('Competencia', '')
-                if re.match(r'\d{2}/\d{4}', comp):
-                    try:
-                        month, year = int(comp[:2]), int(comp[3:])
-                        if month == 12:
-                            last_day = datetime(year + 1, 1, 1) - relativedelta(days=1)
-                        else:
-                            last_day = datetime(year, month + 1, 1) - relativedelta(days=1)
-                        emp['Data']['Fim'] = last_day.strftime('%d/%m/%Y')
-                    except:
-                        pass
-            emp['Metadata'] = self._calculate_metadata(emp)
-            
+
+# Bump whenever a change alters parse() output, so cached results are not reused
+PARSER_VERSION = "1.1.0"
+
+# A filesystem path, the raw PDF bytes, or an open binary file-like object
+PdfSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+
+PERSONAL_INFO_PATTERNS = {
+    'NIT': re.compile(r'NIT:\s*([\d\.\-]+)', re.IGNORECASE | re.MULTILINE),
+    'CPF': re.compile(r'CPF:\s*([\d\.\-]+)', re.IGNORECASE | re.MULTILINE),
+    'Nome': re.compile(r'Nome:\s*([A-ZÇÃÕÁÉÍÓÚÂÊÔÀ\s]+?)(?:Data de nascimento|$)', re.IGNORECASE | re.MULTILINE),
+    'Data_Nascimento': re.compile(r'Data de nascimento:\s*(\d{2}/\d{2}/\d{4})', re.IGNORECASE | re.MULTILINE),
+    'Nome_Mae': re.compile(r'Nome da mãe:\s*([A-ZÇÃÕÁÉÍÓÚÂÊÔÀ\s]+?)(?:\n|Relações)', re.IGNORECASE | re.MULTILINE),
+    'Data_Extracao': re.compile(r'Extrato Previdenciário\s+(\d{2}/\d{2}/\d{4}\s+\d{2}:\d{2}:\d{2})', re.IGNORECASE | re.MULTILINE),
+}
+
+# Line-parser states
+STATE_SCAN = 'scan'        # outside any vínculo, waiting for the next header line
+STATE_VINCULO = 'vinculo'  # after a header, between its Remunerações tables
+STATE_TABLE = 'table'      # inside a Competência table
+
+# Parse plans: how much of the document a caller needs
+PLAN_PERSONAL = 'personal'  # personal_info only; stops reading once every field is found
+PLAN_COUNTS = 'counts'      # vínculo headers + metadata, rows only counted (Total_Remuneracoes)
+PLAN_FULL = 'full'          # every remuneração row
+PARSE_PLANS = (PLAN_PERSONAL, PLAN_COUNTS, PLAN_FULL)
+
+# Competência table kinds
+TABLE_REGULAR = 'regular'
+TABLE_CONTRIBUINTE = 'contribuinte_individual'
+TABLE_FACULTATIVO = 'facultativo'
+
+# Line token kinds produced by tokenize_line()
+TOKEN_VINCULO_HEADER = 'vinculo_header'  # "<seq> <NIT> ..." (data: header match, or None if truncated)
+TOKEN_SECTION = 'section'                # "Seq." column header / "Matrícula" line
+TOKEN_NOTICE = 'notice'                  # "O INSS poderá rever ..." footer notice
+TOKEN_PAGE_FOOTER = 'page_footer'        # "Página X de Y"
+TOKEN_REMUNERACOES = 'remuneracoes'      # "Remunerações" table title
+TOKEN_INDICADORES = 'indicadores'        # "Indicadores: ..." (data: the indicator codes)
+TOKEN_TABLE_HEADER = 'table_header'      # "Competência ..." column header (data: table kind)
+TOKEN_ROW = 'row'                        # line starting with a MM/YYYY competência
+TOKEN_OTHER = 'other'
+
+VINCULO_HEADER_RE = re.compile(r'^(\d+)\s+(\d{3}\.\d{5}\.\d{2}-\d)\s+(.+)')
+SEQ_PREFIX_RE = re.compile(r'^\d+\s+\d{3}\.\d{5}')
+INDICADORES_RE = re.compile(r'Indicadores:\s*(.+)')
+COMPETENCIA_RE = re.compile(r'\d{2}/\d{4}')
+MONTH_YEAR_RE = re.compile(r'\d{2}/\d{4}$')
+FULL_DATE_RE = re.compile(r'\d{2}/\d{2}/\d{4}')
+CODIGO_EMPRESA_RE = re.compile(r'[\d\./\-]+')
+CURRENCY_TOKEN_RE = re.compile(r'[\d\.,]+$')
+REGULAR_ROW_RE = re.compile(r'(\d{2}/\d{4})\s+([\d\.,]+)(?:\s+([A-Z\-]+(?:\s+[A-Z\-]+)*))?')
+INDICADOR_PREFIXES = ('IREM', 'IREC', 'PREC', 'PREM', 'ASE', 'AVRC', 'IVIN', 'PSC')
+
+# All of these appear on the first page of every CNIS extract
+CNIS_FIRST_PAGE_MARKERS = (
+    re.compile(r'Extrato\s+Previdenci[aá]rio', re.IGNORECASE),
+    re.compile(r'\bNIT:', re.IGNORECASE),
+)
+
+
+class NotCnisError(ValueError):
+    """The document is not a CNIS extract (see looks_like_cnis)."""
+    pass
+
+
+class PageLimitError(ValueError):
+    """The document has more pages than the parser was allowed to read."""
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    """The parser's deadline passed before the document was fully parsed."""
+    pass
+
+
+def looks_like_cnis(first_page_text: str) -> bool:
+    return all(marker.search(first_page_text) for marker in CNIS_FIRST_PAGE_MARKERS)
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    data: object = None
+
+
+# Parse results are held in these slotted records (a remuneração row is a
+# 3-tuple instead of a 3-key dict); to_dict() gives the JSON shape that
+# parse() and export_to_json() have always returned.
+
+class Remuneracao(NamedTuple):
+    competencia: str
+    remuneracao: Optional[float]
+    indicadores: str
+
+    def to_dict(self) -> Dict:
+        return {'Competencia': self.competencia, 'Remuneracao': self.remuneracao, 'Indicadores': self.indicadores}
+
+
+class RemuneracaoColumns:
+    """Remunerações of one vínculo stored column-wise in typed arrays.
+
+    ``months`` holds month indices (see month_index), ``values`` the amounts
+    (NaN where the row had none) and ``indicator_codes`` positions in
+    ``indicator_labels``. Iterating, indexing and len() behave like the
+    list of Remuneracao rows it replaces; the aggregates run over the arrays
+    without building rows.
+    """
+
+    __slots__ = ('months', 'values', 'indicator_codes', 'indicator_labels', '_label_codes', '_odd', '_missing')
+
+    def __init__(self):
+        self.months = array('i')
+        self.values = array('d')
+        self.indicator_codes = array('H')
+        self.indicator_labels: List[str] = []
+        self._label_codes: Dict[str, int] = {}
+        self._odd: Dict[int, str] = {}  # row -> competência that month_index() rejects (month -1)
+        self._missing = 0  # rows without a value
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Remuneracao]) -> 'RemuneracaoColumns':
+        columns = cls()
+        for row in rows:
+            columns.append(row)
+        return columns
+
+    def append(self, row: Remuneracao):
+        competencia, value, indicadores = row
+        index = month_index(competencia)
+        if index is None:
+            self._odd[len(self.months)] = competencia
+            index = -1
+        self.months.append(index)
+        if value is None:
+            self._missing += 1
+            value = math.nan
+        self.values.append(value)
+        code = self._label_codes.get(indicadores)
+        if code is None:
+            code = self._label_codes[indicadores] = len(self.indicator_labels)
+            self.indicator_labels.append(indicadores)
+        self.indicator_codes.append(code)
+
+    def __len__(self) -> int:
+        return len(self.months)
+
+    def __getitem__(self, i: int) -> Remuneracao:
+        i = range(len(self.months))[i]
+        value = self.values[i]
+        return Remuneracao(
+            self._odd.get(i) or competencia_from_index(self.months[i]),
+            None if value != value else value,
+            self.indicator_labels[self.indicator_codes[i]],
+        )
+
+    def __iter__(self) -> Iterator[Remuneracao]:
+        return map(self.__getitem__, range(len(self.months)))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (RemuneracaoColumns, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"RemuneracaoColumns({len(self)} rows)"
+
+    def _present_values(self):
+        return self.values if not self._missing else [v for v in self.values if v == v]
+
+    def total(self) -> float:
+        """Sum of the amounts (rows without a value are skipped)."""
+        return sum(self._present_values())
+
+    def maximum(self) -> Optional[float]:
+        return max(self._present_values(), default=None)
+
+    def average(self) -> Optional[float]:
+        present = len(self.values) - self._missing
+        return self.total() / present if present else None
+
+    def invalid_competencias(self) -> List[str]:
+        """Competências that month_index() rejected (stored with month -1)."""
+        return list(self._odd.values())
+
+    def months_covered(self) -> int:
+        """Distinct valid competências."""
+        return len(set(self.months).difference((-1,)))
+
+    def coverage(self, first: int, last: int) -> float:
+        """Share of the months first..last (month indices, inclusive) that have a row."""
+        if last < first:
+            return 0.0
+        return len(set(self.months).intersection(range(first, last + 1))) / (last - first + 1)
+
+
+class VinculoMetadata(NamedTuple):
+    nit_match_main_nit: bool
+    all_competences_complete: bool
+    data_inicio: bool
+    data_fim: bool
+    ultima_remu: bool
+    all_date_matches: bool
+    missing_competencias: Tuple[str, ...] = ()  # months between Inicio and Fim without a row
+    extra_competencias: Tuple[str, ...] = ()  # rows outside Inicio..Fim (or not a valid MM/YYYY)
+
+    def to_dict(self) -> Dict:
         return {
-            'personal_info': self.personal_info,
-            'employment_relationships': self.employment_relationships
+            'Nit_Match_Main_NIT': self.nit_match_main_nit,
+            'All_Competences_Complete': self.all_competences_complete,
+            'Data_Inicio': self.data_inicio,
+            'Data_Fim': self.data_fim,
+            'Ultima_Remu': self.ultima_remu,
+            'All_Date_Matches': self.all_date_matches,
+            'Missing_Competencias': list(self.missing_competencias),
+            'Extra_Competencias': list(self.extra_competencias),
         }
-    
-    def _extract_personal_info(self, text: str):
-        patterns = {
-            'NIT': r'NIT:\s*([\d\.\-]+)',
-            'CPF': r'CPF:\s*([\d\.\-]+)',
-            'Nome': r'Nome:\s*([A-ZÇÃÕÁÉÍÓÚÂÊÔÀ\s]+?)(?:Data de nascimento|$)',
-            'Data_Nascimento': r'Data de nascimento:\s*(\d{2}/\d{2}/\d{4})',
-            'Nome_Mae': r'Nome da mãe:\s*([A-ZÇÃÕÁÉÍÓÚÂÊÔÀ\s]+?)(?:\n|Relações)',
-            'Data_Extracao': r'Extrato Previdenciário\s+(\d{2}/\d{2}/\d{4}\s+\d{2}:\d{2}:\d{2})',
+
+
+@dataclass(slots=True)
+class VinculoData:
+    """Header fields of a vínculo (the JSON ``Data`` object)."""
+    nit: str
+    codigo_empresa: str
+    origem_vinculo: str
+    matricula_trabalhador: str
+    tipo_filiado_vinculo: str
+    inicio: Optional[str]
+    fim: Optional[str]
+    ultima_remu: Optional[str]
+    indicadores: str
+
+    def to_dict(self) -> Dict:
+        return {
+            'NIT': self.nit,
+            'Codigo_Empresa': self.codigo_empresa,
+            'Origem_Vinculo': self.origem_vinculo,
+            'Matricula_Trabalhador': self.matricula_trabalhador,
+            'Tipo_Filiado_Vinculo': self.tipo_filiado_vinculo,
+            'Inicio': self.inicio,
+            'Fim': self.fim,
+            'Ultima_Remu': self.ultima_remu,
+            'Indicadores': self.indicadores,
         }
-        
-        for field_name, pattern in patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if match:
-                self.personal_info[field_name] = match.group(1).strip()
+
+
+@dataclass(slots=True)
+class Vinculo:
+    """One employment relationship.
+
+    ``remuneracoes`` is a list of rows, or RemuneracaoColumns when the parser
+    runs with ``columnar=True``. With PLAN_COUNTS, ``total_remuneracoes`` is
+    set and ``remuneracoes`` is left empty (while parsing, the row counters
+    collect bare competência strings there).
+    """
+    sequence: int
+    data: VinculoData
+    remuneracoes: Union[List[Remuneracao], RemuneracaoColumns] = field(default_factory=list)
+    metadata: Optional[VinculoMetadata] = None
+    total_remuneracoes: Optional[int] = None
+
+    @property
+    def remuneracao_count(self) -> int:
+        if self.total_remuneracoes is not None:
+            return self.total_remuneracoes
+        return len(self.remuneracoes)
+
+    def to_dict(self) -> Dict:
+        out = {'sequence': self.sequence, 'Data': self.data.to_dict()}
+        if self.total_remuneracoes is None:
+            out['Remuneracoes'] = [r.to_dict() for r in self.remuneracoes]
+        else:
+            out['Total_Remuneracoes'] = self.total_remuneracoes
+        if self.metadata is not None:
+            out['Metadata'] = self.metadata.to_dict()
+        return out
+
+
+@dataclass(slots=True)
+class PersonalInfo:
+    """Identification fields; attribute names are the PERSONAL_INFO_PATTERNS keys, lower-cased."""
+    nit: Optional[str] = None
+    cpf: Optional[str] = None
+    nome: Optional[str] = None
+    data_nascimento: Optional[str] = None
+    nome_mae: Optional[str] = None
+    data_extracao: Optional[str] = None
+
+    def is_complete(self) -> bool:
+        return all(getattr(self, name.lower()) for name in PERSONAL_INFO_PATTERNS)
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name.lower()) for name in PERSONAL_INFO_PATTERNS}
+
+
+class CnisRecords(NamedTuple):
+    """What CNISParserFinal.parse_records() returns."""
+    personal_info: PersonalInfo
+    vinculos: List[Vinculo]
+
+    def to_dict(self) -> Dict:
+        return {
+            'personal_info': self.personal_info.to_dict(),
+            'employment_relationships': [v.to_dict() for v in self.vinculos],
+        }
+
+
+def tokenize_line(line: str) -> Token:
+    """Classify one line of extracted text. Every line is classified exactly once."""
+    stripped = line.strip()
+    if SEQ_PREFIX_RE.match(line):
+        return Token(TOKEN_VINCULO_HEADER, line, VINCULO_HEADER_RE.match(line))
+    if 'Seq.' in line or stripped.startswith('Matrícula'):
+        return Token(TOKEN_SECTION, line)
+    if stripped.startswith('O INSS'):
+        return Token(TOKEN_NOTICE, line)
+    if stripped.startswith('Página'):
+        return Token(TOKEN_PAGE_FOOTER, line)
+    if 'Remunerações' in line:
+        return Token(TOKEN_REMUNERACOES, line)
+    if 'Indicadores:' in line:
+        match = INDICADORES_RE.search(line)
+        return Token(TOKEN_INDICADORES, line, match.group(1).strip() if match else None)
+    if 'Competência' in line:
+        if 'Salário Contribuição' in line:
+            table_kind = TABLE_FACULTATIVO
+        elif 'Contrat./Cooperat.' in line or 'Estabelecimento' in line:
+            table_kind = TABLE_CONTRIBUINTE
+        else:
+            table_kind = TABLE_REGULAR
+        return Token(TOKEN_TABLE_HEADER, line, table_kind)
+    if COMPETENCIA_RE.match(stripped):
+        return Token(TOKEN_ROW, line)
+    return Token(TOKEN_OTHER, line)
+
+
+class TextExtractor:
+    """Turns a PDF (path or binary stream) into one text string per page.
+
+    Lines within a page are separated by "\n" and words by single spaces,
+    which is the layout the line tokenizer expects.
+    """
+    name = ''
+
+    def page_count(self, source) -> int:
+        raise NotImplementedError
+
+    def iter_pages(self, source, start: int = 0, stop: Optional[int] = None,
+                   timings: Optional[Dict[str, float]] = None,
+                   on_open: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+        """Text of pages [start, stop), in order.
+
+        When ``timings`` is given, seconds spent opening the document and
+        extracting pages are added to its 'open' and 'extract' entries.
+        ``on_open`` is called with the page count once the document is open,
+        before any page is extracted; an exception it raises ends the iteration.
+        """
+        raise NotImplementedError
+
+
+class PdfplumberExtractor(TextExtractor):
+    """pdfplumber ``extract_text``: full layout analysis. The reference backend."""
+    name = 'pdfplumber'
+
+    def page_count(self, source) -> int:
+        with pdfplumber.open(source) as pdf:
+            return len(pdf.pages)
+
+    def iter_pages(self, source, start: int = 0, stop: Optional[int] = None,
+                   timings: Optional[Dict[str, float]] = None,
+                   on_open: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+        opened = time.perf_counter()
+        with pdfplumber.open(source) as pdf:
+            pages = pdf.pages[start:stop]
+            _add_timing(timings, 'open', opened)
+            if on_open is not None:
+                on_open(len(pdf.pages))
+            for page in pages:
+                started = time.perf_counter()
+                text = page.extract_text()
+                page.close()  # drop pdfplumber's per-page layout cache
+                _add_timing(timings, 'extract', started)
+                yield text
+
+
+class PdfminerExtractor(TextExtractor):
+    """pdfminer.six layout lines, without pdfplumber's per-character processing.
+
+    A wide ``char_margin`` keeps each printed row in a single text line and
+    ``boxes_flow=None`` skips the reading-order pass over text boxes; lines
+    are then ordered top to bottom and rows that share a baseline joined.
+    """
+    name = 'pdfminer'
+
+    LAPARAMS = LAParams(
+        char_margin=200.0,
+        line_margin=0.2,
+        word_margin=0.35,
+        boxes_flow=None,
+        detect_vertical=False,
+    )
+    SAME_ROW_TOLERANCE = 3.0  # points, like pdfplumber's y_tolerance
+
+    def page_count(self, source) -> int:
+        with _open_binary(source) as fp:
+            return sum(1 for _ in PDFPage.create_pages(PDFDocument(PDFParser(fp))))
+
+    def iter_pages(self, source, start: int = 0, stop: Optional[int] = None,
+                   timings: Optional[Dict[str, float]] = None,
+                   on_open: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+        opened = time.perf_counter()
+        resources = PDFResourceManager(caching=True)
+        device = PDFPageAggregator(resources, laparams=self.LAPARAMS)
+        interpreter = PDFPageInterpreter(resources, device)
+        with _open_binary(source) as fp:
+            pages = PDFPage.create_pages(PDFDocument(PDFParser(fp)))
+            if on_open is not None:
+                # Walking the page tree reads no content streams; they are interpreted below
+                listed = list(pages)
+                _add_timing(timings, 'open', opened)
+                on_open(len(listed))
+                pages = iter(listed)
             else:
-                self.personal_info[field_name] = None
-    
-    def _extract_employment_relationships(self, text: str):
-        seq_pattern = r'(?:^|\n)(\d+)\s+(\d{3}\.\d{5}\.\d{2}-\d)\s+([^\n]+)'
-        
-        lines = text.split('\n')
-        i = 0
-        
-        while i < len(lines):
-            line = lines[i]
-            
-            match = re.match(r'^(\d+)\s+(\d{3}\.\d{5}\.\d{2}-\d)\s+(.+)', line)
-            if match:
-                seq_num = int(match.group(1))
-                nit = match.group(2)
-                rest_of_line = match.group(3)
-                
-                employment_data = self._parse_employment_header(
-                    seq_num, nit, rest_of_line, lines, i
-                )
-                
-                if employment_data:
-                    self.employment_relationships.append(employment_data)
-                    
-                    i = self._parse_remuneracoes_after_header(
-                        employment_data, lines, i + 1
-                    )
-                else:
-                    i += 1
+                _add_timing(timings, 'open', opened)
+            index = 0
+            while stop is None or index < stop:
+                started = time.perf_counter()
+                page = next(pages, None)
+                if page is None:
+                    break
+                if index >= start:
+                    interpreter.process_page(page)
+                    text = self._layout_text(device.get_result())
+                    _add_timing(timings, 'extract', started)
+                    yield text
+                index += 1
+
+    def _layout_text(self, layout) -> str:
+        lines = []
+        for element in layout:
+            if isinstance(element, LTTextLine):
+                lines.append(element)
+            elif isinstance(element, LTTextContainer):
+                lines.extend(line for line in element if isinstance(line, LTTextLine))
+        lines.sort(key=lambda line: (-line.y1, line.x0))
+
+        rows = []
+        last_top = None
+        for line in lines:
+            text = ' '.join(line.get_text().split())
+            if rows and abs(last_top - line.y1) < self.SAME_ROW_TOLERANCE:
+                rows[-1] += ' ' + text
             else:
-                i += 1
-    
+                rows.append(text)
+            last_top = line.y1
+        return '\n'.join(rows)
+
+
+def _add_timing(timings: Optional[Dict[str, float]], stage: str, started: float):
+    """Add the seconds since ``started`` to ``timings[stage]`` (no-op without a dict)."""
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+class _open_binary:
+    """Context manager yielding a binary stream for a path or an already open stream."""
+
+    def __init__(self, source):
+        self.source = source
+        self.fp = None
+
+    def __enter__(self):
+        if hasattr(self.source, 'read'):
+            self.source.seek(0)
+            return self.source
+        self.fp = open(self.source, 'rb')
+        return self.fp
+
+    def __exit__(self, *exc):
+        if self.fp is not None:
+            self.fp.close()
+
+
+EXTRACTORS = {
+    PdfplumberExtractor.name: PdfplumberExtractor,
+    PdfminerExtractor.name: PdfminerExtractor,
+}
+DEFAULT_EXTRACTOR = PdfplumberExtractor.name
+
+
+def get_extractor(extractor: Union[str, TextExtractor, None] = None) -> TextExtractor:
+    """Resolve an extractor name (see EXTRACTORS) or pass an instance through."""
+    if isinstance(extractor, TextExtractor):
+        return extractor
+    name = extractor or DEFAULT_EXTRACTOR
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown text extractor {name!r}; expected one of {', '.join(EXTRACTORS)}")
+    return EXTRACTORS[name]()
+
+
+def _extract_page_range(source, start: int, stop: int, extractor: str) -> List[str]:
+    """Text of pages [start, stop) of a PDF. Runs inside page-extraction workers."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return list(get_extractor(extractor).iter_pages(source, start, stop))
+
+
+def _last_currency_token(parts: List[str]) -> Optional[str]:
+    """Last "1.234,56"-style value among ``parts``, or None."""
+    for part in reversed(parts):
+        if CURRENCY_TOKEN_RE.match(part) and (',' in part or '.' in part):
+            return part
+    return None
+
+
+class _TokenCursor:
+    """Iterator over line tokens with a small lookahead window.
+
+    Only the current token and the tokens peeked past it are held in memory.
+    """
+
+    def __init__(self, tokens: Iterable[Token]):
+        self._tokens = iter(tokens)
+        self._window = deque()
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        window = self._window
+        while len(window) <= offset:
+            token = next(self._tokens, None)
+            if token is None:
+                return None
+            window.append(token)
+        return window[offset]
+
+    def following(self, count: int) -> List[Token]:
+        """Up to ``count`` tokens after the current one."""
+        tokens = []
+        for offset in range(1, count + 1):
+            token = self.peek(offset)
+            if token is None:
+                break
+            tokens.append(token)
+        return tokens
+
+    def advance(self):
+        self._window.popleft()
+
+
+class CNISParserFinal:
+    def __init__(self, pdf_path: PdfSource, debug: bool = False, page_workers: int = 1,
+                 extractor: Union[str, TextExtractor, None] = None, plan: str = PLAN_FULL,
+                 columnar: bool = False, require_cnis: bool = False, max_pages: int = 0,
+                 deadline: Union[float, Callable[[], float], None] = None):
+        """``page_workers`` > 1 extracts the pages after the first in that many worker processes.
+
+        ``extractor`` picks the text backend by name (see EXTRACTORS); the
+        default is pdfplumber.
+
+        ``plan`` (see PARSE_PLANS) limits the work done: with PLAN_COUNTS each
+        vínculo carries ``Total_Remuneracoes`` instead of a ``Remuneracoes``
+        list, with PLAN_PERSONAL no vínculos are parsed at all.
+
+        ``columnar`` stores each vínculo's remunerações as RemuneracaoColumns
+        instead of a list of rows (same rows and JSON, smaller footprint).
+
+        Fail-fast checks, before the full extraction pass: ``max_pages`` > 0
+        raises PageLimitError when the page count (read from the page tree,
+        without extracting text) is higher; ``require_cnis`` raises
+        NotCnisError when the first page lacks the CNIS_FIRST_PAGE_MARKERS.
+
+        ``deadline`` is a time.time() value, or a callable returning one
+        (read at every check, so another party can move it to cancel the
+        parse). It is checked before each page and each remuneração table;
+        once it has passed the parse stops with DeadlineExceeded, and
+        stage_timings()/pages_parsed describe the work done so far.
+        """
+        if plan not in PARSE_PLANS:
+            raise ValueError(f"Unknown parse plan {plan!r}; expected one of {', '.join(PARSE_PLANS)}")
+        if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+            self.pdf_path = None
+            self.source = io.BytesIO(pdf_path)
+        elif hasattr(pdf_path, 'read'):
+            self.pdf_path = None
+            self.source = pdf_path
+        else:
+            self.pdf_path = Path(pdf_path)
+            self.source = self.pdf_path
+        self.debug = debug
+        self.page_workers = page_workers
+        self.extractor = get_extractor(extractor)
+        self.plan = plan
+        self.columnar = columnar
+        self.require_cnis = require_cnis
+        self.max_pages = max_pages
+        self.deadline = deadline
+        self.personal = PersonalInfo()
+        self.vinculos: List[Vinculo] = []
+        self.pages_parsed = 0
+        self.page_count = 0
+        self.timings = {}
+
+    @property
+    def personal_info(self) -> Dict:
+        return self.personal.to_dict()
+
+    @property
+    def employment_relationships(self) -> List[Dict]:
+        return [v.to_dict() for v in self.vinculos]
+
+    def parse(self) -> Dict:
+        """Parse the whole document into the JSON shape (see parse_records)."""
+        return self.parse_records().to_dict()
+
+    def parse_records(self) -> CnisRecords:
+        print(f"[INFO] Parsing CNIS: {self.pdf_path or '<in-memory PDF>'}")
+
+        self.vinculos = list(self.iter_vinculos())
+        return CnisRecords(self.personal, self.vinculos)
+
+    def iter_employment_relationships(self) -> Iterator[Dict]:
+        """iter_vinculos, each vínculo converted to its JSON dict."""
+        return (vinculo.to_dict() for vinculo in self.iter_vinculos())
+
+    def iter_vinculos(self) -> Iterator[Vinculo]:
+        """Stream the document, yielding each vínculo as soon as it is complete.
+
+        Pages are extracted one at a time and fed through the line state
+        machine, so only the current page is held in memory. ``personal``
+        is filled in as pages arrive and is complete (it lives on page 1) by
+        the time the first vínculo is yielded.
+        """
+        self.personal = PersonalInfo()
+        self.pages_parsed = 0
+        self.timings = {}
+        if self.plan == PLAN_PERSONAL:
+            return self._timed(self._iter_personal_only(self._iter_lines()))
+        return self._timed(self._iter_vinculos(self._iter_lines()))
+
+    def _timed(self, vinculos: Iterator[Vinculo]) -> Iterator[Vinculo]:
+        # Only time spent producing items counts; the consumer's own work in between does not
+        while True:
+            started = time.perf_counter()
+            try:
+                emp = next(vinculos, None)
+            finally:
+                _add_timing(self.timings, 'total', started)
+            if emp is None:
+                return
+            yield emp
+
+    def stage_timings(self) -> Dict[str, float]:
+        """Seconds per stage of the last parse: open, extract, parse (lines), metadata.
+
+        'parse' is what remains of the total once the other stages are taken out.
+        """
+        stages = {stage: self.timings.get(stage, 0.0) for stage in ('open', 'extract', 'metadata')}
+        stages['parse'] = max(self.timings.get('total', 0.0) - sum(stages.values()), 0.0)
+        return stages
+
+    def _check_deadline(self):
+        if self.deadline is None:
+            return
+        deadline = self.deadline() if callable(self.deadline) else self.deadline
+        if time.time() > deadline:
+            raise DeadlineExceeded(f"Parse deadline exceeded after {self.pages_parsed} pages")
+
+    def _iter_personal_only(self, lines: Iterable[str]) -> Iterator[Vinculo]:
+        """Read pages only until every personal_info field is known; yields no vínculos."""
+        for _ in lines:
+            if self.personal.is_complete():
+                break
+        yield from ()
+
+    def _iter_lines(self) -> Iterator[str]:
+        self._check_deadline()
+        # Same line sequence as splitting the "\n"-joined text of all pages
+        for text in self._iter_page_texts():
+            if self.require_cnis and not self.pages_parsed and not looks_like_cnis(text):
+                raise NotCnisError("Not a CNIS extract: first page lacks 'Extrato Previdenciário' and 'NIT:'")
+            self.pages_parsed += 1
+            self._extract_personal_info(text + "\n")
+            yield from text.split('\n')
+            # Before the next page is extracted
+            self._check_deadline()
+        if self.require_cnis and not self.pages_parsed:
+            raise NotCnisError("Not a CNIS extract: the PDF has no pages")
+        yield ''
+
+    def _opened(self, page_count: int):
+        """The extractor's ``on_open``: enforce max_pages before any page is extracted."""
+        self.page_count = page_count
+        if self.max_pages > 0 and page_count > self.max_pages:
+            raise PageLimitError(f"PDF has {page_count} pages (max {self.max_pages})")
+
+    def _iter_page_texts(self) -> Iterator[str]:
+        pages = self.extractor.iter_pages(self.source, timings=self.timings, on_open=self._opened)
+        first = next(pages, None)
+        if first is None:
+            return
+        # Page 0 is yielded (and checked by looks_like_cnis) before any worker is started
+        yield first
+        chunks = min(self.page_workers, self.page_count - 1)
+        if chunks <= 1:
+            yield from pages
+            return
+        pages.close()
+
+        # Each worker reopens the document and extracts a contiguous range of the
+        # remaining pages; ranges are yielded back in page order, so the text
+        # matches the serial path.
+        source = self._picklable_source()
+        bounds = [1 + (self.page_count - 1) * k // chunks for k in range(chunks + 1)]
+        with ProcessPoolExecutor(max_workers=chunks) as executor:
+            futures = [
+                executor.submit(_extract_page_range, source, bounds[k], bounds[k + 1], self.extractor.name)
+                for k in range(chunks)
+            ]
+            for future in futures:
+                # Only the wait is visible here; workers extract concurrently
+                waited = time.perf_counter()
+                texts = future.result()
+                _add_timing(self.timings, 'extract', waited)
+                yield from texts
+
+    def _extract_page_texts(self) -> List[str]:
+        return list(self._iter_page_texts())
+
+    def _picklable_source(self):
+        if self.pdf_path is not None:
+            return str(self.pdf_path)
+        if isinstance(self.source, io.BytesIO):
+            return self.source.getvalue()
+        self.source.seek(0)
+        return self.source.read()
+
+    def _extract_personal_info(self, text: str):
+        """Fill personal_info fields still missing from ``text`` (a page or the whole document)."""
+        for field_name, pattern in PERSONAL_INFO_PATTERNS.items():
+            attr = field_name.lower()
+            if getattr(self.personal, attr):
+                continue
+            match = pattern.search(text)
+            setattr(self.personal, attr, match.group(1).strip() if match else None)
+
+    def _iter_vinculos(self, lines: Iterable[str]) -> Iterator[Vinculo]:
+        """Token state machine: SCAN -> VINCULO <-> TABLE -> SCAN.
+
+        A vínculo is finished (and yielded) when the machine falls back to
+        SCAN, i.e. at the next header line or a page footer, or at end of input.
+        """
+        cursor = _TokenCursor(map(tokenize_line, lines))
+        row_parsers = self._TABLE_ROW_PARSERS if self.plan == PLAN_FULL else self._TABLE_ROW_COUNTERS
+        state = STATE_SCAN
+        table_kind = None
+        current = None
+
+        while True:
+            token = cursor.peek()
+            if token is None:
+                break
+            kind = token.kind
+
+            if state == STATE_SCAN:
+                if kind == TOKEN_VINCULO_HEADER and token.data:
+                    match = token.data
+                    employment_data = self._parse_employment_header(
+                        int(match.group(1)), match.group(2), match.group(3), cursor.following(2)
+                    )
+                    if employment_data:
+                        current = employment_data
+                        state = STATE_VINCULO
+                cursor.advance()
+                continue
+
+            if state == STATE_VINCULO:
+                if kind in (TOKEN_VINCULO_HEADER, TOKEN_NOTICE, TOKEN_PAGE_FOOTER):
+                    # The vínculo is over; re-examine this token in SCAN (it may be the next header)
+                    yield self._finalize_employment(current)
+                    current = None
+                    state = STATE_SCAN
+                    continue
+                if kind == TOKEN_INDICADORES:
+                    if token.data and not current.data.indicadores:
+                        current.data.indicadores = token.data
+                elif kind == TOKEN_TABLE_HEADER:
+                    self._check_deadline()
+                    table_kind = token.data
+                    state = STATE_TABLE
+                cursor.advance()
+                continue
+
+            # STATE_TABLE: rows until the next header, section or notice line
+            if kind in (TOKEN_VINCULO_HEADER, TOKEN_SECTION, TOKEN_NOTICE):
+                state = STATE_VINCULO
+                continue
+            if kind == TOKEN_ROW or (kind == TOKEN_OTHER and table_kind == TABLE_REGULAR):
+                # Regular tables pick up competência/valor pairs anywhere in a line
+                row_parsers[table_kind](self, current, token.text)
+            cursor.advance()
+
+        if current is not None:
+            yield self._finalize_employment(current)
+
+    def _finalize_employment(self, emp: Vinculo) -> Vinculo:
+        started = time.perf_counter()
+        if self.plan != PLAN_FULL:
+            # The row counters collected bare competência strings
+            competencias = emp.remuneracoes
+            emp.remuneracoes = []
+            emp.total_remuneracoes = len(competencias)
+        elif isinstance(emp.remuneracoes, RemuneracaoColumns):
+            competencias = emp.remuneracoes
+        else:
+            competencias = [r.competencia for r in emp.remuneracoes]
+
+        # Derive missing Fim date from last remuneration if available
+        if not emp.data.fim and competencias:
+            comp = competencias[-1]
+            if isinstance(comp, Remuneracao):
+                comp = comp.competencia
+            index = month_index(comp)
+            if index is not None:
+                emp.data.fim = last_day_of_month(index)
+        emp.metadata = self._calculate_metadata(emp, competencias)
+        _add_timing(self.timings, 'metadata', started)
+        return emp
+
     def _parse_employment_header(self, seq: int, nit: str, rest_of_line: str,
-                                  lines: List[str], line_idx: int) -> Optional[Dict]:
+                                  following: List[Token]) -> Optional[Vinculo]:
+        """Build a vínculo from its header line; ``following`` holds the next (up to two) tokens."""
         try:
             parts = rest_of_line.split()
 
@@ -114,7 +875,7 @@ class CNISParserFinal:
             indicadores = ""
 
             # First part is usually the CNPJ/CEI code
-            if parts and re.match(r'[\d\./\-]+', parts[0]):
+            if parts and CODIGO_EMPRESA_RE.match(parts[0]):
                 codigo_emp = parts[0]
                 parts = parts[1:]
 
@@ -135,33 +896,33 @@ class CNISParserFinal:
                 tipo_parts = []
                 remaining_parts = parts[tipo_found_at:]
                 for part in remaining_parts:
-                    if re.match(r'\d{2}/\d{2}/\d{4}', part):
+                    if FULL_DATE_RE.match(part):
                         if not data_inicio:
                             data_inicio = part
                         elif not data_fim:
                             data_fim = part
-                    elif re.match(r'\d{2}/\d{4}$', part):
+                    elif MONTH_YEAR_RE.match(part):
                         ultima_remu = part
                     elif not data_inicio:
                         # Still collecting type before any date appears
                         tipo_parts.append(part)
-                    elif part.startswith(('IREM', 'IREC', 'PREC', 'PREM', 'ASE', 'AVRC', 'IVIN', 'PSC')):
+                    elif part.startswith(INDICADOR_PREFIXES):
                         indicadores = part if not indicadores else indicadores + ' ' + part
 
                 tipo_filiado = ' '.join(tipo_parts)
             else:
                 # No type keyword found - everything before dates is the name
                 for idx, part in enumerate(parts):
-                    if re.match(r'\d{2}/\d{2}/\d{4}', part):
+                    if FULL_DATE_RE.match(part):
                         if not data_inicio:
                             data_inicio = part
                         elif not data_fim:
                             data_fim = part
-                    elif re.match(r'\d{2}/\d{4}$', part):
+                    elif MONTH_YEAR_RE.match(part):
                         ultima_remu = part
                     elif not data_inicio:
                         origem_vinculo.append(part)
-                    elif part.startswith(('IREM', 'IREC', 'PREC', 'PREM', 'ASE', 'AVRC', 'IVIN', 'PSC')):
+                    elif part.startswith(INDICADOR_PREFIXES):
                         indicadores = part if not indicadores else indicadores + ' ' + part
 
             origem_str = ' '.join(origem_vinculo)
@@ -183,9 +944,9 @@ class CNISParserFinal:
                     matricula = ' '.join(matricula_parts)
 
             # Handle next line: may contain "Público", "S.A.", "FALIDO", company name continuation, or Indicadores
-            next_line_idx = line_idx + 1
-            if next_line_idx < len(lines):
-                next_line = lines[next_line_idx].strip()
+            if following:
+                next_token = following[0]
+                next_line = next_token.text.strip()
 
                 if next_line:
                     # "Público" is continuation of "Empregado ou Agente" type
@@ -204,25 +965,19 @@ class CNISParserFinal:
                         tipo_filiado = tipo_filiado + ' Individual'
                     elif next_line.startswith('Matrícula'):
                         pass  # Skip matrícula header line
-                    elif next_line.startswith('Indicadores:'):
-                        ind_match = re.search(r'Indicadores:\s*(.+)', next_line)
-                        if ind_match:
-                            indicadores = ind_match.group(1).strip()
-                    elif not next_line.startswith('Seq.') and not next_line.startswith('Remunerações') \
-                         and not next_line.startswith('Competência') \
-                         and not re.match(r'^\d+\s+\d{3}\.\d{5}', next_line) \
-                         and not next_line.startswith('O INSS') \
-                         and not next_line.startswith('Página'):
+                    elif next_token.kind == TOKEN_INDICADORES:
+                        if next_token.data:
+                            indicadores = next_token.data
+                    elif next_token.kind in (TOKEN_OTHER, TOKEN_ROW):
                         # Company name continuation (e.g. "S.A.", "FALIDO", "LTDA")
                         origem_str += ' ' + next_line
 
                 # Check line after next for Indicadores
-                if next_line_idx + 1 < len(lines):
-                    next_next = lines[next_line_idx + 1].strip()
-                    if next_next.startswith('Indicadores:') and not indicadores:
-                        ind_match = re.search(r'Indicadores:\s*(.+)', next_next)
-                        if ind_match:
-                            indicadores = ind_match.group(1).strip()
+                if len(following) > 1:
+                    next_next = following[1]
+                    if next_next.kind == TOKEN_INDICADORES and next_next.text.strip().startswith('Indicadores:') \
+                            and next_next.data and not indicadores:
+                        indicadores = next_next.data
 
             # Clean trailing stray numbers from company name (matrícula fragments like "LTDA 1", "LTDA 235")
             mat_match = re.search(r'\s+(\d{1,4})$', origem_str.strip())
@@ -238,243 +993,158 @@ class CNISParserFinal:
                     origem_str = first_half
 
             # If no Fim date but we have Ultima_Remu (MM/YYYY), derive Fim as last day of that month
-            if not data_fim and ultima_remu and re.match(r'\d{2}/\d{4}', ultima_remu):
-                try:
-                    month, year = int(ultima_remu[:2]), int(ultima_remu[3:])
-                    # Last day of the month
-                    if month == 12:
-                        last_day = datetime(year + 1, 1, 1) - relativedelta(days=1)
-                    else:
-                        last_day = datetime(year, month + 1, 1) - relativedelta(days=1)
-                    data_fim = last_day.strftime('%d/%m/%Y')
-                except:
-                    pass
-
-            return {
-                'sequence': seq,
-                'Data': {
-                    'NIT': nit,
-                    'Codigo_Empresa': codigo_emp,
-                    'Origem_Vinculo': origem_str.strip(),
-                    'Matricula_Trabalhador': matricula,
-                    'Tipo_Filiado_Vinculo': tipo_filiado,
-                    'Inicio': data_inicio,
-                    'Fim': data_fim,
-                    'Ultima_Remu': ultima_remu,
-                    'Indicadores': indicadores
-                },
-                'Remuneracoes': []
-            }
+            if not data_fim and ultima_remu:
+                index = month_index(ultima_remu)
+                if index is not None:
+                    data_fim = last_day_of_month(index)
+
+            remuneracoes = RemuneracaoColumns() if self.columnar and self.plan == PLAN_FULL else []
+            return Vinculo(seq, VinculoData(
+                nit=nit,
+                codigo_empresa=codigo_emp,
+                origem_vinculo=origem_str.strip(),
+                matricula_trabalhador=matricula,
+                tipo_filiado_vinculo=tipo_filiado,
+                inicio=data_inicio,
+                fim=data_fim,
+                ultima_remu=ultima_remu,
+                indicadores=indicadores,
+            ), remuneracoes)
 
         except Exception as e:
             if self.debug:
                 print(f"[ERROR] Failed to parse employment header: {e}")
             return None
     
-    def _parse_remuneracoes_after_header(self, employment: Dict, lines: List[str], 
-                                         start_idx: int) -> int:
-        i = start_idx
-        tipo_filiado = employment['Data'].get('Tipo_Filiado_Vinculo', '')
-        
-        while i < len(lines):
-            line = lines[i]
-            
-            if re.match(r'^\d+\s+\d{3}\.\d{5}\.\d{2}-\d', line):
-                return i
-            
-            if 'Remunerações' in line:
-                i += 1
-                continue
-            
-            if 'Indicadores:' in line and not employment['Data']['Indicadores']:
-                ind_match = re.search(r'Indicadores:\s*(.+)', line)
-                if ind_match:
-                    employment['Data']['Indicadores'] = ind_match.group(1).strip()
-                i += 1
-                continue
-            
-            if 'Competência' in line:
-                if 'Salário Contribuição' in line:
-                    i = self._parse_facultativo_table(employment, lines, i)
-                elif 'Contrat./Cooperat.' in line or 'Estabelecimento' in line:
-                    i = self._parse_contribuinte_individual_table(employment, lines, i)
-                else:
-                    i = self._parse_regular_remuneracoes(employment, lines, i)
-                continue
-            
-            if line.strip() and re.match(r'\d{2}/\d{4}', line.strip()[:7]):
-                if 'Contribuinte' in tipo_filiado:
-                    self._parse_contribuinte_line(employment, line)
-                elif 'Facultativo' in tipo_filiado:
-                    self._parse_facultativo_line(employment, line)
-                else:
-                    self._parse_regular_remuneracao_line(employment, line)
-            
-            if line.startswith('O INSS poderá') or line.startswith('Página'):
-                return i
-            
-            i += 1
-        
-        return i
-    
-    def _parse_regular_remuneracoes(self, employment: Dict, lines: List[str], start_idx: int) -> int:
-        i = start_idx + 1
-        
-        while i < len(lines):
-            line = lines[i]
-            
-            if re.match(r'^\d+\s+\d{3}\.\d{5}', line) or 'Seq.' in line:
-                return i
-            
-            if line.startswith('Matrícula') or line.startswith('O INSS'):
-                return i
-            
-            if line.strip():
-                comp_remu_pattern = r'(\d{2}/\d{4})\s+([\d\.,]+)(?:\s+([A-Z\-]+(?:\s+[A-Z\-]+)*))?'
-                matches = list(re.finditer(comp_remu_pattern, line))
-                
-                for match in matches:
-                    competencia = match.group(1)
-                    remuneracao_str = match.group(2)
-                    indicadores = match.group(3) if match.group(3) else ""
-                    
-                    employment['Remuneracoes'].append({
-                        'Competencia': competencia,
-                        'Remuneracao': self._parse_currency(remuneracao_str),
-                        'Indicadores': indicadores.strip() if indicadores else ""
-                    })
-            
-            i += 1
-        
-        return i
-    
-    def _parse_contribuinte_individual_table(self, employment: Dict, lines: List[str], start_idx: int) -> int:
-        i = start_idx + 1
-        
-        while i < len(lines):
-            line = lines[i]
-            
-            if re.match(r'^\d+\s+\d{3}\.\d{5}', line) or 'Seq.' in line:
-                return i
-            
-            if line.startswith('Matrícula') or line.startswith('O INSS'):
-                return i
-            
-            if line.strip() and re.match(r'\d{2}/\d{4}', line.strip()[:7]):
-                parts = line.split()
-                if len(parts) >= 2:
-                    competencia = parts[0]
-                    
-                    remuneracao_str = None
-                    for part in reversed(parts):
-                        if re.match(r'[\d\.,]+$', part) and (',' in part or '.' in part):
-                            remuneracao_str = part
-                            break
-                    
-                    indicadores = ""
-                    for part in parts:
-                        if 'IREM' in part.upper():
-                            indicadores = part
-                            break
-                    
-                    if remuneracao_str:
-                        employment['Remuneracoes'].append({
-                            'Competencia': competencia,
-                            'Remuneracao': self._parse_currency(remuneracao_str),
-                            'Indicadores': indicadores
-                        })
-            
-            i += 1
-        
-        return i
-    
-    def _parse_facultativo_table(self, employment: Dict, lines: List[str], start_idx: int) -> int:
-        i = start_idx + 1
-        
-        while i < len(lines):
-            line = lines[i]
-            
-            if re.match(r'^\d+\s+\d{3}\.\d{5}', line) or 'Seq.' in line:
-                return i
-            
-            if line.startswith('Matrícula') or line.startswith('O INSS'):
-                return i
-            
-            if line.strip() and re.match(r'\d{2}/\d{4}', line.strip()[:7]):
-                parts = line.split()
-                if len(parts) >= 3:
-                    competencia = parts[0]
-                    
-                    currency_values = []
-                    for part in parts[1:]:
-                        if re.match(r'[\d\.,]+$', part) and (',' in part or '.' in part):
-                            currency_values.append(part)
-                    
-                    salario_contrib = currency_values[-1] if currency_values else None
-                    
-                    indicadores = []
-                    for part in parts:
-                        if 'PREC' in part.upper() or 'MENOR' in part.upper() or 'INDPEND' in part.upper() or 'FACULT' in part.upper():
-                            indicadores.append(part)
-                    
-                    if salario_contrib:
-                        employment['Remuneracoes'].append({
-                            'Competencia': competencia,
-                            'Remuneracao': self._parse_currency(salario_contrib),
-                            'Indicadores': ', '.join(indicadores) if indicadores else ""
-                        })
-            
-            i += 1
-        
-        return i
-    
-    def _parse_regular_remuneracao_line(self, employment: Dict, line: str):
-        pass
-    
-    def _parse_contribuinte_line(self, employment: Dict, line: str):
-        pass
-    
-    def _parse_facultativo_line(self, employment: Dict, line: str):
-        pass
+
+    def _parse_regular_remuneracao_line(self, employment: Vinculo, line: str):
+        for match in REGULAR_ROW_RE.finditer(line):
+            competencia = match.group(1)
+            remuneracao_str = match.group(2)
+            indicadores = match.group(3) if match.group(3) else ""
+
+            employment.remuneracoes.append(Remuneracao(
+                competencia,
+                self._parse_currency(remuneracao_str),
+                indicadores.strip() if indicadores else "",
+            ))
+
+    def _parse_contribuinte_line(self, employment: Vinculo, line: str):
+        parts = line.split()
+        if len(parts) < 2:
+            return
+        competencia = parts[0]
+
+        remuneracao_str = _last_currency_token(parts)
+
+        indicadores = ""
+        for part in parts:
+            if 'IREM' in part.upper():
+                indicadores = part
+                break
+
+        if remuneracao_str:
+            employment.remuneracoes.append(Remuneracao(
+                competencia, self._parse_currency(remuneracao_str), indicadores,
+            ))
+
+    def _parse_facultativo_line(self, employment: Vinculo, line: str):
+        parts = line.split()
+        if len(parts) < 3:
+            return
+        competencia = parts[0]
+
+        # Salário Contribuição is the last currency value of the row
+        salario_contrib = _last_currency_token(parts[1:])
+
+        indicadores = []
+        for part in parts:
+            upper = part.upper()
+            if 'PREC' in upper or 'MENOR' in upper or 'INDPEND' in upper or 'FACULT' in upper:
+                indicadores.append(part)
+
+        if salario_contrib:
+            employment.remuneracoes.append(Remuneracao(
+                competencia,
+                self._parse_currency(salario_contrib),
+                ', '.join(indicadores) if indicadores else "",
+            ))
+
+    _TABLE_ROW_PARSERS = {
+        TABLE_REGULAR: _parse_regular_remuneracao_line,
+        TABLE_CONTRIBUINTE: _parse_contribuinte_line,
+        TABLE_FACULTATIVO: _parse_facultativo_line,
+    }
+
+    # PLAN_COUNTS: accept exactly the rows the parsers above would, but keep
+    # only the competência string (no currency parsing, no indicator scan).
+    def _count_regular_remuneracao_line(self, employment: Vinculo, line: str):
+        employment.remuneracoes.extend(match.group(1) for match in REGULAR_ROW_RE.finditer(line))
+
+    def _count_contribuinte_line(self, employment: Vinculo, line: str):
+        parts = line.split()
+        if len(parts) >= 2 and _last_currency_token(parts):
+            employment.remuneracoes.append(parts[0])
+
+    def _count_facultativo_line(self, employment: Vinculo, line: str):
+        parts = line.split()
+        if len(parts) >= 3 and _last_currency_token(parts[1:]):
+            employment.remuneracoes.append(parts[0])
+
+    _TABLE_ROW_COUNTERS = {
+        TABLE_REGULAR: _count_regular_remuneracao_line,
+        TABLE_CONTRIBUINTE: _count_contribuinte_line,
+        TABLE_FACULTATIVO: _count_facultativo_line,
+    }
     
-    def _calculate_metadata(self, employment: Dict) -> Dict:
-        data = employment.get('Data', {})
-        remu = employment.get('Remuneracoes', [])
+    def _calculate_metadata(self, employment: Vinculo,
+                            competencias: Union[Sequence[str], RemuneracaoColumns]) -> VinculoMetadata:
+        data = employment.data
         
-        nit_match = data.get('NIT') == self.personal_info.get('NIT')
-        has_data_inicio = bool(data.get('Inicio'))
-        has_data_fim = bool(data.get('Fim'))
-        has_ultima_remu = bool(data.get('Ultima_Remu'))
+        nit_match = data.nit == self.personal.nit
+        has_data_inicio = bool(data.inicio)
+        has_data_fim = bool(data.fim)
+        has_ultima_remu = bool(data.ultima_remu)
         
         all_competences_complete = False
         all_date_matches = False
+        missing = extra = ()
         
-        if remu and has_data_inicio and has_data_fim:
-            try:
-                inicio = datetime.strptime(data['Inicio'], '%d/%m/%Y')
-                fim = datetime.strptime(data['Fim'], '%d/%m/%Y')
-                
-                expected_months = []
-                current = inicio.replace(day=1)
-                end = fim.replace(day=1)
-                while current <= end:
-                    expected_months.append(current.strftime('%m/%Y'))
-                    current += relativedelta(months=1)
-                
-                actual_months = [r['Competencia'] for r in remu]
-                all_competences_complete = len(actual_months) == len(expected_months)
-                all_date_matches = set(actual_months) == set(expected_months)
-            except:
-                pass
+        first = date_month_index(data.inicio) if has_data_inicio else None
+        last = date_month_index(data.fim) if has_data_fim else None
         
-        return {
-            'Nit_Match_Main_NIT': nit_match,
-            'All_Competences_Complete': all_competences_complete,
-            'Data_Inicio': has_data_inicio,
-            'Data_Fim': has_data_fim,
-            'Ultima_Remu': has_ultima_remu,
-            'All_Date_Matches': all_date_matches
-        }
+        if competencias and first is not None and last is not None:
+            # Month indices (year * 12 + month - 1) instead of walking the calendar
+            expected = range(first, last + 1)
+            if isinstance(competencias, RemuneracaoColumns):
+                present = set(competencias.months)
+                present.discard(-1)
+                invalid = competencias.invalid_competencias()
+            else:
+                present = set()
+                invalid = []
+                for comp in competencias:
+                    index = month_index(comp)
+                    if index is None:
+                        invalid.append(comp)
+                    else:
+                        present.add(index)
+            
+            missing = tuple(competencia_from_index(m) for m in expected if m not in present)
+            extra = tuple(map(competencia_from_index, sorted(present.difference(expected)))) + tuple(dict.fromkeys(invalid))
+            all_competences_complete = len(competencias) == len(expected)
+            all_date_matches = not missing and not extra
+        
+        return VinculoMetadata(
+            nit_match_main_nit=nit_match,
+            all_competences_complete=all_competences_complete,
+            data_inicio=has_data_inicio,
+            data_fim=has_data_fim,
+            ultima_remu=has_ultima_remu,
+            all_date_matches=all_date_matches,
+            missing_competencias=missing,
+            extra_competencias=extra,
+        )
     
     def _parse_currency(self, value: str) -> Optional[float]:
         if not value:
@@ -485,42 +1155,172 @@ class CNISParserFinal:
         except:
             return None
     
-    def export_to_json(self, output_path: str):
-        results = {
-            'personal_info': self.personal_info,
-            'employment_relationships': self.employment_relationships
-        }
+    def export_to_json(self, output_path: str, compact: bool = False):
+        """Write parse() output to ``output_path``: indented, or a single line with ``compact``."""
+        results = CnisRecords(self.personal, self.vinculos).to_dict()
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        with open(output_path, 'wb') as f:
+            f.write(dumps_json(results, compact))
         
         print(f"[SUCCESS] Exported to {output_path}")
 
 
+def dumps_json(data, compact: bool = False) -> bytes:
+    """UTF-8 JSON for parse() output.
+
+    The default is the indented layout export_to_json has always written.
+    ``compact`` drops all whitespace and uses orjson when it is installed
+    (several times faster than the json module); the decoded data is the same.
+    """
+    if not compact:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _expand_inputs(inputs: List[str]) -> List[str]:
+    """Files, directories (searched recursively for *.pdf) and glob patterns -> PDF paths, in order, without repeats."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            found = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(item)
+                for name in names if name.lower().endswith('.pdf')
+            )
+        elif glob.has_magic(item):
+            found = sorted(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        else:
+            found = [item]
+        paths.extend(found)
+    return list(dict.fromkeys(paths))
+
+
+def _output_names(paths: List[str], out_dir: Optional[str]) -> List[str]:
+    """Per-file JSON paths: <stem>.json in ``out_dir`` (or next to the PDF), deduplicated."""
+    names = []
+    used = set()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        folder = out_dir if out_dir is not None else os.path.dirname(path)
+        candidate = os.path.join(folder, stem + '.json')
+        n = 2
+        while candidate in used:
+            candidate = os.path.join(folder, f"{stem}_{n}.json")
+            n += 1
+        used.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def _cli_parse_file(path: str, output: Optional[str], extractor: str, plan: str, compact: bool = False) -> Dict:
+    """Parse one PDF for the CLI. Runs in a worker process.
+
+    With ``output`` the result is written there; otherwise it is returned as
+    a ready-to-write JSON Lines record, so serialization also runs in the worker.
+    """
+    start = time.perf_counter()
+    try:
+        parser = CNISParserFinal(pdf_path=path, extractor=extractor, plan=plan)
+        vinculos = list(parser.iter_vinculos())
+        result = CnisRecords(parser.personal, vinculos).to_dict()
+        if output is not None:
+            with open(output, 'wb') as f:
+                f.write(dumps_json(result, compact))
+            line = None
+        elif compact:
+            line = dumps_json({'file': path, **result}, compact).decode('utf-8')
+        else:
+            line = json.dumps({'file': path, **result}, ensure_ascii=False)
+        return {'file': path, 'ok': True, 'pages': parser.pages_parsed,
+                'vinculos': len(vinculos), 'line': line,
+                'seconds': time.perf_counter() - start}
+    except Exception as e:
+        return {'file': path, 'ok': False, 'pages': 0, 'error': f"{type(e).__name__}: {e}",
+                'seconds': time.perf_counter() - start}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog='cnis_parser_final.py',
+        description='Parse CNIS PDFs into JSON.',
+        epilog='Legacy form: cnis_parser_final.py <cnis.pdf> [output.json]',
+    )
+    ap.add_argument('inputs', nargs='+', help='PDF files, directories or glob patterns ("extratos/**/*.pdf")')
+    out = ap.add_mutually_exclusive_group()
+    out.add_argument('--jsonl', metavar='FILE', help='write one JSON object per CNIS to FILE ("-" for stdout)')
+    out.add_argument('--out-dir', metavar='DIR', help='write <name>.json per CNIS into DIR (default: next to each PDF)')
+    ap.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='parallel worker processes')
+    ap.add_argument('--extractor', choices=list(EXTRACTORS), default=DEFAULT_EXTRACTOR)
+    ap.add_argument('--plan', choices=PARSE_PLANS, default=PLAN_FULL)
+    ap.add_argument('--compact', action='store_true', help='write JSON without whitespace (uses orjson when installed)')
+    ap.add_argument('-q', '--quiet', action='store_true', help='only print the final summary')
+    args = ap.parse_args(argv)
+
+    inputs = args.inputs
+    legacy_output = None
+    if len(inputs) == 2 and inputs[1].lower().endswith('.json') and not args.jsonl and not args.out_dir:
+        inputs, legacy_output = inputs[:1], inputs[1]
+
+    paths = _expand_inputs(inputs)
+    if not paths:
+        print('No PDF files found', file=sys.stderr)
+        return 2
+
+    if args.jsonl:
+        outputs = [None] * len(paths)
+    elif legacy_output:
+        outputs = [legacy_output]
+    else:
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+        outputs = _output_names(paths, args.out_dir)
+
+    jsonl = None
+    if args.jsonl:
+        jsonl = sys.stdout if args.jsonl == '-' else open(args.jsonl, 'w', encoding='utf-8')
+
+    workers = max(1, min(args.workers, len(paths)))
+    jobs = [(path, output, args.extractor, args.plan, args.compact) for path, output in zip(paths, outputs)]
+    start = time.perf_counter()
+    done = pages = 0
+    failures = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            # Chunks keep IPC overhead low on thousands of small extracts
+            results = executor.map(_cli_parse_file, *zip(*jobs), chunksize=max(1, len(jobs) // (workers * 8)))
+        else:
+            results = (_cli_parse_file(*job) for job in jobs)
+        for result in results:
+            done += 1
+            pages += result['pages']
+            if result['ok']:
+                if jsonl is not None:
+                    jsonl.write(result['line'] + '\n')
+                status = f"ok ({result['pages']} pages, {result['vinculos']} vínculos, {result['seconds']:.2f}s)"
+            else:
+                failures.append(result)
+                status = f"FAILED: {result['error']}"
+            if not args.quiet:
+                print(f"[{done}/{len(jobs)}] {result['file']}: {status}", file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if jsonl is not None and jsonl is not sys.stdout:
+            jsonl.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"{done - len(failures)} parsed, {len(failures)} failed, {pages} pages in {elapsed:.1f}s "
+        f"({done / elapsed:.2f} files/s, {pages / elapsed:.1f} pages/s, {workers} workers)",
+        file=sys.stderr,
+    )
+    for failure in failures:
+        print(f"  FAILED {failure['file']}: {failure['error']}", file=sys.stderr)
+    return 1 if failures else 0
+
+
 if __name__ == "__main__":
-    parser = CNISParserFinal(pdf_path="CNIS1.pdf", debug=True)
-    results = parser.parse()
-    parser.export_to_json("cnis_extracted_final.json")
-    
-    print("\n" + "="*60)
-    print("PARSING SUMMARY")
-    print("="*60)
-    print(f"Personal Info: {parser.personal_info}")
-    print(f"\nEmployment Relationships: {len(parser.employment_relationships)}\n")
-    
-    for emp in parser.employment_relationships[:10]:
-        seq = emp['sequence']
-        origem = emp['Data'].get('Origem_Vinculo', 'Unknown')
-        matricula = emp['Data'].get('Matricula_Trabalhador', '')
-        num_remu = len(emp.get('Remuneracoes', []))
-        
-        print(f"Seq {seq}: {origem[:60]}")
-        if matricula:
-            print(f"  Matrícula: {matricula}")
-        print(f"  Tipo: {emp['Data'].get('Tipo_Filiado_Vinculo', 'N/A')}")
-        print(f"  Remunerações: {num_remu}")
-        if emp.get('Remuneracoes'):
-            print(f"  First: {emp['Remuneracoes'][0]}")
-        print()
-    
-    print("="*60)
+    sys.exit(main())
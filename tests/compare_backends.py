@@ -0,0 +1,63 @@
+"""
+Run the spec comparison once per text-extraction backend.
+Reports accuracy (same score as compare_with_specs.py) and parse time per backend.
+
+Usage: python tests/compare_backends.py [backend ...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from compare_with_specs import build_test_cases, run_comparison, score_result  # noqa: E402
+from cnis_parser_final import EXTRACTORS  # noqa: E402  (path set up by compare_with_specs)
+
+
+def run_backend(extractor, test_cases):
+    """Score and time every test case with one backend."""
+    rows = []
+    for tc in test_cases:
+        start = time.perf_counter()
+        result = run_comparison(tc, extractor=extractor)
+        elapsed = time.perf_counter() - start
+        if 'error' in result:
+            rows.append({'cnis': tc['cnis'], 'error': result['error'], 'seconds': elapsed})
+            continue
+        passed, total, pct = score_result(result)
+        rows.append({'cnis': tc['cnis'], 'passed': passed, 'total': total, 'pct': pct, 'seconds': elapsed})
+    return rows
+
+
+def main():
+    backends = sys.argv[1:] or list(EXTRACTORS)
+    test_cases = build_test_cases()
+    print("=" * 70)
+    print(f"  BACKENDS: {', '.join(backends)} ({len(test_cases)} CNIS)")
+    print("=" * 70)
+
+    summary = {}
+    for backend in backends:
+        rows = run_backend(backend, test_cases)
+        print(f"\n  [{backend}]")
+        for row in rows:
+            name = row['cnis'].split('(')[0].strip()
+            if 'error' in row:
+                print(f"    ✗ {name}: {row['error']}")
+            else:
+                print(f"    {name}: {row['passed']}/{row['total']} ({row['pct']:.0f}%) in {row['seconds']:.2f}s")
+        scored = [r for r in rows if 'error' not in r]
+        summary[backend] = (
+            sum(r['pct'] for r in scored) / max(len(scored), 1),
+            sum(r['seconds'] for r in rows),
+        )
+
+    print(f"\n\n{'='*70}")
+    print(f"  RESULTADO GERAL")
+    print(f"{'='*70}")
+    for backend, (avg, seconds) in summary.items():
+        print(f"  {backend:<12} média {avg:5.1f}%   tempo total {seconds:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
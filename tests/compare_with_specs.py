@@ -238,8 +238,8 @@ def compare_employment_relationships(parsed_empls, spec_periods):
     return results
 
 
-def run_comparison(test_case):
-    """Run comparison for a single test case."""
+def run_comparison(test_case, extractor=None):
+    """Run comparison for a single test case, optionally with a given text extractor."""
     cnis_path = os.path.join(CNIS_DIR, test_case['cnis'])
     spec_path = os.path.join(SPECS_DIR, test_case['spec'])
 
@@ -249,7 +249,7 @@ def run_comparison(test_case):
         return {'error': f'Spec file not found: {spec_path}'}
 
     # Parse CNIS with our parser
-    parser = CNISParserFinal(pdf_path=cnis_path, debug=False)
+    parser = CNISParserFinal(pdf_path=cnis_path, debug=False, extractor=extractor)
     parsed = parser.parse()
 
     # Load spec
@@ -335,6 +335,14 @@ def print_results(result):
         for m in emp['extra_in_parser']:
             print(f"      #{m['sequence']} {m['nome'][:50]} ({m['inicio']} - {m['fim']})")
 
+    passed, total_checks, pct = score_result(result)
+    print(f"\n  SCORE: {passed}/{total_checks} ({pct:.0f}%)")
+    return pct
+
+
+def score_result(result):
+    """(passed, total_checks, pct) for a comparison result."""
+    emp = result['employment']
     # Summary score (dates only - ignoring names per user request)
     total_checks = len(result['personal_info']) + len(emp.get('matched', []))
     # Add missing as failed checks
@@ -342,12 +350,11 @@ def print_results(result):
     passed = sum(1 for f in result['personal_info'] if f['match'])
     passed += sum(1 for m in emp.get('matched', []) if m['date_match'])
     pct = (passed / max(total_checks, 1)) * 100
-
-    print(f"\n  SCORE: {passed}/{total_checks} ({pct:.0f}%)")
-    return pct
+    return passed, total_checks, pct
 
 
 def main():
+    extractor = sys.argv[1] if len(sys.argv) > 1 else None
     test_cases = build_test_cases()
     print("=" * 70)
     print(f"  COMPARAÇÃO: Parser CNIS vs Specs ({len(test_cases)} CNIS)")
@@ -355,7 +362,7 @@ def main():
 
     scores = []
     for tc in test_cases:
-        result = run_comparison(tc)
+        result = run_comparison(tc, extractor=extractor)
         score = print_results(result)
         if score is not None:
             scores.append(score)
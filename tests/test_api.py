@@ -4,6 +4,7 @@ import os
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from cnis_parser_final import CNISParserFinal
 
 client = TestClient(app)
 
@@ -56,6 +57,865 @@ class TestValidation:
                        headers={"X-API-Key": API_KEY})
         assert r.status_code in (400, 422)  # FastAPI may reject before our validation
 
+    def test_missing_pdf_magic_returns_400(self):
+        r = client.post("/api/v1/parse",
+                       files={"file": ("test.pdf", b"not a pdf", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 400
+        assert r.json()["detail"]["error_code"] == "INVALID_FILE_TYPE"
+
+
+class TestUploads:
+    BOUNDARY = "cnisboundary"
+
+    def _body(self, *parts):
+        body = b""
+        for field, filename, data in parts:
+            body += (f"--{self.BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; "
+                     f"filename=\"{filename}\"\r\nContent-Type: application/pdf\r\n\r\n").encode()
+            body += data + b"\r\n"
+        return body + f"--{self.BOUNDARY}--\r\n".encode()
+
+    def _read(self, body, max_file_bytes=1 << 20, max_body_bytes=None, spool_bytes=1 << 20,
+              chunk=4096, content_length=None, fields=("file",)):
+        """read_pdf_form over ``body`` sent in ``chunk``-byte messages; self.consumed counts what it read."""
+        import asyncio
+        from starlette.requests import Request
+        from app.services.uploads import read_pdf_form
+        headers = [(b"content-type", f"multipart/form-data; boundary={self.BOUNDARY}".encode())]
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)]
+        self.consumed = 0
+
+        async def receive():
+            data = chunks.pop(0) if chunks else b""
+            self.consumed += len(data)
+            return {"type": "http.request", "body": data, "more_body": bool(chunks)}
+
+        request = Request({"type": "http", "method": "POST", "headers": headers}, receive)
+        return asyncio.run(read_pdf_form(request, fields, max_file_bytes, max_body_bytes, spool_bytes))
+
+    def test_small_upload_stays_in_memory(self):
+        import hashlib
+        data = b"%PDF-1.4 small"
+        (part,) = self._read(self._body(("file", "a.pdf", data)))
+        with part.upload as upload:
+            assert part.filename == upload.filename == "a.pdf"
+            assert not upload.spilled
+            assert upload.source == data
+            assert upload.digest == hashlib.sha256(data).hexdigest()
+
+    def test_large_upload_spills_to_a_temporary_file(self):
+        data = b"%PDF-1.4 " + bytes(200_000)
+        (part,) = self._read(self._body(("file", "a.pdf", data)), spool_bytes=1000)
+        upload = part.upload
+        assert upload.spilled and upload.size == len(data)
+        path = upload.source
+        with open(path, "rb") as f:
+            assert f.read() == data
+        assert upload.getvalue() == data
+        upload.close()
+        assert not os.path.exists(path)
+
+    def test_other_fields_are_not_stored(self):
+        body = self._body(("other", "x.pdf", b"%PDF-" + bytes(1000)), ("file", "a.pdf", b"%PDF-1.4"))
+        files = self._read(body)
+        assert [(f.field, f.upload.getvalue()) for f in files] == [("file", b"%PDF-1.4")]
+
+    def test_oversized_or_non_pdf_files_are_dropped_as_they_arrive(self):
+        from app.services.uploads import NotAPdfError, UploadTooLargeError
+        body = self._body(("file", "big.pdf", b"%PDF-" + bytes(10_000)), ("file", "txt.pdf", b"hello"),
+                          ("file", "empty.pdf", b""), ("file", "ok.pdf", b"%PDF-1.4"))
+        big, txt, empty, ok = self._read(body, max_file_bytes=1000, chunk=100)
+        assert big.upload is None and isinstance(big.error, UploadTooLargeError)
+        assert big.error.size <= 1100  # stopped at the chunk that crossed the limit
+        assert txt.upload is None and isinstance(txt.error, NotAPdfError)
+        assert empty.upload is None and isinstance(empty.error, NotAPdfError)
+        assert ok.error is None and ok.upload.getvalue() == b"%PDF-1.4"
+
+    def test_body_limit_stops_reading(self):
+        from app.services.uploads import UploadTooLargeError
+        body = self._body(("file", "a.pdf", b"%PDF-" + bytes(100_000)))
+        with pytest.raises(UploadTooLargeError) as e:
+            self._read(body, max_body_bytes=10_000, chunk=1000)
+        assert e.value.size <= 11_000 and self.consumed <= 11_000
+        # Content-Length over the limit fails before the body is read
+        with pytest.raises(UploadTooLargeError):
+            self._read(body, max_body_bytes=10_000, content_length=len(body))
+        assert self.consumed == 0
+
+    def test_malformed_body_is_rejected(self):
+        from app.services.uploads import InvalidFormError
+        with pytest.raises(InvalidFormError):
+            self._read(b"--other\r\n" + bytes(100))
+
+    def test_too_large_upload_is_rejected_before_the_body_is_read(self):
+        body = b"%PDF-" + bytes(17 * 1024 * 1024)
+        r = client.post("/api/v1/parse", files={"file": ("big.pdf", body, "application/pdf")},
+                        headers={"X-API-Key": API_KEY})
+        assert r.status_code == 413
+        assert r.json()["detail"]["error_code"] == "FILE_TOO_LARGE"
+
+    def test_spilled_upload_is_parsed_from_its_path(self, monkeypatch):
+        import glob
+        import tempfile
+        from app.config import settings
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        monkeypatch.setattr(settings, "upload_spool_mb", 0)
+        pattern = os.path.join(tempfile.gettempdir(), "cnis-upload-*")
+        before = set(glob.glob(pattern))
+        pdf = to_pdf(generate_cnis(vinculos=3, rows=6, seed=7).pages)
+        r = client.post("/api/v1/parse/summary?extractor=pdfminer",
+                       files={"file": ("spilled.pdf", pdf, "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 200
+        assert r.json()["data"]["resumo"]["total_vinculos"] == 3
+        assert set(glob.glob(pattern)) == before
+
+
+class TestCnisDetection:
+    def test_parser_rejects_first_page_without_markers(self):
+        from cnis_parser_final import NotCnisError
+        with pytest.raises(NotCnisError):
+            FakePagesParser(["CONTRATO DE PRESTACAO DE SERVICOS\nCPF: 123.456.789-00", SAMPLE_PAGES[1]],
+                            require_cnis=True).parse()
+        assert FakePagesParser(SAMPLE_PAGES, require_cnis=True).parse() == FakePagesParser(SAMPLE_PAGES).parse()
+
+    def test_non_cnis_pdf_is_rejected_after_one_page(self):
+        from benchmarks.synthetic_cnis import to_pdf
+        pdf = to_pdf([["CONTRATO DE PRESTACAO DE SERVICOS", "Clausula primeira"]] * 20)
+        r = client.post("/api/v1/parse?extractor=pdfminer",
+                       files={"file": ("contrato.pdf", pdf, "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 422
+        assert r.json()["detail"]["error_code"] == "NOT_CNIS"
+
+    def test_first_page_is_checked_before_page_workers_start(self, monkeypatch):
+        import cnis_parser_final
+        from cnis_parser_final import NotCnisError
+        from benchmarks.synthetic_cnis import to_pdf
+
+        def no_workers(*args, **kwargs):
+            raise AssertionError("page workers started for a non-CNIS PDF")
+
+        monkeypatch.setattr(cnis_parser_final, "ProcessPoolExecutor", no_workers)
+        pdf = to_pdf([["CONTRATO DE PRESTACAO DE SERVICOS", "Clausula primeira"]] * 20)
+        with pytest.raises(NotCnisError):
+            CNISParserFinal(pdf, page_workers=4, extractor="pdfminer", require_cnis=True).parse()
+
+    def test_page_workers_match_serial_parse(self):
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        pdf = to_pdf(generate_cnis(vinculos=6, rows=10, lines_per_page=20, seed=5).pages)
+        parser = CNISParserFinal(pdf, page_workers=3, extractor="pdfminer", max_pages=100)
+        assert parser.parse() == CNISParserFinal(pdf, extractor="pdfminer").parse()
+        assert parser.pages_parsed == parser.page_count >= 4  # page 1 here, pages 2-4 in three workers
+
+    def test_page_limit_uses_the_extraction_open(self, monkeypatch):
+        from cnis_parser_final import PageLimitError, PdfminerExtractor
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+
+        def second_open(self, source):
+            raise AssertionError("page_count opened the PDF a second time")
+
+        monkeypatch.setattr(PdfminerExtractor, "page_count", second_open)
+        pdf = to_pdf(generate_cnis(vinculos=3, rows=6, lines_per_page=20, seed=3).pages)
+        for page_workers in (1, 2):
+            parser = CNISParserFinal(pdf, page_workers=page_workers, extractor="pdfminer", max_pages=1)
+            with pytest.raises(PageLimitError):
+                parser.parse()
+            assert parser.pages_parsed == 0
+
+    def test_page_limit(self, monkeypatch):
+        from app.config import settings
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        monkeypatch.setattr(settings, "max_pages", 1)
+        pdf = to_pdf(generate_cnis(vinculos=3, rows=6, lines_per_page=20, seed=3).pages)
+        r = client.post("/api/v1/parse/summary?extractor=pdfminer",
+                       files={"file": ("longo.pdf", pdf, "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 413
+        assert r.json()["detail"]["error_code"] == "TOO_MANY_PAGES"
+
+
+class TestParseDeadline:
+    def test_parser_stops_between_pages(self):
+        import time
+        from cnis_parser_final import DeadlineExceeded
+        parser = FakePagesParser(SAMPLE_PAGES, deadline=lambda: 0 if parser.pages_read else float("inf"))
+        with pytest.raises(DeadlineExceeded):
+            parser.parse()
+        assert parser.pages_read == 1
+        assert parser.stage_timings()["parse"] > 0
+        assert FakePagesParser(SAMPLE_PAGES, deadline=time.time() + 60).parse() == FakePagesParser(SAMPLE_PAGES).parse()
+
+    def test_timeout_returns_partial_timings(self, monkeypatch):
+        from app.config import settings
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        monkeypatch.setattr(settings, "parse_timeout_seconds", 1e-6)
+        pdf = to_pdf(generate_cnis(vinculos=3, rows=6, seed=11).pages)
+        r = client.post("/api/v1/parse/summary?extractor=pdfminer",
+                       files={"file": ("lento.pdf", pdf, "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 504
+        detail = r.json()["detail"]
+        assert detail["error_code"] == "PARSE_TIMEOUT"
+        assert {"read", "cache", "queue", "open"} <= set(detail["timings"])
+        assert "queue;dur=" in r.headers["server-timing"]
+
+    def test_disconnect_cancels_parse(self):
+        import asyncio
+        import time
+        from app.services.parse_pool import ParsePool
+        from app.services.parser_service import ClientDisconnectedError, parse_pdf_timed
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        pdf = to_pdf(generate_cnis(vinculos=3, rows=6, seed=11).pages)
+        pool = ParsePool(workers=1, queue_size=0)
+
+        async def disconnected():
+            return True
+
+        try:
+            with pytest.raises(ClientDisconnectedError):
+                asyncio.run(pool.run(parse_pdf_timed, pdf, 1, "pdfminer",
+                                     deadline=time.time() + 60, disconnected=disconnected))
+        finally:
+            pool.shutdown()
+        assert pool.in_flight == 0
+        assert pool._free_slots == [0]
+
+    def test_disconnect_cancels_parse_without_deadline(self):
+        import asyncio
+        from app.services.parse_pool import ParsePool
+        from app.services.parser_service import ClientDisconnectedError, parse_pdf_timed
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        pdf = to_pdf(generate_cnis(vinculos=150, rows=60, seed=13).pages)
+        pool = ParsePool(workers=1, queue_size=0)
+
+        async def disconnected():
+            return True
+
+        try:
+            with pytest.raises(ClientDisconnectedError) as e:
+                asyncio.run(pool.run(parse_pdf_timed, pdf, 1, "pdfminer", deadline=None, disconnected=disconnected))
+        finally:
+            pool.shutdown()
+        assert e.value.stats.pages < 10
+        assert pool.in_flight == 0
+
+    def test_client_disconnect_cancels_parse_in_app(self):
+        """Drives app.main.app over raw ASGI: the client hangs up (http.disconnect) mid-parse."""
+        import asyncio
+        import json
+        import time
+        from app.services.result_cache import result_cache
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        pdf = to_pdf(generate_cnis(vinculos=150, rows=60, seed=13).pages)
+        boundary = "cnis-disconnect-test"
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="longo.pdf"\r\n'
+                f'Content-Type: application/pdf\r\n\r\n').encode() + pdf + f"\r\n--{boundary}--\r\n".encode()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/api/v1/parse/summary",
+            "raw_path": b"/api/v1/parse/summary", "root_path": "", "query_string": b"extractor=pdfminer",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-api-key", API_KEY.encode()),
+            ],
+            "client": ("testclient", 50000), "server": ("testserver", 80),
+        }
+        sent = []
+
+        async def request():
+            gone = asyncio.Event()
+            pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+            async def receive():
+                if pending:
+                    return pending.pop()
+                await gone.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                sent.append(message)
+
+            asyncio.get_running_loop().call_later(0.3, gone.set)
+            await app(scope, receive, send)
+
+        result_cache.clear()
+        started = time.time()
+        try:
+            asyncio.run(request())
+        finally:
+            result_cache.clear()
+        assert sent[0]["status"] == 499
+        assert json.loads(sent[1]["body"])["detail"]["error_code"] == "CLIENT_DISCONNECTED"
+        assert time.time() - started < 5
+
+
+class TestParsePool:
+    def test_lifespan_starts_and_stops_pool(self):
+        from app.services.parse_pool import parse_pool
+        with TestClient(app) as c:
+            assert parse_pool._executor is not None
+            assert c.get("/health").status_code == 200
+        assert parse_pool._executor is None
+
+    def test_invalid_pdf_returns_parse_error(self):
+        r = client.post("/api/v1/parse",
+                       files={"file": ("broken.pdf", b"%PDF-1.4 not really a pdf", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 422
+        assert r.json()["detail"]["error_code"] == "PARSE_ERROR"
+
+    def test_full_queue_rejects(self):
+        import asyncio
+        import time
+        from app.services.parse_pool import ParsePool, PoolBusyError
+
+        pool = ParsePool(workers=1, queue_size=0)
+
+        async def run_two():
+            return await asyncio.gather(
+                pool.run(time.sleep, 0.5), pool.run(time.sleep, 0.5), return_exceptions=True,
+            )
+
+        try:
+            results = asyncio.run(run_two())
+        finally:
+            pool.shutdown()
+        assert sum(isinstance(r, PoolBusyError) for r in results) == 1
+        assert pool.in_flight == 0
+
+    def test_stream_is_not_held_back_by_a_slow_consumer(self):
+        import asyncio
+        import time
+        from app.services.parse_pool import ParsePool
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        pdf = to_pdf(generate_cnis(vinculos=5, rows=8, seed=23).pages)
+        pool = ParsePool(workers=1, queue_size=0)
+
+        async def read_slowly():
+            await pool.run(time.sleep, 0)  # start the worker process outside the deadline
+            stream = pool.iter_parse(pdf, "pdfminer", deadline=time.time() + 2)
+            await asyncio.sleep(2.5)  # the client reads only after the deadline
+            return [kind async for kind, _ in stream]
+
+        try:
+            kinds = asyncio.run(read_slowly())
+        finally:
+            pool.shutdown()
+        assert kinds == ["personal_info"] + ["vinculo"] * 5 + ["stats"]
+        assert pool.in_flight == 0
+        assert pool._free_slots == [0]
+
+
+class TestResultCache:
+    def test_hits_misses_and_lru_eviction(self):
+        from app.services.result_cache import ResultCache
+        cache = ResultCache(max_entries=2, ttl_seconds=0)
+        assert cache.get("a") is None
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        assert cache.get("a") == {"n": 1}  # "a" is now most recently used
+        cache.put("c", {"n": 3})
+        assert cache.get("b") is None
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        from app.services import result_cache as rc
+        now = [1000.0]
+        monkeypatch.setattr(rc.time, "monotonic", lambda: now[0])
+        cache = rc.ResultCache(max_entries=8, ttl_seconds=60)
+        cache.put("a", {"n": 1})
+        now[0] += 59
+        assert cache.get("a") is not None
+        now[0] += 2
+        assert cache.get("a") is None
+
+    def test_key_depends_on_content_and_version(self):
+        from app.services.result_cache import cache_key
+        from app.services.parser_service import PARSER_VERSION
+        assert cache_key(b"%PDF-1") != cache_key(b"%PDF-2")
+        assert f":{PARSER_VERSION}:" in cache_key(b"%PDF-1")
+        assert cache_key(b"%PDF-1", "pdfplumber") != cache_key(b"%PDF-1", "pdfminer")
+
+    def test_stats_endpoint(self):
+        r = client.get("/api/v1/cache/stats", headers={"X-API-Key": API_KEY})
+        assert r.status_code == 200
+        assert {"hits", "misses", "hit_ratio"} <= set(r.json()["data"])
+
+    @pytest.mark.skipif(not os.path.exists(SAMPLE_PDF), reason="No sample PDF")
+    def test_endpoints_share_cached_parse(self):
+        from app.services.result_cache import result_cache
+        result_cache.clear()
+        before = result_cache.stats()
+        for route in ("/api/v1/parse", "/api/v1/parse/summary", "/api/v1/parse/planilha"):
+            with open(SAMPLE_PDF, "rb") as f:
+                r = client.post(route, files={"file": ("cnis.pdf", f, "application/pdf")},
+                               headers={"X-API-Key": API_KEY})
+            assert r.status_code == 200
+        after = result_cache.stats()
+        result_cache.clear()
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 2
+
+
+class TestViews:
+    def test_unknown_view_returns_400(self):
+        r = client.post("/api/v1/parse?views=full,xml",
+                       files={"file": ("cnis.pdf", b"%PDF-1.4", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 400
+        assert r.json()["detail"]["error_code"] == "INVALID_VIEW"
+
+    @pytest.mark.skipif(not os.path.exists(SAMPLE_PDF), reason="No sample PDF")
+    def test_multiple_views_in_one_request(self):
+        with open(SAMPLE_PDF, "rb") as f:
+            r = client.post("/api/v1/parse?views=full,planilha",
+                           files={"file": ("cnis.pdf", f, "application/pdf")},
+                           headers={"X-API-Key": API_KEY})
+        assert r.status_code == 200
+        d = r.json()
+        assert d["success"] is True
+        assert set(d["views"]) == {"full", "planilha"}
+        assert "processing_time_ms" in d["views"]["full"]
+        assert "remuneracoes" in d["views"]["full"]["data"]["vinculos"][0]
+        assert d["views"]["planilha"]["data"]["segurado"]["nome"] == "ADEMAR FRANCISCO ROMAN"
+
+
+class TestBatch:
+    def test_per_file_results_and_errors(self):
+        from app.services.result_cache import result_cache, cache_key
+        content = b"%PDF-1.4 batch fixture"
+        result_cache.put(cache_key(content), FakePagesParser(SAMPLE_PAGES).parse_records())
+        try:
+            r = client.post(
+                "/api/v1/parse/batch?view=summary",
+                files=[
+                    ("files", ("a.pdf", content, "application/pdf")),
+                    ("files", ("notes.txt", b"hello", "text/plain")),
+                    ("files", ("a.pdf", b"%PDF-1.4 not really", "application/pdf")),
+                ],
+                headers={"X-API-Key": API_KEY},
+            )
+        finally:
+            result_cache.clear()
+        assert r.status_code == 200
+        d = r.json()
+        assert d["resumo"] == {"total": 3, "succeeded": 1, "failed": 2}
+        results = d["results"]
+        assert set(results) == {"a.pdf", "notes.txt", "a.pdf (2)"}
+        assert results["a.pdf"]["success"] is True
+        assert results["a.pdf"]["data"]["resumo"]["total_remuneracoes"] == 5
+        assert results["notes.txt"]["error_code"] == "INVALID_FILE_TYPE"
+        assert results["a.pdf (2)"]["error_code"] == "PARSE_ERROR"
+        assert all("processing_time_ms" in v for v in results.values())
+
+    def test_unknown_view_returns_400(self):
+        r = client.post(
+            "/api/v1/parse/batch?view=xml",
+            files=[("files", ("a.pdf", b"%PDF-1.4", "application/pdf"))],
+            headers={"X-API-Key": API_KEY},
+        )
+        assert r.status_code == 400
+        assert r.json()["detail"]["error_code"] == "INVALID_VIEW"
+
+    def test_file_count_and_total_size_are_limited(self, monkeypatch):
+        from app.config import settings
+        monkeypatch.setattr(settings, "batch_max_files", 2)
+        monkeypatch.setattr(settings, "batch_max_mb", 1)
+        files = [("files", (f"{i}.pdf", b"%PDF-1.4", "application/pdf")) for i in range(3)]
+        r = client.post("/api/v1/parse/batch", files=files, headers={"X-API-Key": API_KEY})
+        assert r.status_code == 413
+        assert r.json()["detail"]["error_code"] == "TOO_MANY_FILES"
+
+        files = [("files", (f"{i}.pdf", b"%PDF-" + bytes(600_000), "application/pdf")) for i in range(2)]
+        r = client.post("/api/v1/parse/batch", files=files, headers={"X-API-Key": API_KEY})
+        assert r.status_code == 413
+        assert r.json()["detail"]["error_code"] == "BATCH_TOO_LARGE"
+
+
+class TestDiff:
+    @staticmethod
+    def _later_extract():
+        pages = list(SAMPLE_PAGES)
+        pages[0] = (pages[0].replace("12/03/2025", "10/02/2026")
+                    .replace("03/2000 1.200,00", "03/2000 1.250,00\n04/2000 900,00"))
+        pages[2] = pages[2].replace("Segurado 01/01/2001", "Segurado 01/01/2001 31/12/2001")
+        return FakePagesParser(pages).parse_records()
+
+    def test_only_changes_are_returned(self):
+        from app.services.cnis_diff import diff_records
+        old = FakePagesParser(SAMPLE_PAGES).parse_records()
+        new = self._later_extract()
+        new.vinculos.pop(1)
+        diff = diff_records(old, new)
+        assert diff["personal_info"] == {"data_extracao": {"antes": "12/03/2025 10:11:12",
+                                                           "depois": "10/02/2026 10:11:12"}}
+        assert diff["vinculos_adicionados"] == []
+        assert diff["vinculos_removidos"] == [{"sequencia": 2, "nit": "123.45678.90-1", "codigo_empresa": ""}]
+        first, third = diff["vinculos_alterados"]
+        assert "campos" not in first
+        assert first["remuneracoes_adicionadas"] == [{"competencia": "04/2000", "remuneracao": 900.0,
+                                                      "indicadores": ""}]
+        assert first["remuneracoes_alteradas"] == [{"competencia": "03/2000", "remuneracao": 1250.0,
+                                                    "indicadores": "",
+                                                    "antes": {"remuneracao": 1200.0, "indicadores": ""}}]
+        assert third["sequencia"] == 3
+        assert third["campos"] == {"fim": {"antes": "", "depois": "31/12/2001"}}
+        assert diff_records(old, old)["resumo"] == {
+            "vinculos_adicionados": 0, "vinculos_removidos": 0, "vinculos_alterados": 0,
+            "remuneracoes_adicionadas": 0, "remuneracoes_alteradas": 0,
+        }
+
+    def test_diff_against_cached_hash(self):
+        from app.services.result_cache import result_cache, cache_key, content_digest
+        old_content, new_content = b"%PDF-1.4 diff old", b"%PDF-1.4 diff new"
+        result_cache.put(cache_key(old_content), FakePagesParser(SAMPLE_PAGES).parse_records())
+        result_cache.put(cache_key(new_content), self._later_extract())
+        try:
+            by_hash = client.post(f"/api/v1/parse/diff?old_hash={content_digest(old_content)}",
+                                  files={"new_file": ("novo.pdf", new_content, "application/pdf")},
+                                  headers={"X-API-Key": API_KEY})
+            by_file = client.post("/api/v1/parse/diff",
+                                  files={"new_file": ("novo.pdf", new_content, "application/pdf"),
+                                         "old_file": ("antigo.pdf", old_content, "application/pdf")},
+                                  headers={"X-API-Key": API_KEY})
+            unknown = client.post(f"/api/v1/parse/diff?old_hash={'0' * 64}",
+                                  files={"new_file": ("novo.pdf", new_content, "application/pdf")},
+                                  headers={"X-API-Key": API_KEY})
+        finally:
+            result_cache.clear()
+        assert by_hash.status_code == 200
+        body = by_hash.json()
+        assert body["new_hash"] == content_digest(new_content)
+        assert body["data"]["resumo"]["remuneracoes_alteradas"] == 1
+        assert by_file.json()["data"] == body["data"]
+        assert by_file.json()["old_hash"] == content_digest(old_content)
+        assert unknown.status_code == 404
+        assert unknown.json()["detail"]["error_code"] == "RESULT_NOT_CACHED"
+
+    def test_needs_exactly_one_previous_extract(self):
+        r = client.post("/api/v1/parse/diff",
+                       files={"new_file": ("novo.pdf", b"%PDF-1.4", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 400
+        assert r.json()["detail"]["error_code"] == "INVALID_DIFF_INPUT"
+        r = client.post("/api/v1/parse/diff?old_hash=abc",
+                       files={"new_file": ("novo.pdf", b"%PDF-1.4", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.json()["detail"]["error_code"] == "INVALID_HASH"
+
+    def test_failed_side_cancels_the_other_parse(self):
+        import asyncio
+        import time
+        from app.routes.parse import _gather_or_cancel
+        from app.services.parse_pool import ParsePool
+        from app.services.parser_service import ParseError, parse_pdf_timed
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        pdf = to_pdf(generate_cnis(vinculos=150, rows=60, seed=13).pages)
+        pool = ParsePool(workers=2, queue_size=0)
+
+        async def diff():
+            deadline = time.time() + 60
+            with pytest.raises(ParseError):
+                await _gather_or_cancel(pool.run(parse_pdf_timed, b"%PDF-1.4 not really", 1, "pdfminer",
+                                                 deadline=deadline),
+                                        pool.run(parse_pdf_timed, pdf, 1, "pdfminer", deadline=deadline))
+            return pool.in_flight
+
+        try:
+            assert asyncio.run(diff()) == 0  # the long parse was cancelled, not left running
+        finally:
+            pool.shutdown()
+
+
+class TestJobs:
+    def _wait(self, c, job_id, timeout=30):
+        import time
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            d = c.get(f"/api/v1/jobs/{job_id}", headers={"X-API-Key": API_KEY}).json()["data"]
+            if d["status"] in ("done", "failed"):
+                return d
+            time.sleep(0.1)
+        raise AssertionError("job did not finish")
+
+    def test_submit_and_poll(self, tmp_path, monkeypatch):
+        from app.config import settings
+        from app.services.jobs import job_queue
+        monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+        with TestClient(app) as c:
+            r = c.post("/api/v1/jobs?view=summary",
+                       files={"file": ("cnis.pdf", b"%PDF-1.4 not really", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+            assert r.status_code == 202
+            job_id = r.json()["data"]["job_id"]
+            d = self._wait(c, job_id)
+            assert job_queue.pending == 0
+        assert d["status"] == "failed"
+        assert d["error"]["error_code"] == "PARSE_ERROR"
+        assert d["processing_time_ms"] is not None
+
+    def test_unknown_job(self, tmp_path, monkeypatch):
+        from app.config import settings
+        monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+        with TestClient(app) as c:
+            r = c.get("/api/v1/jobs/nope", headers={"X-API-Key": API_KEY})
+        assert r.status_code == 404
+        assert r.json()["detail"]["error_code"] == "JOB_NOT_FOUND"
+
+    def test_stopped_queue_returns_503(self):
+        from app.services.jobs import job_queue
+        assert job_queue.store is None  # no lifespan: the queue was never started
+        created = client.post("/api/v1/jobs", files={"file": ("cnis.pdf", b"%PDF-1.4 x", "application/pdf")},
+                              headers={"X-API-Key": API_KEY})
+        polled = client.get("/api/v1/jobs/nope", headers={"X-API-Key": API_KEY})
+        for r in (created, polled):
+            assert r.status_code == 503
+            assert r.json()["detail"]["error_code"] == "SERVICE_BUSY"
+
+    def test_interrupted_jobs_are_requeued(self, tmp_path):
+        from app.services.jobs import JobStore
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create(b"%PDF", "full", None, "a.pdf")
+        assert store.claim_next()["id"] == job_id
+        store.close()
+
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        assert store.recover() == 1
+        assert store.get(job_id)["status"] == "queued"
+        assert store.claim_next()["pdf"] == b"%PDF"
+
+    def test_eviction(self, tmp_path):
+        from app.services.jobs import JobStore
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        ids = [store.create(b"%PDF", "full", None, f"{i}.pdf") for i in range(3)]
+        for job_id in ids[:2]:
+            store.claim_next()
+            store.finish(job_id, {"ok": True})
+        assert store.evict(retention_seconds=0, max_finished=1) == 1
+        assert store.get(ids[0]) is None
+        assert store.get(ids[1])["status"] == "done"
+        assert store.get(ids[2])["status"] == "queued"  # pending jobs are never evicted
+
+    def test_byte_budget_eviction_shrinks_the_database(self, tmp_path):
+        from app.services.jobs import JobStore
+        path = str(tmp_path / "jobs.sqlite3")
+        store = JobStore(path)
+        ids = [store.create(b"%PDF" + bytes(100_000), "full", None, f"{i}.pdf") for i in range(4)]
+        for job_id in ids[:3]:
+            store.claim_next()
+            store.finish(job_id, {"data": "x" * 50_000})
+        assert store.stored_bytes() > 3 * 50_000 + 100_000
+        assert store.evict(retention_seconds=0, max_finished=10, max_bytes=200_000) == 2
+        assert [store.get(job_id) is not None for job_id in ids] == [False, False, True, True]
+        assert store.stored_bytes() <= 200_000
+        assert store._conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        assert os.path.getsize(path) < 300_000
+        # Pending PDFs are never evicted, even over the budget
+        assert store.evict(retention_seconds=0, max_finished=10, max_bytes=1) == 1
+        assert store.get(ids[3])["status"] == "queued"
+
+    def test_existing_database_switches_to_incremental_vacuum(self, tmp_path):
+        import sqlite3
+        from app.services.jobs import JobStore
+        path = str(tmp_path / "jobs.sqlite3")
+        sqlite3.connect(path).execute("CREATE TABLE t (x)").connection.close()
+        store = JobStore(path)
+        assert store._conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+
+    def test_submit_over_byte_budget_returns_503(self, tmp_path, monkeypatch):
+        from app.config import settings
+        from app.services.jobs import job_queue
+        monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+        monkeypatch.setattr(settings, "jobs_max_mb", 1)
+        monkeypatch.setattr(job_queue, "workers", 0)  # the first job stays pending
+        with TestClient(app) as c:
+            pdf = b"%PDF-" + bytes(600_000)
+            first = c.post("/api/v1/jobs", files={"file": ("a.pdf", pdf, "application/pdf")},
+                           headers={"X-API-Key": API_KEY})
+            second = c.post("/api/v1/jobs", files={"file": ("b.pdf", pdf, "application/pdf")},
+                            headers={"X-API-Key": API_KEY})
+        assert first.status_code == 202
+        assert second.status_code == 503
+        assert second.json()["detail"]["error_code"] == "SERVICE_BUSY"
+
+    def test_pending_gauge_is_seeded_on_start_and_counts_submits(self, tmp_path, monkeypatch):
+        from app.config import settings
+        from app.services.jobs import JobStore, job_queue
+        from app.services.metrics import registry
+        path = str(tmp_path / "jobs.sqlite3")
+        store = JobStore(path)
+        store.create(b"%PDF", "full", None, "a.pdf")
+        store.create(b"%PDF", "full", None, "b.pdf")
+        store.claim_next()  # left running by a previous process
+        store.close()
+        monkeypatch.setattr(settings, "jobs_db_path", path)
+        monkeypatch.setattr(settings, "jobs_max_entries", 3)
+        monkeypatch.setattr(job_queue, "workers", 0)
+        with TestClient(app) as c:
+            assert registry.get_sample_value("cnis_jobs_pending") == 2
+            statuses = [c.post("/api/v1/jobs", files={"file": ("c.pdf", b"%PDF-1.4", "application/pdf")},
+                               headers={"X-API-Key": API_KEY}).status_code for _ in range(2)]
+            assert registry.get_sample_value("cnis_jobs_pending") == 3
+        assert statuses == [202, 503]
+        assert registry.get_sample_value("cnis_jobs_pending") == 0
+
+    @pytest.mark.skipif(not os.path.exists(SAMPLE_PDF), reason="No sample PDF")
+    def test_job_result(self, tmp_path, monkeypatch):
+        from app.config import settings
+        monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+        with open(SAMPLE_PDF, "rb") as f:
+            content = f.read()
+        with TestClient(app) as c:
+            r = c.post("/api/v1/jobs?view=planilha", files={"file": ("cnis.pdf", content, "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+            d = self._wait(c, r.json()["data"]["job_id"], timeout=120)
+        assert d["status"] == "done"
+        assert d["result"]["segurado"]["nome"] == "ADEMAR FRANCISCO ROMAN"
+
+
+class TestStream:
+    def test_ndjson_stream_from_cached_result(self):
+        import json
+        from app.services.result_cache import result_cache, cache_key
+        content = b"%PDF-1.4 cached stream fixture"
+        raw = FakePagesParser(SAMPLE_PAGES).parse_records()
+        result_cache.put(cache_key(content), raw)
+        try:
+            r = client.post("/api/v1/parse/stream",
+                           files={"file": ("cnis.pdf", content, "application/pdf")},
+                           headers={"X-API-Key": API_KEY})
+        finally:
+            result_cache.clear()
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in r.text.splitlines()]
+        assert [rec["type"] for rec in records] == ["personal_info", "vinculo", "vinculo", "vinculo", "resumo"]
+        assert records[0]["data"]["nome"] == "FULANO DE TAL"
+        assert records[1]["data"]["sequencia"] == 1
+        assert len(records[1]["data"]["remuneracoes"]) == 3
+        assert records[-1]["data"] == {"total_vinculos": 3, "total_remuneracoes": 5}
+
+    def test_orjson_body_matches_stdlib_json(self):
+        import json
+        from fastapi.encoders import jsonable_encoder
+        from app.services.result_cache import result_cache, cache_key
+        from app.services.response_transformer import transform_full
+        content = b"%PDF-1.4 cached orjson fixture"
+        raw = FakePagesParser(SAMPLE_PAGES).parse_records()
+        result_cache.put(cache_key(content), raw)
+        try:
+            r = client.post("/api/v1/parse",
+                           files={"file": ("cnis.pdf", content, "application/pdf")},
+                           headers={"X-API-Key": API_KEY})
+        finally:
+            result_cache.clear()
+        assert r.status_code == 200
+        assert r.headers["content-type"] == "application/json"
+        assert "serialize;dur=" in r.headers["server-timing"]
+        assert r.json()["data"] == json.loads(json.dumps(jsonable_encoder(transform_full(raw))))
+
+    def test_invalid_pdf_returns_parse_error(self):
+        r = client.post("/api/v1/parse/stream",
+                       files={"file": ("broken.pdf", b"%PDF-1.4 not really a pdf", "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 422
+        assert r.json()["detail"]["error_code"] == "PARSE_ERROR"
+
+    def test_streamed_parse_is_counted_and_cached(self):
+        import json
+        from app.services.metrics import registry
+        from app.services.parse_pool import parse_pool
+        from app.services.result_cache import result_cache
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        doc = generate_cnis(vinculos=4, rows=5, seed=17)
+        pdf = to_pdf(doc.pages)
+        rows_before = registry.get_sample_value("cnis_remuneracoes_parsed_total") or 0.0
+        result_cache.clear()
+        before = result_cache.stats()
+        try:
+            parsed, cached = (client.post("/api/v1/parse/stream",
+                                          files={"file": ("cnis.pdf", pdf, "application/pdf")},
+                                          headers={"X-API-Key": API_KEY}) for _ in range(2))
+            after = result_cache.stats()
+        finally:
+            result_cache.clear()
+        assert parsed.status_code == cached.status_code == 200
+        assert parsed.text == cached.text
+        assert json.loads(parsed.text.splitlines()[-1])["data"]["total_vinculos"] == 4
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
+        assert registry.get_sample_value("cnis_remuneracoes_parsed_total") == rows_before + sum(
+            v.rows for v in doc.vinculos)
+        assert parse_pool.in_flight == 0
+
+    def test_full_pool_returns_503(self, monkeypatch):
+        from app.services.parse_pool import parse_pool
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        monkeypatch.setattr(parse_pool, "_in_flight", parse_pool.capacity)
+        r = client.post("/api/v1/parse/stream",
+                       files={"file": ("cnis.pdf", to_pdf(generate_cnis(vinculos=1, rows=2).pages),
+                                       "application/pdf")},
+                       headers={"X-API-Key": API_KEY})
+        assert r.status_code == 503
+        assert r.json()["detail"]["error_code"] == "SERVICE_BUSY"
+
+    def test_client_gone_before_stream_starts_releases_upload(self, monkeypatch):
+        """The client hangs up (http.disconnect) right after sending its body."""
+        import asyncio
+        import glob
+        import tempfile
+        from app.config import settings
+        from app.services.parse_pool import parse_pool
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        monkeypatch.setattr(settings, "upload_spool_mb", 0)  # spill the upload to a temporary file
+        pdf = to_pdf(generate_cnis(vinculos=20, rows=10, seed=19).pages)
+        boundary = "cnis-stream-test"
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="cnis.pdf"\r\n'
+                f'Content-Type: application/pdf\r\n\r\n').encode() + pdf + f"\r\n--{boundary}--\r\n".encode()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/api/v1/parse/stream",
+            "raw_path": b"/api/v1/parse/stream", "root_path": "", "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-api-key", API_KEY.encode()),
+            ],
+            "client": ("testclient", 50000), "server": ("testserver", 80),
+        }
+        spooled = os.path.join(tempfile.gettempdir(), "cnis-upload-*.pdf")
+        leftovers = set(glob.glob(spooled))
+
+        async def request():
+            pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+            async def receive():
+                return pending.pop() if pending else {"type": "http.disconnect"}
+
+            async def send(message):
+                pass
+
+            await app(scope, receive, send)
+            for _ in range(100):  # the cancelled worker may still be holding the upload
+                if not parse_pool.in_flight:
+                    break
+                await asyncio.sleep(0.05)
+
+        asyncio.run(request())
+        assert parse_pool.in_flight == 0
+        assert set(glob.glob(spooled)) == leftovers
+
 
 class TestParse:
     @pytest.mark.skipif(not os.path.exists(SAMPLE_PDF), reason="No sample PDF")
@@ -122,6 +982,364 @@ class TestParse:
         assert "meta" in p
 
 
+SAMPLE_PAGES = [
+    "Extrato Previdenciário 12/03/2025 10:11:12\n"
+    "NIT: 123.45678.90-1 CPF: 123.456.789-00 Nome: FULANO DE TAL\n"
+    "Data de nascimento: 01/02/1970 Nome da mãe: MARIA DE TAL\n"
+    "Seq. NIT Código Emp. Origem do Vínculo Tipo Filiado no Vínculo Data Início Data Fim\n"
+    "1 123.45678.90-1 12.345.678/0001-90 EMPRESA EXEMPLO LTDA Empregado ou Agente 01/01/2000 31/03/2000\n"
+    "Público\n"
+    "Remunerações\n"
+    "Competência Remuneração Indicadores Competência Remuneração Indicadores\n"
+    "01/2000 1.000,00 02/2000 1.100,50 IREM-ACD\n"
+    "03/2000 1.200,00\n"
+    "Página 1 de 3",
+    "Seq. NIT Código Emp. Origem do Vínculo Tipo Filiado no Vínculo Data Início Data Fim\n"
+    "2 123.45678.90-1 Facultativo 01/04/2000 31/05/2000 PREC-FACULTCONC\n"
+    "Competência Data Pgto. Contribuição Salário Contribuição Indicadores\n"
+    "04/2000 15/05/2000 40,00 200,00\n"
+    "05/2000 15/06/2000 40,00 200,00\n"
+    "Página 2 de 3",
+    "Seq. NIT Código Emp. Origem do Vínculo Tipo Filiado no Vínculo Data Início Data Fim\n"
+    "3 123.45678.90-1 Segurado 01/01/2001\n"
+    "Especial\n"
+    "Página 3 de 3",
+]
+
+
+class FakePagesParser(CNISParserFinal):
+    """CNISParserFinal fed from in-memory page texts, counting pages consumed."""
+
+    def __init__(self, pages, **kwargs):
+        super().__init__(b"", **kwargs)
+        self.pages = pages
+        self.pages_read = 0
+
+    def _iter_page_texts(self):
+        for text in self.pages:
+            self.pages_read += 1
+            yield text
+
+
+class TestStreamingParser:
+    def test_vinculos_are_yielded_incrementally(self):
+        parser = FakePagesParser(SAMPLE_PAGES)
+        stream = parser.iter_employment_relationships()
+        first = next(stream)
+        assert first["sequence"] == 1
+        # the table continues across the page break; it ends at page 2's "Seq." line
+        assert parser.pages_read == 2
+        assert parser.personal_info["Nome"] == "FULANO DE TAL"
+        assert [r["Competencia"] for r in first["Remuneracoes"]] == ["01/2000", "02/2000", "03/2000"]
+        assert first["Remuneracoes"][1] == {"Competencia": "02/2000", "Remuneracao": 1100.5, "Indicadores": "IREM-ACD"}
+        assert first["Data"]["Tipo_Filiado_Vinculo"] == "Empregado ou Agente Público"
+        assert first["Metadata"]["All_Date_Matches"] is True
+        second = next(stream)
+        assert second["sequence"] == 2
+        assert [r["Remuneracao"] for r in second["Remuneracoes"]] == [200.0, 200.0]
+        third = next(stream)
+        assert third["Data"]["Tipo_Filiado_Vinculo"] == "Segurado Especial"
+        assert next(stream, None) is None
+
+    def test_parse_matches_stream(self):
+        streamed = list(FakePagesParser(SAMPLE_PAGES).iter_employment_relationships())
+        parsed = FakePagesParser(SAMPLE_PAGES).parse()
+        assert parsed["employment_relationships"] == streamed
+        assert parsed["personal_info"]["NIT"] == "123.45678.90-1"
+
+    def test_records_convert_to_parse_dicts(self):
+        from cnis_parser_final import Remuneracao
+        records = FakePagesParser(SAMPLE_PAGES).parse_records()
+        assert records.to_dict() == FakePagesParser(SAMPLE_PAGES).parse()
+        first = records.vinculos[0]
+        assert first.remuneracoes[1] == Remuneracao("02/2000", 1100.5, "IREM-ACD")
+        assert first.data.tipo_filiado_vinculo == "Empregado ou Agente Público"
+        assert not hasattr(first, "__dict__") and not hasattr(first.data, "__dict__")
+        assert records.personal_info.nome == "FULANO DE TAL"
+
+    def test_columnar_remuneracoes(self):
+        from cnis_parser_final import Remuneracao, RemuneracaoColumns, month_index, competencia_from_index
+        records = FakePagesParser(SAMPLE_PAGES, columnar=True).parse_records()
+        assert records.to_dict() == FakePagesParser(SAMPLE_PAGES).parse()
+        first = records.vinculos[0].remuneracoes
+        assert isinstance(first, RemuneracaoColumns)
+        assert len(first) == 3
+        assert first[1] == Remuneracao("02/2000", 1100.5, "IREM-ACD")
+        assert first.total() == 3300.5
+        assert first.maximum() == 1200.0
+        assert first.coverage(month_index("01/2000"), month_index("06/2000")) == 0.5
+        assert competencia_from_index(month_index("12/1999")) == "12/1999"
+        assert month_index("13/2000") is None
+
+    def test_metadata_lists_missing_and_extra_competencias(self):
+        pages = [SAMPLE_PAGES[0].replace("02/2000 1.100,50", "04/2000 1.100,50"), *SAMPLE_PAGES[1:]]
+        for columnar in (False, True):
+            first = FakePagesParser(pages, columnar=columnar).parse()["employment_relationships"][0]
+            assert first["Metadata"]["Missing_Competencias"] == ["02/2000"]
+            assert first["Metadata"]["Extra_Competencias"] == ["04/2000"]
+            assert first["Metadata"]["All_Competences_Complete"] is True
+            assert first["Metadata"]["All_Date_Matches"] is False
+        full = FakePagesParser(SAMPLE_PAGES).parse()["employment_relationships"]
+        assert full[0]["Metadata"]["Missing_Competencias"] == full[0]["Metadata"]["Extra_Competencias"] == []
+
+
+class TestParsePlans:
+    def test_counts_plan_matches_full_summary(self):
+        from app.services.response_transformer import transform_summary
+        full = FakePagesParser(SAMPLE_PAGES).parse()
+        counts = FakePagesParser(SAMPLE_PAGES, plan="counts").parse()
+        first = counts["employment_relationships"][0]
+        assert "Remuneracoes" not in first
+        assert first["Total_Remuneracoes"] == 3
+        assert first["Metadata"] == full["employment_relationships"][0]["Metadata"]
+        assert transform_summary(FakePagesParser(SAMPLE_PAGES, plan="counts").parse_records()) == \
+            transform_summary(FakePagesParser(SAMPLE_PAGES).parse_records())
+
+    def test_vinculo_summary_is_full_vinculo_without_rows(self):
+        from app.services.response_transformer import transform_vinculo, transform_vinculo_summary
+        for emp in FakePagesParser(SAMPLE_PAGES).parse_records().vinculos:
+            full = transform_vinculo(emp)
+            rows = full.pop("remuneracoes")
+            summary = transform_vinculo_summary(emp)
+            assert list(summary) == list(full) + ["total_remuneracoes"]
+            assert summary == {**full, "total_remuneracoes": len(rows)}
+
+    def test_personal_plan_stops_after_personal_info(self):
+        parser = FakePagesParser(SAMPLE_PAGES, plan="personal")
+        result = parser.parse()
+        assert result["employment_relationships"] == []
+        assert result["personal_info"]["Nome"] == "FULANO DE TAL"
+        assert parser.pages_read == 1
+
+    def test_unknown_plan(self):
+        with pytest.raises(ValueError):
+            CNISParserFinal(pdf_path=b"%PDF-1.4", plan="rows")
+
+    def test_full_result_serves_summary_from_cache(self):
+        from app.services.result_cache import result_cache, cache_key
+        content = b"%PDF-1.4 plan-cache"
+        raw = FakePagesParser(SAMPLE_PAGES).parse_records()
+        result_cache.put(cache_key(content), raw)
+        try:
+            r = client.post(
+                "/api/v1/parse/summary",
+                files={"file": ("test.pdf", content, "application/pdf")},
+                headers={"X-API-Key": API_KEY},
+            )
+        finally:
+            result_cache.clear()
+        assert r.status_code == 200
+        assert r.json()["data"]["resumo"]["total_remuneracoes"] == 5
+
+
+class TestCli:
+    def test_expand_inputs(self, tmp_path):
+        from cnis_parser_final import _expand_inputs
+        (tmp_path / "sub").mkdir()
+        for name in ("a.pdf", "b.PDF", "notes.txt", "sub/c.pdf"):
+            (tmp_path / name).write_bytes(b"%PDF")
+        found = _expand_inputs([str(tmp_path), str(tmp_path / "*.pdf")])
+        assert [os.path.relpath(p, tmp_path) for p in found] == ["a.pdf", "b.PDF", os.path.join("sub", "c.pdf")]
+
+    def test_output_names_are_unique(self, tmp_path):
+        from cnis_parser_final import _output_names
+        names = _output_names(["x/cnis.pdf", "y/cnis.pdf"], str(tmp_path))
+        assert [os.path.basename(n) for n in names] == ["cnis.json", "cnis_2.json"]
+
+    def test_compact_export_matches_indented(self, tmp_path, monkeypatch):
+        import json
+        import cnis_parser_final
+        parser = FakePagesParser(SAMPLE_PAGES)
+        expected = parser.parse()
+        parser.export_to_json(str(tmp_path / "indented.json"))
+        parser.export_to_json(str(tmp_path / "orjson.json"), compact=True)
+        monkeypatch.setattr(cnis_parser_final, "orjson", None)
+        parser.export_to_json(str(tmp_path / "stdlib.json"), compact=True)
+        for name in ("indented.json", "orjson.json", "stdlib.json"):
+            assert json.loads((tmp_path / name).read_text(encoding="utf-8")) == expected
+        compact = (tmp_path / "orjson.json").read_bytes()
+        assert b"\n" not in compact and len(compact) < (tmp_path / "indented.json").stat().st_size
+
+    def test_failures_set_exit_code(self, tmp_path, capsys):
+        from cnis_parser_final import main
+        bad = tmp_path / "bad.pdf"
+        bad.write_bytes(b"not a pdf")
+        assert main([str(bad), "--jsonl", str(tmp_path / "out.jsonl"), "-j", "1"]) == 1
+        assert "1 failed" in capsys.readouterr().err
+
+
+class TestSyntheticPdf:
+    @pytest.mark.parametrize("extractor", ["pdfplumber", "pdfminer"])
+    def test_every_layout_round_trips(self, extractor):
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf, EXPECTED_TIPO
+        doc = generate_cnis(vinculos=10, rows=14, lines_per_page=30)
+        result = CNISParserFinal(to_pdf(doc.pages), extractor=extractor).parse()
+        assert result["personal_info"]["Nome"] == "FULANO DE TAL"
+        empls = result["employment_relationships"]
+        assert [e["sequence"] for e in empls] == [v.sequence for v in doc.vinculos]
+        for emp, expected in zip(empls, doc.vinculos):
+            assert emp["Data"]["Tipo_Filiado_Vinculo"] == EXPECTED_TIPO[expected.layout]
+            assert len(emp["Remuneracoes"]) == expected.rows
+
+    def test_summary_endpoint(self):
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        doc = generate_cnis(vinculos=5, rows=6)
+        r = client.post("/api/v1/parse/summary",
+                        files={"file": ("synthetic.pdf", to_pdf(doc.pages), "application/pdf")},
+                        headers={"X-API-Key": API_KEY})
+        assert r.status_code == 200
+        assert r.json()["data"]["resumo"] == {"total_vinculos": 5, "total_remuneracoes": 18}
+
+    def test_stage_timings(self):
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        from app.services.result_cache import result_cache
+        content = to_pdf(generate_cnis(vinculos=3, rows=4).pages)
+        result_cache.clear()
+        try:
+            r = client.post("/api/v1/parse/planilha?timings=true",
+                            files={"file": ("synthetic.pdf", content, "application/pdf")},
+                            headers={"X-API-Key": API_KEY})
+            again = client.post("/api/v1/parse/planilha",
+                                files={"file": ("synthetic.pdf", content, "application/pdf")},
+                                headers={"X-API-Key": API_KEY})
+        finally:
+            result_cache.clear()
+        assert r.status_code == 200
+        timings = r.json()["timings"]
+        assert list(timings) == ["read", "cache", "queue", "open", "extract", "parse", "metadata", "transform"]
+        assert timings["extract"] > 0
+        assert 'cache;desc="miss"' in r.headers["server-timing"]
+        assert "extract;dur=" in r.headers["server-timing"]
+        assert "timings" not in again.json()
+        assert 'cache;desc="hit"' in again.headers["server-timing"]
+        assert "extract" not in again.headers["server-timing"]
+
+
+class TestMetrics:
+    @staticmethod
+    def sample(name, **labels):
+        from app.services.metrics import registry
+        return registry.get_sample_value(name, labels) or 0.0
+
+    def test_exposition_format(self):
+        r = client.get("/metrics")
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/plain")
+        for name in ("cnis_requests_total", "cnis_request_seconds", "cnis_stage_seconds", "cnis_upload_bytes",
+                     "cnis_pdf_pages", "cnis_parse_queue_depth", "cnis_cache_hit_ratio"):
+            assert f"# TYPE {name} " in r.text
+
+    def test_error_codes_are_counted(self):
+        route = "/api/v1/parse"
+        before = self.sample("cnis_requests_total", route=route, outcome="FILE_TOO_LARGE")
+        r = client.post(route, files={"file": ("big.pdf", b"%PDF-" + b"0" * (16 * 1024 * 1024), "application/pdf")},
+                        headers={"X-API-Key": API_KEY})
+        assert r.status_code == 413
+        assert self.sample("cnis_requests_total", route=route, outcome="FILE_TOO_LARGE") == before + 1
+
+    def test_parse_records_stages_pages_and_rows(self):
+        from benchmarks.synthetic_cnis import generate_cnis, to_pdf
+        from app.services.result_cache import result_cache
+        doc = generate_cnis(vinculos=3, rows=5, lines_per_page=20)
+        route = "/api/v1/parse/summary"
+        before = {
+            "ok": self.sample("cnis_requests_total", route=route, outcome="success"),
+            "latency": self.sample("cnis_request_seconds_count", route=route),
+            "rows": self.sample("cnis_remuneracoes_parsed_total"),
+            "pages": self.sample("cnis_pdf_pages_sum"),
+            "extract": self.sample("cnis_stage_seconds_count", stage="extract"),
+        }
+        result_cache.clear()
+        try:
+            r = client.post(route, files={"file": ("synthetic.pdf", to_pdf(doc.pages), "application/pdf")},
+                            headers={"X-API-Key": API_KEY})
+        finally:
+            result_cache.clear()
+        assert r.status_code == 200
+        assert self.sample("cnis_requests_total", route=route, outcome="success") == before["ok"] + 1
+        assert self.sample("cnis_request_seconds_count", route=route) == before["latency"] + 1
+        assert self.sample("cnis_remuneracoes_parsed_total") == before["rows"] + sum(v.rows for v in doc.vinculos)
+        assert self.sample("cnis_pdf_pages_sum") == before["pages"] + len(doc.pages)
+        assert self.sample("cnis_stage_seconds_count", stage="extract") == before["extract"] + 1
+
+
+class TestExtractors:
+    def test_registry(self):
+        from cnis_parser_final import EXTRACTORS, get_extractor, PdfminerExtractor
+        assert {"pdfplumber", "pdfminer"} <= set(EXTRACTORS)
+        assert isinstance(get_extractor("pdfminer"), PdfminerExtractor)
+        with pytest.raises(ValueError):
+            get_extractor("tesseract")
+
+    def test_parser_uses_selected_extractor(self):
+        parser = CNISParserFinal(pdf_path=b"%PDF-1.4", extractor="pdfminer")
+        assert parser.extractor.name == "pdfminer"
+        assert CNISParserFinal(pdf_path=b"%PDF-1.4").extractor.name == "pdfplumber"
+
+    def test_invalid_extractor_query(self):
+        r = client.post(
+            "/api/v1/parse?extractor=tesseract",
+            files={"file": ("test.pdf", b"%PDF-1.4 fake", "application/pdf")},
+            headers={"X-API-Key": API_KEY},
+        )
+        assert r.status_code == 400
+        assert r.json()["detail"]["error_code"] == "INVALID_EXTRACTOR"
+
+
+class TestTokenizer:
+    def test_line_kinds(self):
+        import cnis_parser_final as cp
+        cases = {
+            "3 123.45678.90-1 Facultativo 01/07/2001 31/08/2001": cp.TOKEN_VINCULO_HEADER,
+            "Seq. NIT Código Emp. Origem do Vínculo": cp.TOKEN_SECTION,
+            "Matrícula do Trabalhador": cp.TOKEN_SECTION,
+            "O INSS poderá rever a qualquer tempo as informações": cp.TOKEN_NOTICE,
+            "Página 2 de 9": cp.TOKEN_PAGE_FOOTER,
+            "Remunerações": cp.TOKEN_REMUNERACOES,
+            "Indicadores: IREM-INDPEND": cp.TOKEN_INDICADORES,
+            "Competência Remuneração Indicadores": cp.TOKEN_TABLE_HEADER,
+            "01/2000 1.000,00 02/2000 1.100,50": cp.TOKEN_ROW,
+            "FALIDO": cp.TOKEN_OTHER,
+        }
+        for line, kind in cases.items():
+            assert cp.tokenize_line(line).kind == kind, line
+
+    def test_token_payloads(self):
+        import cnis_parser_final as cp
+        header = cp.tokenize_line("3 123.45678.90-1 Facultativo 01/07/2001 31/08/2001")
+        assert header.data.group(2) == "123.45678.90-1"
+        assert cp.tokenize_line("Indicadores: IREM-INDPEND ").data == "IREM-INDPEND"
+        assert cp.tokenize_line("Competência Data Pgto. Contribuição Salário Contribuição").data == cp.TABLE_FACULTATIVO
+        assert cp.tokenize_line("Competência Contrat./Cooperat. Estabelecimento").data == cp.TABLE_CONTRIBUINTE
+        assert cp.tokenize_line("Competência Remuneração Indicadores").data == cp.TABLE_REGULAR
+
+
+class TestCalendar:
+    def test_dates_and_competencias(self):
+        from cnis_calendar import date_month_index, last_day_of_month, month_index
+        assert date_month_index("29/02/2024") == month_index("02/2024") == 2024 * 12 + 1
+        assert date_month_index("29/02/2023") is None
+        assert date_month_index("31/04/2000") is None
+        for unpadded in ("1/02/2000", "01/2/2000", "1/2/2000", "01/02/200"):
+            assert date_month_index(unpadded) is None
+        assert date_month_index("01/02/2000") == 2000 * 12 + 1
+        assert last_day_of_month(month_index("02/2024")) == "29/02/2024"
+        assert last_day_of_month(month_index("02/1900")) == "28/02/1900"
+        assert last_day_of_month(month_index("12/1999")) == "31/12/1999"
+
+    def test_fim_derived_from_ultima_remu_and_last_competencia(self):
+        pages = [
+            SAMPLE_PAGES[0].replace("01/01/2000 31/03/2000", "01/01/2000"),
+            "Seq. NIT Código Emp. Origem do Vínculo Tipo Filiado no Vínculo Data Início Data Fim\n"
+            "4 123.45678.90-1 Facultativo 01/01/2024 02/2024\n"
+            "Página 2 de 2",
+        ]
+        vinculos = FakePagesParser(pages).parse()["employment_relationships"]
+        assert vinculos[0]["Data"]["Fim"] == "31/03/2000"
+        assert vinculos[0]["Metadata"]["All_Date_Matches"] is True
+        assert vinculos[1]["Data"]["Fim"] == "29/02/2024"
+
+
 class TestTypeMapper:
     def test_empregado(self):
         from app.utils.type_mapper import map_tipo_filiado